@@ -0,0 +1,91 @@
+"""
+Benchmark: query tool response encoders in mcp-mysql-test.py
+
+Builds a result set shaped like a typical table (ints, DECIMAL, DATETIME, VARCHAR,
+DOUBLE, nullable and binary columns) and times every output shape in ENCODERS with
+orjson and with the json module fallback, next to the old
+json.dumps(list of dicts, indent=2, default=str) response. Reports milliseconds per
+encode (best of --repeat) and response size.
+
+usage:
+  python bench_encoders.py
+  python bench_encoders.py --rows 10000,100000 --repeat 3
+"""
+
+import time
+import random
+import decimal
+import argparse
+import datetime
+import importlib.util
+from pathlib import Path
+
+import json
+
+spec = importlib.util.spec_from_file_location("mysql_server", Path(__file__).with_name("mcp-mysql-test.py"))
+server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(server)
+
+
+def synthetic_result(n_rows: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    columns = ["id", "user_id", "amount", "created_at", "status", "score", "note", "payload"]
+    statuses = ["new", "paid", "shipped", "cancelled", "refunded"]
+    rows = [
+        (
+            i,
+            rng.randrange(1, 50_000),
+            decimal.Decimal(rng.randrange(100, 10_000_000)) / 100,
+            start + datetime.timedelta(seconds=rng.randrange(0, 10**8)),
+            rng.choice(statuses),
+            rng.random() * 100,
+            None if rng.random() < 0.7 else f"customer note {rng.randrange(10**6)}",
+            rng.randbytes(8),
+        )
+        for i in range(n_rows)
+    ]
+    return {"columns": columns, "rows": rows, "next_page_token": None}
+
+
+def legacy(result: dict) -> str:
+    objects = [dict(zip(result["columns"], row)) for row in result["rows"]]
+    return json.dumps(objects, indent=2, default=str)
+
+
+def best_of(fn, repeat: int) -> tuple:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fast = server.orjson
+    for n_rows in [int(x) for x in args.rows.split(",")]:
+        result = synthetic_result(n_rows)
+        print(f"\n{n_rows:,} rows")
+        print(f"{'shape':>10} {'encoder':>8} {'ms':>9} {'KB':>9}")
+        ms, size = best_of(lambda: legacy(result), args.repeat)
+        print(f"{'legacy':>10} {'json':>8} {ms:>9.1f} {size / 1024:>9.0f}")
+
+        for encoder_name, module in [("orjson", fast), ("json", None)]:
+            if encoder_name == "orjson" and fast is None:
+                print(f"{'':>10} {'orjson':>8} not installed")
+                continue
+            server.orjson = module
+            for shape in server.ENCODERS:
+                ms, size = best_of(lambda: "".join(c.text for c in server.format_result(result, shape)), args.repeat)
+                print(f"{shape:>10} {encoder_name:>8} {ms:>9.1f} {size / 1024:>9.0f}")
+        server.orjson = fast
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,39 @@
 """MySQL MCP Server - Provides database access via Model Context Protocol"""
 
 import os
+import re
+import io
+import csv
+import sys
 import json
+import argparse
+import base64
 import asyncio
+import datetime
+import decimal
+import hashlib
+import functools
 import logging
-from typing import Any, Optional
-from contextlib import asynccontextmanager
+import time
+import pstats
+import cProfile
+import contextvars
+import threading
+import tracemalloc
+import weakref
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Optional
+from contextlib import asynccontextmanager, contextmanager
 
 import aiomysql
+try:
+    import orjson
+except ImportError:  # optional, encode_json falls back to the json module
+    orjson = None
+try:
+    import resource
+except ImportError:  # not on Windows, the process peak RSS then reads as 0
+    resource = None
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -27,12 +53,432 @@ DB_CONFIG = {
     "autocommit": True,
 }
 
+# Connection pool settings, from the environment or the command line (see parse_args).
+# ping_idle: a connection idle at least this many seconds is pinged on checkout, so a
+# busy server pays no extra round trip per query (0 = ping on every checkout)
+POOL_CONFIG = {
+    "minsize": int(os.getenv("MYSQL_POOL_MIN", "1")),
+    "maxsize": int(os.getenv("MYSQL_POOL_MAX", "10")),
+    "pool_recycle": int(os.getenv("MYSQL_POOL_RECYCLE", "3600")),
+    "connect_timeout": float(os.getenv("MYSQL_CONNECT_TIMEOUT", "10")),
+    "acquire_timeout": float(os.getenv("MYSQL_ACQUIRE_TIMEOUT", "30")),
+    "query_timeout": float(os.getenv("MYSQL_QUERY_TIMEOUT", "30")),
+    "ping_idle": float(os.getenv("MYSQL_PING_IDLE", "30")),
+}
+
+# Result limits for the query tool: rows per page, approximate bytes per page and
+# rows read from the server per fetch (see execute_query)
+MAX_ROWS = int(os.getenv("MYSQL_MAX_ROWS", "1000"))
+MAX_BYTES = int(os.getenv("MYSQL_MAX_BYTES", str(1 << 20)))
+FETCH_BATCH = int(os.getenv("MYSQL_FETCH_BATCH", "500"))
+
+# query_batch: most statements per call and most of them running at once
+BATCH_MAX_STATEMENTS = int(os.getenv("MYSQL_BATCH_MAX_STATEMENTS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("MYSQL_BATCH_CONCURRENCY", "4"))
+
+# A LIMIT clause at the very end of a statement ("LIMIT 10", "LIMIT 5, 10", "LIMIT 10 OFFSET 5")
+TRAILING_LIMIT = re.compile(r"\blimit\s+\d+\s*(?:(?:,|offset)\s*\d+\s*)?$", re.IGNORECASE)
+# A locking read at the end of a statement, nothing can be appended after it
+TRAILING_LOCK = re.compile(
+    r"\b(?:for\s+update|for\s+share|lock\s+in\s+share\s+mode)\b(?:\s+of\s+[\w`.,\s]+?)?"
+    r"(?:\s+(?:nowait|skip\s+locked))?\s*$",
+    re.IGNORECASE,
+)
+# Quoted strings / identifiers and comments ("-- ...", "# ...", "/* ... */"), in the order they start
+QUOTED_OR_COMMENT = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|--(?=\s|$)[^\n]*|#[^\n]*|/\*.*?(?:\*/|$)""",
+    re.DOTALL,
+)
+
+# Result cache: byte budget, seconds query results are served (when table UPDATE_TIMEs
+# can't tell us about changes) and seconds SHOW TABLES / DESCRIBE results are served
+CACHE_MAX_BYTES = int(os.getenv("MYSQL_CACHE_BYTES", str(64 << 20)))
+QUERY_CACHE_TTL = float(os.getenv("MYSQL_QUERY_CACHE_TTL", "60"))
+SCHEMA_CACHE_TTL = float(os.getenv("MYSQL_SCHEMA_CACHE_TTL", "600"))
+
+# Tool call tracing (see CallStats): calls per tool kept for the percentiles, a JSON lines
+# file every call is appended to (empty = none), the latency from which a call counts as
+# slow, and the profilers that run on each call and are kept for slow ones:
+# "cprofile", "tracemalloc" or both, comma separated (none by default, both cost time)
+STATS_WINDOW = int(os.getenv("MYSQL_STATS_WINDOW", "1000"))
+STATS_LOG = os.getenv("MYSQL_STATS_LOG", "")
+SLOW_CALL_MS = float(os.getenv("MYSQL_SLOW_CALL_MS", "1000"))
+PROFILE = {name.strip() for name in os.getenv("MYSQL_PROFILE", "").lower().split(",") if name.strip()}
+# Milliseconds between the current RSS samples taken while tool calls run (see RssSampler)
+RSS_SAMPLE_MS = float(os.getenv("MYSQL_RSS_SAMPLE_MS", "5"))
+
+# Quoted strings / identifiers, left alone when normalizing SQL
+QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+# Tables a statement reads, for UPDATE_TIME checks: the table after JOIN, and every table of
+# the comma separated list after FROM ("FROM a x, db2.b AS y"), each optionally db qualified
+_IDENTIFIER = r"(?:`[^`]+`|\w+)"
+_TABLE = rf"{_IDENTIFIER}(?:\s*\.\s*{_IDENTIFIER})?"
+_ALIAS = (r"(?:\s+(?:as\s+)?(?!(?:where|join|inner|cross|left|right|natural|straight_join|on|using|group|order|"
+          r"having|limit|window|union|for|lock|into|use|force|ignore|partition)\b)\w+)?")
+TABLE_REFERENCE = re.compile(
+    rf"\b(?:from\s+({_TABLE}{_ALIAS}(?:\s*,\s*{_TABLE}{_ALIAS})*)|(?:straight_)?join\s+({_TABLE}))",
+    re.IGNORECASE,
+)
+TABLE_NAME = re.compile(_TABLE)
+# Results of these change on every call, they are never cached: time, random and session
+# functions (CURRENT_TIMESTAMP and friends also without parentheses) and locking reads
+VOLATILE = re.compile(
+    r"\b(?:now|rand|uuid|uuid_short|sysdate|curdate|curtime|unix_timestamp|"
+    r"connection_id|last_insert_id|found_rows|row_count|sleep|get_lock|user|session_user|system_user)\s*\(|"
+    r"\b(?:current_timestamp|current_date|current_time|current_user|current_role|localtime|localtimestamp|"
+    r"utc_date|utc_time|utc_timestamp)\b|\bfor\s+(?:update|share)\b|\block\s+in\s+share\s+mode\b",
+    re.IGNORECASE,
+)
+
 # Global connection pool
 pool: Optional[aiomysql.Pool] = None
 
 
+# Upper bounds (ms) of the acquire wait histogram buckets, the last one catches the rest
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float("inf"))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class PoolMetrics:
+    """Acquire waits, connections in use and query latencies (last `window` queries)"""
+
+    def __init__(self, window: int = 1000):
+        self.wait_counts = [0] * len(WAIT_BUCKETS_MS)
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.queries = 0
+        self.query_timeouts = 0
+        self.kills = 0
+        self.waits: deque = deque(maxlen=window)
+        self.latencies: deque = deque(maxlen=window)
+
+    def record_acquire(self, seconds: float):
+        ms = seconds * 1000
+        self.acquires += 1
+        self.waits.append(ms)
+        self.wait_counts[next(i for i, bound in enumerate(WAIT_BUCKETS_MS) if ms <= bound)] += 1
+
+    def record_query(self, seconds: float):
+        self.queries += 1
+        self.latencies.append(seconds * 1000)
+
+    def stats(self) -> dict[str, Any]:
+        waits, latencies = list(self.waits), list(self.latencies)
+        return {
+            "pool": {
+                "size": pool.size if pool else 0,
+                "free": pool.freesize if pool else 0,
+                "minsize": POOL_CONFIG["minsize"],
+                "maxsize": POOL_CONFIG["maxsize"],
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+            },
+            "acquire": {
+                "count": self.acquires,
+                "timeouts": self.acquire_timeouts,
+                "wait_ms_histogram": {
+                    f"<={bound:g}" if bound != float("inf") else f">{WAIT_BUCKETS_MS[-2]:g}": count
+                    for bound, count in zip(WAIT_BUCKETS_MS, self.wait_counts)
+                },
+                "wait_ms_p50": _percentile(waits, 50),
+                "wait_ms_p99": _percentile(waits, 99),
+            },
+            "queries": {
+                "count": self.queries,
+                "timeouts": self.query_timeouts,
+                "killed": self.kills,
+                "latency_ms_p50": _percentile(latencies, 50),
+                "latency_ms_p95": _percentile(latencies, 95),
+                "latency_ms_p99": _percentile(latencies, 99),
+            },
+            "pings": {"count": self.pings, "failures": self.ping_failures},
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of the process so far, in bytes (0 without the resource module)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _current_rss() -> Optional[int]:
+    """Resident set size of the process now, in bytes (None where /proc is not available)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    Peak resident memory of calls while they run. One background thread reads the current
+    RSS every `interval` seconds while any call is running and raises the peak of each of
+    them; start and stop sample too, so calls shorter than the interval still count.
+    ru_maxrss is a high-water mark for the whole process and reads 0 for every call that
+    doesn't set a new record, so it is only the fallback where /proc is missing.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._calls: dict[int, list[int]] = {}
+        self._pid = None
+        self._init_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # per process: a forked worker doesn't inherit the thread
+        with self._init_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._calls = {}
+                self._lock = threading.Lock()
+                self._wake = threading.Event()
+                threading.Thread(target=self._run, name="rss-sampler", daemon=True).start()
+
+    def start(self) -> list:
+        """Starts measuring one call, pass the returned token to stop"""
+        rss = _current_rss()
+        if rss is None:
+            return [_peak_rss(), None]
+        self._ensure_thread()
+        call = [rss, rss]
+        with self._lock:
+            self._calls[id(call)] = call
+            self._wake.set()
+        return call
+
+    def stop(self, call: list) -> int:
+        """Bytes the call's peak RSS rose above the RSS at its start"""
+        if call[1] is None:
+            return max(_peak_rss() - call[0], 0)
+        rss = _current_rss() or 0
+        with self._lock:
+            self._calls.pop(id(call), None)
+        return max(call[1], rss) - call[0]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            rss = _current_rss() or 0
+            with self._lock:
+                if not self._calls:
+                    self._wake.clear()
+                    continue
+                for call in self._calls.values():
+                    call[1] = max(call[1], rss)
+            time.sleep(self.interval)
+
+
+rss_sampler = RssSampler(RSS_SAMPLE_MS / 1000)
+
+
+def _latency_summary(values: list[float]) -> dict[str, Any]:
+    return {
+        "count": len(values),
+        "ms_p50": round(_percentile(values, 50), 3),
+        "ms_p95": round(_percentile(values, 95), 3),
+        "ms_p99": round(_percentile(values, 99), 3),
+        "ms_max": round(max(values, default=0.0), 3),
+    }
+
+
+def _profile_text(profiler: cProfile.Profile, limit: int = 25) -> str:
+    buffer = io.StringIO()
+    pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(limit)
+    return buffer.getvalue()
+
+
+class CallTrace:
+    """Seconds per stage of one tool call; the concurrent statements of a query_batch add up"""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.stages: dict[str, float] = {}
+        self.error: Optional[str] = None
+
+
+# The tool call the running task works for, tasks started by it (gather, the cache's
+# loads) inherit it
+_current_call: contextvars.ContextVar[Optional[CallTrace]] = contextvars.ContextVar("current_call", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Adds the time spent in the block to stage `name` of the current tool call, if there is one"""
+    call = _current_call.get()
+    if call is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        call.stages[name] = call.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+class CallStats:
+    """
+    Latency of each tool and of its stages (acquire, execute, fetch, encode) over the last
+    `window` calls per tool, peak memory, and the profiles of calls slower than slow_ms.
+
+    Peak memory is the rise of the traced Python heap during the call when tracemalloc is
+    in `profile`, else the highest current RSS sampled while it ran (see RssSampler) above
+    the RSS at its start. Calls overlap on the event loop, so both (and cProfile, which runs
+    for one call at a time and sees the others' work too) are approximate under concurrency.
+    Every call is also appended to log_path as one JSON line, if set.
+    """
+
+    def __init__(self, window: int = 1000, log_path: str = "", slow_ms: float = 1000, profile: frozenset = frozenset()):
+        self.window = window
+        self.log_path = log_path
+        self.slow_ms = slow_ms
+        self.profile = set(profile)
+        self.tools: dict[str, dict[str, Any]] = {}
+        self.slow_calls: deque = deque(maxlen=20)
+        self._profiling = False
+        self._log = None
+
+    def traced(self, handler: Callable[[str, Any], Awaitable[Any]]) -> Callable[[str, Any], Awaitable[Any]]:
+        """Wraps a call_tool handler so every call is traced under its tool name"""
+        @functools.wraps(handler)
+        async def wrapper(name: str, arguments: Any) -> Any:
+            with self.trace(name):
+                return await handler(name, arguments)
+        return wrapper
+
+    def failed(self, error: Exception):
+        """Marks the current tool call as failed, for handlers that turn errors into a result"""
+        call = _current_call.get()
+        if call is not None:
+            call.error = str(error)
+
+    @contextmanager
+    def trace(self, tool: str):
+        """Times the tool call run in the block; stage() calls inside it add to its stages"""
+        call = CallTrace(tool)
+        token = _current_call.set(call)
+        profiler = None
+        if "cprofile" in self.profile and not self._profiling:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if "tracemalloc" in self.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        else:
+            memory_start = rss_sampler.start()
+
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            _current_call.reset(token)
+            if "tracemalloc" in self.profile:
+                peak_bytes = tracemalloc.get_traced_memory()[1] - memory_start
+            else:
+                peak_bytes = rss_sampler.stop(memory_start)
+            self.record(call, seconds, max(peak_bytes, 0), profiler)
+
+    def record(self, call: CallTrace, seconds: float, peak_bytes: int, profiler: Optional[cProfile.Profile] = None):
+        ms = seconds * 1000
+        entry = self.tools.get(call.tool)
+        if entry is None:
+            entry = self.tools[call.tool] = {
+                "calls": 0, "errors": 0, "peak_bytes": 0, "latency": deque(maxlen=self.window), "stages": {},
+            }
+        entry["calls"] += 1
+        entry["errors"] += call.error is not None
+        entry["peak_bytes"] = max(entry["peak_bytes"], peak_bytes)
+        entry["latency"].append(ms)
+        for name, stage_seconds in call.stages.items():
+            entry["stages"].setdefault(name, deque(maxlen=self.window)).append(stage_seconds * 1000)
+
+        record = {
+            "ts": round(time.time(), 3),
+            "tool": call.tool,
+            "ms": round(ms, 3),
+            "stages": {name: round(stage_seconds * 1000, 3) for name, stage_seconds in call.stages.items()},
+            "peak_bytes": peak_bytes,
+            "error": call.error,
+        }
+        if ms >= self.slow_ms:
+            if profiler is not None:
+                record["profile"] = _profile_text(profiler)
+            if "tracemalloc" in self.profile:
+                # largest allocations still alive when the call ended
+                top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+                record["allocations"] = [str(statistic) for statistic in top]
+            self.slow_calls.append(record)
+        self._write(record)
+
+    def _write(self, record: dict[str, Any]):
+        if not self.log_path:
+            return
+        try:
+            if self._log is None:
+                self._log = open(self.log_path, "a", buffering=1, encoding="utf-8")
+            self._log.write(encode_json(record) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write call stats to {self.log_path}, logging stopped: {e}")
+            self.log_path = ""
+
+    def stats(self, profiles: bool = False) -> dict[str, Any]:
+        tools = {}
+        for name, entry in sorted(self.tools.items()):
+            tools[name] = {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "peak_bytes": entry["peak_bytes"],
+                **_latency_summary(list(entry["latency"])),
+                "stages": {
+                    stage_name: _latency_summary(list(values))
+                    for stage_name, values in entry["stages"].items()
+                },
+            }
+        slow_calls = [
+            record if profiles else {k: v for k, v in record.items() if k not in ("profile", "allocations")}
+            for record in self.slow_calls
+        ]
+        return {
+            "window": self.window,
+            "slow_call_ms": self.slow_ms,
+            "profile": sorted(self.profile),
+            "log": self.log_path or None,
+            "peak_rss_bytes": _peak_rss(),
+            "tools": tools,
+            "slow_calls": slow_calls,
+        }
+
+
+call_stats = CallStats(STATS_WINDOW, STATS_LOG, SLOW_CALL_MS, frozenset(PROFILE))
+
+
 async def init_pool():
-    """Initialize the MySQL connection pool"""
+    """Initialize the MySQL connection pool and pre-warm it to minsize checked connections"""
     global pool
     pool = await aiomysql.create_pool(
         host=DB_CONFIG["host"],
@@ -41,37 +487,674 @@ async def init_pool():
         password=DB_CONFIG["password"],
         db=DB_CONFIG["db"],
         autocommit=DB_CONFIG["autocommit"],
-        minsize=1,
-        maxsize=10,
+        minsize=POOL_CONFIG["minsize"],
+        maxsize=POOL_CONFIG["maxsize"],
+        pool_recycle=POOL_CONFIG["pool_recycle"],
+        connect_timeout=POOL_CONFIG["connect_timeout"],
+    )
+
+    # hold minsize connections at once so each one is opened and pinged before the first call
+    start = time.perf_counter()
+    conns = [await pool.acquire() for _ in range(POOL_CONFIG["minsize"])]
+    try:
+        await asyncio.gather(*(conn.ping(reconnect=True) for conn in conns))
+    finally:
+        for conn in conns:
+            pool.release(conn)
+    logger.info(
+        f"MySQL connection pool initialized: {pool.size} connections warm "
+        f"(min {POOL_CONFIG['minsize']}, max {POOL_CONFIG['maxsize']}) in {time.perf_counter() - start:.2f}s"
     )
-    logger.info("MySQL connection pool initialized")
 
 
 @asynccontextmanager
-async def get_connection():
-    """Get a connection from the pool"""
+async def acquire_connection():
+    """
+    Check a connection out of the pool, waiting at most acquire_timeout seconds.
+    Connections idle for ping_idle seconds or more are pinged (and reconnected if the
+    server dropped them) before use.
+    """
     if pool is None:
         raise RuntimeError("Connection pool not initialized")
-    
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
+
+    start = time.perf_counter()
+    try:
+        with stage("acquire"):
+            conn = await asyncio.wait_for(pool.acquire(), POOL_CONFIG["acquire_timeout"])
+    except asyncio.TimeoutError:
+        pool_metrics.acquire_timeouts += 1
+        raise TimeoutError(
+            f"no free connection after {POOL_CONFIG['acquire_timeout']:g}s "
+            f"({pool.size} of {POOL_CONFIG['maxsize']} in use)"
+        )
+    pool_metrics.record_acquire(time.perf_counter() - start)
+    pool_metrics.in_use += 1
+    pool_metrics.peak_in_use = max(pool_metrics.peak_in_use, pool_metrics.in_use)
+
+    try:
+        if conn.loop.time() - conn.last_usage >= POOL_CONFIG["ping_idle"]:
+            pool_metrics.pings += 1
+            try:
+                with stage("acquire"):
+                    await conn.ping(reconnect=True)
+            except Exception:
+                pool_metrics.ping_failures += 1
+                conn.close()
+                raise
+        yield conn
+    finally:
+        pool_metrics.in_use -= 1
+        pool.release(conn)
+
+
+async def kill_query(thread_id: int):
+    """KILL QUERY on a separate connection, so it works even when the pool is exhausted"""
+    try:
+        conn = await aiomysql.connect(
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            connect_timeout=POOL_CONFIG["connect_timeout"],
+        )
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"KILL QUERY {int(thread_id)}")
+            pool_metrics.kills += 1
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Could not kill query on connection {thread_id}: {e}")
+
+
+async def timed(conn: aiomysql.Connection, awaitable: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Awaits a statement on conn, recording its latency. Past the timeout (query_timeout by
+    default) the statement is killed on the server and conn is closed, a connection
+    interrupted mid result can't be reused.
+    """
+    timeout = POOL_CONFIG["query_timeout"] if timeout is None else timeout
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        pool_metrics.query_timeouts += 1
+        await kill_query(conn.thread_id())
+        conn.close()
+        raise TimeoutError(f"query timed out after {timeout:g}s and was cancelled on the server")
+    finally:
+        pool_metrics.record_query(time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def get_connection(cursor_class=aiomysql.DictCursor):
+    """Get a connection from the pool"""
+    async with acquire_connection() as conn:
+        cursor = await conn.cursor(cursor_class)
+        try:
             yield cursor
+        finally:
+            # a statement that timed out closed the connection, there is nothing to drain
+            if not conn.closed:
+                await cursor.close()
 
 
-async def execute_query(sql: str) -> list[dict[str, Any]]:
-    """Execute a SELECT query and return results"""
+async def fetch_all(sql: str, args: Optional[tuple] = None) -> list[dict[str, Any]]:
+    """Run one statement on a pooled connection under the query timeout, return every row"""
     async with get_connection() as cursor:
-        await cursor.execute(sql)
-        rows = await cursor.fetchall()
-        return rows
+        async def run():
+            with stage("execute"):
+                await cursor.execute(sql, args)
+            with stage("fetch"):
+                return await cursor.fetchall()
+        return await timed(cursor.connection, run())
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Cache key form of a statement: whitespace runs outside quotes collapsed to one space
+    (to a newline if they had one and there are line comments, so those still end) and
+    the trailing semicolon dropped. Still valid SQL, it is also what gets executed.
+    """
+    parts = QUOTED.split(sql)
+    for i in range(0, len(parts), 2):
+        comments = "--" in parts[i] or "#" in parts[i]
+        parts[i] = re.sub(r"\s+", lambda m: "\n" if comments and "\n" in m.group() else " ", parts[i])
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql: str) -> list[str]:
+    """Tables after FROM / JOIN as "table" or "database.table", empty if there are none"""
+    tables = set()
+    for match in TABLE_REFERENCE.finditer(QUOTED.sub(lambda m: m.group() if m.group().startswith("`") else "''", sql)):
+        # the first identifier of each list entry is the table, the rest is its alias
+        for entry in (match.group(1) or match.group(2)).split(","):
+            name = TABLE_NAME.match(entry.strip()).group()
+            tables.add(".".join(part.strip().strip("`") for part in name.split(".")))
+    return sorted(tables)
+
+
+def _result_size(result: Any) -> int:
+    """Approximate size of a cached result, from its row values"""
+    if isinstance(result, dict) and "rows" not in result:
+        return len(json.dumps(result, default=str))
+    rows = result["rows"] if isinstance(result, dict) else result
+    return sum(_row_size(row.values() if isinstance(row, dict) else row) for row in rows) + 64
+
+
+class ResultCache:
+    """
+    Byte bounded LRU of query / schema results for the event loop.
+
+    Each entry keeps its tables' information_schema UPDATE_TIMEs from before the query
+    ran. A hit re-reads them (one small query) and is dropped if any changed. Tables
+    whose UPDATE_TIME is NULL (no writes since restart, or an engine that doesn't track
+    it) fall back to the entry's TTL alone.
+    Identical requests that arrive while one is running share its result.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict[Any, asyncio.Future] = {}
+
+    async def get_or_load(
+        self,
+        key: Any,
+        load: Callable[[], Awaitable[Any]],
+        ttl: float,
+        tables: Optional[list[str]] = None,
+    ) -> Any:
+        """Cached result for key, or the result of load() (shared with concurrent callers)"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, size, expires, update_times = entry
+            fresh = time.monotonic() < expires
+            if fresh and update_times:
+                fresh = await table_update_times(list(update_times)) == update_times
+            if fresh and self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if self._entries.get(key) is entry:
+                self._drop(key)
+                self.invalidations += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, load, ttl, tables))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # one caller giving up must not cancel the load the others wait on
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Any, load: Callable[[], Awaitable[Any]], ttl: float, tables: Optional[list[str]]) -> Any:
+        # read before the query, so a write that lands during it invalidates the entry
+        update_times = None
+        if tables:
+            update_times = await table_update_times(tables)
+            if len(update_times) != len(tables) or None in update_times.values():
+                update_times = None
+        value = await load()
+        self._put(key, value, ttl, update_times)
+        return value
+
+    def _put(self, key: Any, value: Any, ttl: float, update_times: Optional[dict]):
+        size = _result_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, size, time.monotonic() + ttl, update_times)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Any):
+        self.current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache(CACHE_MAX_BYTES)
+
+# None until the first UPDATE_TIME check finds out whether the server has
+# information_schema_stats_expiry (MySQL 8 caches table statistics for a day by default)
+_stats_expiry_supported: Optional[bool] = None
+# connection -> server thread id of the session information_schema_stats_expiry = 0 was set
+# on; a reconnect (ping) starts a new session with a new thread id, so it is set again
+_stats_expiry_sessions: "weakref.WeakKeyDictionary[aiomysql.Connection, int]" = weakref.WeakKeyDictionary()
+
+
+async def _fresh_table_stats(cursor: aiomysql.Cursor):
+    """Sets information_schema_stats_expiry = 0 once per session, where the server has it"""
+    global _stats_expiry_supported
+    conn = cursor.connection
+    if _stats_expiry_supported is False or _stats_expiry_sessions.get(conn) == conn.thread_id():
+        return
+    try:
+        await cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        _stats_expiry_supported = True
+        _stats_expiry_sessions[conn] = conn.thread_id()
+    except aiomysql.Error:
+        _stats_expiry_supported = False
+
+
+async def table_update_times(tables: list[str]) -> dict[str, Any]:
+    """
+    information_schema.TABLES.UPDATE_TIME of tables, keyed as given: "table" in the
+    current database or "database.table"
+    """
+    names = [table.rsplit(".", 1) if "." in table else [None, table] for table in tables]
+    placeholders = ", ".join(["(COALESCE(%s, DATABASE()), %s)"] * len(names))
+    async with get_connection() as cursor:
+        await _fresh_table_stats(cursor)
+
+        async def run():
+            with stage("execute"):
+                await cursor.execute(
+                    "SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_SCHEMA = DATABASE() AS CURRENT_DB, UPDATE_TIME "
+                    f"FROM information_schema.TABLES WHERE (TABLE_SCHEMA, TABLE_NAME) IN ({placeholders})",
+                    tuple(value for name in names for value in name),
+                )
+            with stage("fetch"):
+                return await cursor.fetchall()
+        rows = await timed(cursor.connection, run())
+
+    found = {}
+    for row in rows:
+        found[f"{row['TABLE_SCHEMA']}.{row['TABLE_NAME']}".lower()] = row["UPDATE_TIME"]
+        if row["CURRENT_DB"]:
+            found[row["TABLE_NAME"].lower()] = row["UPDATE_TIME"]
+    # tables that aren't found are left out, callers then rely on the TTL
+    return {table: found[table.lower()] for table in tables if table.lower() in found}
+
+
+async def cached_query(
+    sql: str,
+    max_rows: int = MAX_ROWS,
+    page_token: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> dict[str, Any]:
+    """execute_query through the result cache; statements with volatile functions always run"""
+    sql = normalize_sql(sql)
+    if VOLATILE.search(sql):
+        return await execute_query(sql, max_rows=max_rows, page_token=page_token, timeout=timeout)
+    return await result_cache.get_or_load(
+        ("query", sql, max_rows, page_token),
+        lambda: execute_query(sql, max_rows=max_rows, page_token=page_token, timeout=timeout),
+        QUERY_CACHE_TTL,
+        referenced_tables(sql),
+    )
+
+
+def _sql_digest(sql: str) -> str:
+    return hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+
+def encode_page_token(sql: str, offset: int) -> str:
+    """Continuation token: the row offset of the next page, tied to the statement"""
+    payload = json.dumps({"offset": offset, "sql": _sql_digest(sql)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_page_token(sql: str, token: str) -> int:
+    """Row offset stored in a token from encode_page_token for the same statement"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        offset = int(payload["offset"])
+    except Exception:
+        raise ValueError("Invalid page_token")
+    if payload.get("sql") != _sql_digest(sql) or offset < 0:
+        raise ValueError("page_token does not belong to this query")
+    return offset
+
+
+def strip_trailing_comments(sql: str) -> str:
+    """The statement without the comments at its end (quoted text is never taken for one)"""
+    # comments blanked out with the same length, so positions still match sql
+    masked = QUOTED_OR_COMMENT.sub(lambda m: m.group() if m.group(1) else " " * len(m.group()), sql)
+    return sql[:len(masked.rstrip())]
+
+
+def paginate(sql: str, offset: int, max_rows: int) -> tuple[str, int, bool]:
+    """
+    Returns (statement to run, rows to skip client side, whether the server bounds the result).
+    Without a LIMIT of its own the statement gets LIMIT offset, max_rows + 1 (the extra row
+    tells whether there is a next page). One that has its own LIMIT (before any trailing
+    comment), or ends in a locking clause (FOR UPDATE, LOCK IN SHARE MODE) that nothing can
+    follow, runs as is and the offset is skipped while streaming.
+    """
+    tail = strip_trailing_comments(sql)
+    if TRAILING_LIMIT.search(tail) or TRAILING_LOCK.search(tail):
+        return sql, offset, False
+    # on its own line, so a trailing "-- comment" can't swallow it
+    return f"{sql}\nLIMIT {offset}, {max_rows + 1}", 0, True
+
+
+def result_columns(cursor: aiomysql.Cursor) -> list[str]:
+    """
+    Column names of the cursor's result, a repeated name prefixed with its table
+    ("b.id" after "id") the way DictCursor names them, so row objects keep every column
+    """
+    fields = getattr(getattr(cursor, "_result", None), "fields", None)
+    if not cursor.description:
+        return []
+    if not fields:
+        return [column[0] for column in cursor.description]
+    names: list[str] = []
+    for field in fields:
+        name = field.name
+        if name in names:
+            name = f"{field.table_name}.{name}"
+        names.append(name)
+    return names
+
+
+def _row_size(row: tuple) -> int:
+    """Approximate JSON size of a row, without encoding it"""
+    return sum(len(str(value)) for value in row) + 3 * len(row)
+
+
+async def execute_query(
+    sql: str,
+    max_rows: int = MAX_ROWS,
+    max_bytes: int = MAX_BYTES,
+    page_token: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> dict[str, Any]:
+    """
+    Execute a SELECT query through an unbuffered server side cursor and return one page:
+    {"columns": [...], "rows": [tuple, ...], "next_page_token": str or None}
+
+    Rows are read FETCH_BATCH at a time and reading stops at max_rows rows or about
+    max_bytes of row data, so a large table is never held in memory. next_page_token
+    continues where the page stopped.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    offset = decode_page_token(sql, page_token) if page_token else 0
+    statement, skip, bounded = paginate(sql, offset, max_rows)
+
+    rows: list[tuple] = []
+    size = 0
+    more = False
+    columns: list[str] = []
+    async with acquire_connection() as conn:
+        cursor = await conn.cursor(aiomysql.SSCursor)
+        finished = False
+
+        async def stream():
+            nonlocal size, more, skip
+            with stage("execute"):
+                await cursor.execute(statement)
+            columns.extend(result_columns(cursor))
+            with stage("fetch"):
+                while not more:
+                    batch = await cursor.fetchmany(FETCH_BATCH)
+                    if not batch:
+                        break
+                    if skip:
+                        dropped = min(skip, len(batch))
+                        batch, skip = batch[dropped:], skip - dropped
+                    for row in batch:
+                        if len(rows) >= max_rows or (rows and size >= max_bytes):
+                            more = True
+                            break
+                        rows.append(row)
+                        size += _row_size(row)
+
+        try:
+            await timed(conn, stream(), timeout)
+            finished = not more or bounded
+        finally:
+            if finished:
+                await cursor.close()
+            elif not conn.closed:
+                # an unbuffered result can only be abandoned by reading it to the end;
+                # dropping the connection is cheaper, the pool opens a new one
+                conn.close()
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "next_page_token": encode_page_token(sql, offset + len(rows)) if more else None,
+    }
+
+
+def ensure_select(sql: str):
+    """Security: Only allow SELECT queries"""
+    if not sql.strip().upper().startswith("SELECT"):
+        raise ValueError("Only SELECT queries are allowed with the query tool")
+
+
+def _row_limit(max_rows: Any) -> int:
+    # only a missing value means the default, 0 and negatives are errors
+    max_rows = min(MAX_ROWS if max_rows is None else int(max_rows), MAX_ROWS)
+    if max_rows < 1:
+        raise ValueError("max_rows must be at least 1")
+    return max_rows
+
+
+async def query_batch(statements: list[Any], concurrency: int = BATCH_CONCURRENCY) -> list[dict[str, Any]]:
+    """
+    Runs independent SELECTs at the same time on separate pooled connections, at most
+    `concurrency` at once, so the batch takes about as long as its slowest statement.
+    Each statement is a SQL string or {"sql", "max_rows", "timeout"}. One failing
+    statement doesn't fail the others: every result is
+    {"ok": true, "ms", "columns", "rows", "next_page_token"} or {"ok": false, "ms", "error"}.
+    """
+    if len(statements) > BATCH_MAX_STATEMENTS:
+        raise ValueError(f"At most {BATCH_MAX_STATEMENTS} statements per batch")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(statement: Any) -> dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            if isinstance(statement, str):
+                statement = {"sql": statement}
+            sql = statement.get("sql", "")
+            ensure_select(sql)
+            timeout = statement.get("timeout")
+            async with semaphore:
+                result = await cached_query(
+                    sql,
+                    max_rows=_row_limit(statement.get("max_rows")),
+                    timeout=float(timeout) if timeout else None,
+                )
+            return {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1), **result}
+        except Exception as e:
+            return {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)}
+
+    return await asyncio.gather(*(run(statement) for statement in statements))
+
+
+def _encode_bytes(value: Any) -> str:
+    value = bytes(value)
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return "base64:" + base64.b64encode(value).decode("ascii")
+
+
+def _encode_timedelta(value: datetime.timedelta) -> str:
+    """TIME value as MySQL writes it: [-]H:MM:SS[.ffffff], hours past 24 and negatives included"""
+    micros = value // datetime.timedelta(microseconds=1)
+    sign = "-" if micros < 0 else ""
+    seconds, micros = divmod(abs(micros), 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    text = f"{sign}{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{text}.{micros:06d}" if micros else text
+
+
+# JSON form of the values MySQL drivers return that JSON has no type for, by exact type:
+# Decimal -> string (exact), date / datetime / time -> ISO 8601, TIME columns (timedelta)
+# -> "[-]H:MM:SS", bytes -> text if valid UTF-8 else "base64:..." and SET -> sorted list
+VALUE_ENCODERS: dict[type, Callable[[Any], Any]] = {
+    decimal.Decimal: str,
+    datetime.datetime: datetime.datetime.isoformat,
+    datetime.date: datetime.date.isoformat,
+    datetime.time: datetime.time.isoformat,
+    datetime.timedelta: _encode_timedelta,
+    bytes: _encode_bytes,
+    bytearray: _encode_bytes,
+    memoryview: _encode_bytes,
+    set: sorted,
+    frozenset: sorted,
+}
+
+
+def encode_value(value: Any) -> Any:
+    """JSON form of a value json / orjson can't encode, see VALUE_ENCODERS"""
+    encoder = VALUE_ENCODERS.get(type(value))
+    if encoder is None:
+        # subclasses of the listed types, the driver itself returns the exact types
+        encoder = next((fn for kind, fn in VALUE_ENCODERS.items() if isinstance(value, kind)), None)
+        if encoder is None:
+            raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+    return encoder(value)
+
+
+def encode_json(payload: Any, indent: bool = False) -> str:
+    """
+    JSON text of payload with orjson when it is installed (native datetime handling,
+    no per value Python calls), else the json module. Both encode MySQL values through
+    encode_value and parse back to the same values, but the text of some floats differs:
+    orjson writes 0.00001 and 1e20 where json writes 1e-05 and 1e+20
+    """
+    with stage("encode"):
+        if orjson is not None:
+            return orjson.dumps(
+                payload,
+                default=encode_value,
+                option=orjson.OPT_INDENT_2 if indent else 0,
+            ).decode()
+        if indent:
+            return json.dumps(payload, default=encode_value, indent=2, ensure_ascii=False)
+        return json.dumps(payload, default=encode_value, separators=(",", ":"), ensure_ascii=False)
+
+
+# CSV / TSV cells by exact type: SET as MySQL writes it ("a,b"), other values as in JSON.
+# Types not listed (str, int, float, None) go to csv.writer as they are, None as an empty cell
+CELL_ENCODERS: dict[type, Callable[[Any], Any]] = {
+    **VALUE_ENCODERS,
+    set: lambda value: ",".join(sorted(value)),
+    frozenset: lambda value: ",".join(sorted(value)),
+}
+_PLAIN_CELLS = {str, int, float, bool, type(None)}
+
+
+def _cell(value: Any) -> Any:
+    encoder = CELL_ENCODERS.get(type(value))
+    if encoder is None:
+        return value if type(value) in _PLAIN_CELLS else encode_value(value)
+    return encoder(value)
+
+
+def _encode_delimited(result: dict[str, Any], delimiter: str) -> str:
+    with stage("encode"):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(result["columns"])
+        writer.writerows(
+            [value if type(value) in _PLAIN_CELLS else _cell(value) for value in row]
+            for row in result["rows"]
+        )
+        return buffer.getvalue()
+
+
+def _page_note(result: dict[str, Any]) -> list[TextContent]:
+    if not result["next_page_token"]:
+        return []
+    return [
+        TextContent(
+            type="text",
+            text=f"Truncated after {len(result['rows'])} rows. Call query again with "
+                 f"page_token \"{result['next_page_token']}\" for the next page.",
+        )
+    ]
+
+
+def _encode_objects(result: dict[str, Any]) -> list[TextContent]:
+    columns = result["columns"]
+    objects = [dict(zip(columns, row)) for row in result["rows"]]
+    return [TextContent(type="text", text=encode_json(objects, indent=True))] + _page_note(result)
+
+
+def _encode_rows(result: dict[str, Any]) -> list[TextContent]:
+    payload = {
+        "columns": result["columns"],
+        "rows": result["rows"],
+        "next_page_token": result["next_page_token"],
+    }
+    return [TextContent(type="text", text=encode_json(payload))]
+
+
+def _encode_columns(result: dict[str, Any]) -> list[TextContent]:
+    values = list(zip(*result["rows"])) if result["rows"] else [()] * len(result["columns"])
+    # names and arrays side by side rather than a dict, so repeated names keep their values
+    payload = {
+        "columns": result["columns"],
+        "values": values,
+        "next_page_token": result["next_page_token"],
+    }
+    return [TextContent(type="text", text=encode_json(payload))]
+
+
+# Output shapes of the query tool, name -> encoder of an execute_query result
+#   objects: the JSON list of row objects the query tool has always returned (indented),
+#            plus a second text block with the next page_token when there is one
+#   rows:    compact JSON, column names once then one array per row:
+#            {"columns": [...], "rows": [[...], ...], "next_page_token": ...}
+#   columns: compact JSON, one array per column, in the order of the names:
+#            {"columns": [...], "values": [[...], ...], "next_page_token": ...}
+#   csv/tsv: header line then one line per row, NULL as an empty cell, page note as for objects
+ENCODERS: dict[str, Callable[[dict[str, Any]], list[TextContent]]] = {
+    "objects": _encode_objects,
+    "rows": _encode_rows,
+    "columns": _encode_columns,
+    "csv": lambda result: [TextContent(type="text", text=_encode_delimited(result, ","))] + _page_note(result),
+    "tsv": lambda result: [TextContent(type="text", text=_encode_delimited(result, "\t"))] + _page_note(result),
+}
+
+
+def format_result(result: dict[str, Any], fmt: str = "objects") -> list[TextContent]:
+    """Encodes an execute_query result in one of the ENCODERS shapes"""
+    encoder = ENCODERS.get(fmt)
+    if encoder is None:
+        raise ValueError(f"Unknown format: {fmt}")
+    return encoder(result)
 
 
 async def list_tables() -> list[dict[str, Any]]:
     """List all tables in the database"""
-    async with get_connection() as cursor:
-        await cursor.execute("SHOW TABLES")
-        rows = await cursor.fetchall()
-        return rows
+    return await fetch_all("SHOW TABLES")
 
 
 async def describe_table(table_name: str) -> list[dict[str, Any]]:
@@ -80,10 +1163,117 @@ async def describe_table(table_name: str) -> list[dict[str, Any]]:
     if not table_name.replace("_", "").isalnum():
         raise ValueError("Invalid table name")
     
-    async with get_connection() as cursor:
-        await cursor.execute(f"DESCRIBE {table_name}")
-        rows = await cursor.fetchall()
-        return rows
+    return await fetch_all(f"DESCRIBE {table_name}")
+
+
+# Order of the values in each describe_schema column entry
+SCHEMA_COLUMN_FIELDS = ["name", "type", "nullable", "key", "default", "extra"]
+
+
+def _schema_filter(tables: Optional[list[str]], like: Optional[str]) -> tuple[str, tuple]:
+    """WHERE clause (and its arguments) for the current database, optionally some tables only"""
+    clause = "TABLE_SCHEMA = DATABASE()"
+    args: tuple = ()
+    if tables:
+        clause += f" AND TABLE_NAME IN ({', '.join(['%s'] * len(tables))})"
+        args += tuple(tables)
+    if like:
+        clause += " AND TABLE_NAME LIKE %s"
+        args += (like,)
+    return clause, args
+
+
+async def schema_fingerprint() -> tuple:
+    """
+    One small query that changes whenever a table, column or index of the current
+    database is added, dropped or altered: counts plus XORed checksums of their definitions
+    """
+    rows = await fetch_all(
+        "SELECT "
+        "(SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()) AS columns_count, "
+        "(SELECT BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, "
+        "IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA))) "
+        "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()) AS columns_crc, "
+        "(SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()) AS index_count, "
+        "(SELECT BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE))) "
+        "FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()) AS index_crc, "
+        "(SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL) AS foreign_key_count"
+    )
+    return tuple(rows[0].values())
+
+
+async def describe_schema(tables: Optional[list[str]] = None, like: Optional[str] = None) -> dict[str, Any]:
+    """
+    Columns, keys, indexes, foreign keys and approximate row counts of every table (or
+    the given tables / the ones matching a LIKE pattern) in four set based
+    information_schema queries run side by side, instead of one DESCRIBE per table.
+    """
+    where, args = _schema_filter(tables, like)
+    table_rows, column_rows, index_rows, foreign_key_rows = await asyncio.gather(
+        fetch_all(
+            "SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS FROM information_schema.TABLES "
+            f"WHERE {where} ORDER BY TABLE_NAME",
+            args,
+        ),
+        fetch_all(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA "
+            f"FROM information_schema.COLUMNS WHERE {where} ORDER BY TABLE_NAME, ORDINAL_POSITION",
+            args,
+        ),
+        fetch_all(
+            "SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS "
+            f"WHERE {where} ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX",
+            args,
+        ),
+        fetch_all(
+            "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+            f"FROM information_schema.KEY_COLUMN_USAGE WHERE {where} AND REFERENCED_TABLE_NAME IS NOT NULL "
+            "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION",
+            args,
+        ),
+    )
+
+    schema: dict[str, dict[str, Any]] = {}
+    for row in table_rows:
+        schema[row["TABLE_NAME"]] = {
+            "type": "view" if row["TABLE_TYPE"] == "VIEW" else "table",
+            "engine": row["ENGINE"],
+            "rows_approx": row["TABLE_ROWS"],
+            "columns": [],
+            "indexes": {},
+            "foreign_keys": [],
+        }
+    for row in column_rows:
+        if row["TABLE_NAME"] in schema:
+            schema[row["TABLE_NAME"]]["columns"].append([
+                row["COLUMN_NAME"],
+                row["COLUMN_TYPE"],
+                row["IS_NULLABLE"] == "YES",
+                row["COLUMN_KEY"] or None,
+                row["COLUMN_DEFAULT"],
+                row["EXTRA"] or None,
+            ])
+    for row in index_rows:
+        if row["TABLE_NAME"] in schema:
+            index = schema[row["TABLE_NAME"]]["indexes"].setdefault(
+                row["INDEX_NAME"], {"unique": not int(row["NON_UNIQUE"]), "columns": []}
+            )
+            index["columns"].append(row["COLUMN_NAME"])
+    for row in foreign_key_rows:
+        if row["TABLE_NAME"] in schema:
+            schema[row["TABLE_NAME"]]["foreign_keys"].append(
+                [row["COLUMN_NAME"], row["REFERENCED_TABLE_NAME"], row["REFERENCED_COLUMN_NAME"]]
+            )
+
+    return {"column_fields": SCHEMA_COLUMN_FIELDS, "tables": schema}
+
+
+async def cached_describe_schema(tables: Optional[list[str]] = None, like: Optional[str] = None) -> dict[str, Any]:
+    """describe_schema through the result cache, keyed on the schema fingerprint so any DDL is a miss"""
+    fingerprint = await schema_fingerprint()
+    key = ("describe_schema", tuple(sorted(tables or ())), like, fingerprint)
+    return await result_cache.get_or_load(key, lambda: describe_schema(tables, like), SCHEMA_CACHE_TTL)
 
 
 async def main():
@@ -107,11 +1297,61 @@ async def main():
                         "sql": {
                             "type": "string",
                             "description": "The SQL SELECT query to execute",
-                        }
+                        },
+                        "max_rows": {
+                            "type": "integer",
+                            "description": f"Rows per page, at most {MAX_ROWS}",
+                        },
+                        "page_token": {
+                            "type": "string",
+                            "description": "next_page_token of the previous page, to continue",
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": list(ENCODERS),
+                            "description": "objects: list of row objects (default); "
+                                           "rows: compact column header plus value arrays; "
+                                           "columns: column names plus one value array per column; "
+                                           "csv / tsv: header line plus one line per row",
+                        },
                     },
                     "required": ["sql"],
                 },
             ),
+            Tool(
+                name="query_batch",
+                description="Run several independent SELECT queries concurrently in one call. "
+                            "Results come back in order, each with its timing, columns and row arrays "
+                            "or its own error.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "statements": {
+                            "type": "array",
+                            "description": f"Up to {BATCH_MAX_STATEMENTS} statements",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "sql": {
+                                        "type": "string",
+                                        "description": "The SQL SELECT query to execute",
+                                    },
+                                    "max_rows": {
+                                        "type": "integer",
+                                        "description": f"Rows to return, at most {MAX_ROWS}",
+                                    },
+                                    "timeout": {
+                                        "type": "number",
+                                        "description": "Seconds before this statement is cancelled",
+                                    },
+                                },
+                                "required": ["sql"],
+                            },
+                        }
+                    },
+                    "required": ["statements"],
+                },
+            ),
             Tool(
                 name="list_tables",
                 description="List all tables in the database",
@@ -134,44 +1374,142 @@ async def main():
                     "required": ["table"],
                 },
             ),
+            Tool(
+                name="describe_schema",
+                description="Columns, keys, indexes, foreign keys and approximate row counts of many "
+                            "tables in one call (all tables by default). Columns are arrays in "
+                            "column_fields order.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "tables": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Only these tables",
+                        },
+                        "like": {
+                            "type": "string",
+                            "description": "Only tables whose name matches this SQL LIKE pattern, e.g. 'order%'",
+                        },
+                    },
+                },
+            ),
+            Tool(
+                name="pool_stats",
+                description="Connection pool size and use, acquire wait histogram and query latency percentiles",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                },
+            ),
+            Tool(
+                name="cache_stats",
+                description="Hit, miss and eviction counters of the query result cache",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                },
+            ),
+            Tool(
+                name="server_stats",
+                description="Latency percentiles of each tool and of its stages (acquire, execute, "
+                            "fetch, encode), peak memory and the slowest recent calls",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "profiles": {
+                            "type": "boolean",
+                            "description": "Include the cProfile / tracemalloc captures of slow calls",
+                        }
+                    },
+                },
+            ),
 
         ]
     
     @server.call_tool()
+    @call_stats.traced
     async def call_tool(name: str, arguments: Any) -> list[TextContent]:
         """Handle tool calls"""
         try:
             if name == "query":
                 sql = arguments.get("sql", "")
+                ensure_select(sql)
                 
-                # Security: Only allow SELECT queries
-                if not sql.strip().upper().startswith("SELECT"):
-                    raise ValueError("Only SELECT queries are allowed with the query tool")
-                
-                results = await execute_query(sql)
+                result = await cached_query(
+                    sql,
+                    max_rows=_row_limit(arguments.get("max_rows")),
+                    page_token=arguments.get("page_token"),
+                )
+                return format_result(result, arguments.get("format", "objects"))
+            
+            elif name == "query_batch":
+                start = time.perf_counter()
+                results = await query_batch(arguments.get("statements") or [])
+                payload = {
+                    "ms": round((time.perf_counter() - start) * 1000, 1),
+                    "results": results,
+                }
                 return [
                     TextContent(
                         type="text",
-                        text=json.dumps(results, indent=2, default=str),
+                        text=encode_json(payload),
                     )
                 ]
             
             elif name == "list_tables":
-                results = await list_tables()
+                results = await result_cache.get_or_load(("list_tables",), list_tables, SCHEMA_CACHE_TTL)
                 return [
                     TextContent(
                         type="text",
-                        text=json.dumps(results, indent=2, default=str),
+                        text=encode_json(results, indent=True),
                     )
                 ]
             
             elif name == "describe_table":
                 table = arguments.get("table", "")
-                results = await describe_table(table)
+                results = await result_cache.get_or_load(
+                    ("describe_table", table),
+                    lambda: describe_table(table),
+                    SCHEMA_CACHE_TTL,
+                )
                 return [
                     TextContent(
                         type="text",
-                        text=json.dumps(results, indent=2, default=str),
+                        text=encode_json(results, indent=True),
+                    )
+                ]
+            
+            elif name == "describe_schema":
+                results = await cached_describe_schema(arguments.get("tables"), arguments.get("like"))
+                return [
+                    TextContent(
+                        type="text",
+                        text=encode_json(results),
+                    )
+                ]
+            
+            elif name == "pool_stats":
+                return [
+                    TextContent(
+                        type="text",
+                        text=encode_json(pool_metrics.stats(), indent=True),
+                    )
+                ]
+            
+            elif name == "cache_stats":
+                return [
+                    TextContent(
+                        type="text",
+                        text=encode_json(result_cache.stats(), indent=True),
+                    )
+                ]
+            
+            elif name == "server_stats":
+                return [
+                    TextContent(
+                        type="text",
+                        text=encode_json(call_stats.stats(bool(arguments.get("profiles"))), indent=True),
                     )
                 ]
             
@@ -180,6 +1518,7 @@ async def main():
         
         except Exception as e:
             logger.error(f"Error executing tool {name}: {e}")
+            call_stats.failed(e)
             return [
                 TextContent(
                     type="text",
@@ -197,5 +1536,32 @@ async def main():
         )
 
 
+def parse_args() -> argparse.Namespace:
+    """Pool settings on the command line override the MYSQL_* environment variables"""
+    parser = argparse.ArgumentParser(description="MySQL MCP server")
+    parser.add_argument("--pool-min", type=int, default=POOL_CONFIG["minsize"], help="connections opened at startup")
+    parser.add_argument("--pool-max", type=int, default=POOL_CONFIG["maxsize"], help="most connections at once")
+    parser.add_argument("--pool-recycle", type=int, default=POOL_CONFIG["pool_recycle"],
+                        help="seconds before an idle connection is reopened (-1 never)")
+    parser.add_argument("--connect-timeout", type=float, default=POOL_CONFIG["connect_timeout"])
+    parser.add_argument("--acquire-timeout", type=float, default=POOL_CONFIG["acquire_timeout"],
+                        help="seconds to wait for a free connection")
+    parser.add_argument("--query-timeout", type=float, default=POOL_CONFIG["query_timeout"],
+                        help="seconds before a statement is killed on the server")
+    parser.add_argument("--ping-idle", type=float, default=POOL_CONFIG["ping_idle"],
+                        help="ping connections idle this many seconds on checkout (0 = always)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    POOL_CONFIG.update(
+        minsize=args.pool_min,
+        maxsize=args.pool_max,
+        pool_recycle=args.pool_recycle,
+        connect_timeout=args.connect_timeout,
+        acquire_timeout=args.acquire_timeout,
+        query_timeout=args.query_timeout,
+        ping_idle=args.ping_idle,
+    )
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,161 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+# 11/2025 approximate nearest neighbour index over SVD item factors
+#
+# An SVD estimate is mu + bu + bi + qi . pu, so for one user the ranking only
+# depends on [qi, bi] . [pu, 1] - a maximum inner product search (MIPS).
+# Items get one more dimension, sqrt(M^2 - |x|^2), so every item vector has the
+# same norm M; the query gets a 0 there. Then the nearest item in L2 is the
+# item with the largest inner product, and a plain k-means inverted file (IVF)
+# can be used: probe the nprobe lists whose centroids are closest to the query
+# and score only the items in them. More lists probed = better recall, slower.
+
+
+def augment_items(qi: np.ndarray, bi: np.ndarray) -> np.ndarray:
+  ''' [qi, bi, sqrt(M^2 - |[qi, bi]|^2)] rows, all with norm M '''
+  items = np.hstack([qi, bi[:, None]]).astype(np.float32)
+  norms = np.einsum('ij,ij->i', items, items)
+  extra = np.sqrt(np.maximum(norms.max() - norms, 0))
+  return np.hstack([items, extra[:, None]])
+
+
+def augment_users(pu: np.ndarray) -> np.ndarray:
+  ''' [pu, 1, 0] rows, so that item . user = qi . pu + bi '''
+  pu = np.atleast_2d(pu).astype(np.float32)
+  ones = np.ones((len(pu), 1), dtype=np.float32)
+  return np.hstack([pu, ones, np.zeros_like(ones)])
+
+
+def _nearest_centroid(points: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+  ''' Index of the closest centroid (L2) for each point, in blocks to bound memory '''
+  centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+  assign = np.empty(len(points), dtype=np.int32)
+  for start in range(0, len(points), block_size):
+    block = points[start:start + block_size]
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, |p|^2 doesn't change the argmin
+    assign[start:start + block_size] = np.argmin(centroid_norms[None, :] - 2 * block @ centroids.T, axis=1)
+  return assign
+
+
+def kmeans(points: np.ndarray, n_clusters: int, n_iter: int = 10, sample_size: int = 100_000, seed: int = 0) -> np.ndarray:
+  '''
+  Lloyd's k-means on a sample of the points, returns the centroids.
+  Empty clusters are re-seeded from random sample points.
+  '''
+  rng = np.random.default_rng(seed)
+  if len(points) > sample_size:
+    points = points[rng.choice(len(points), sample_size, replace=False)]
+
+  centroids = points[rng.choice(len(points), n_clusters, replace=False)].copy()
+  for _ in range(n_iter):
+    assign = _nearest_centroid(points, centroids)
+    counts = np.bincount(assign, minlength=n_clusters)
+
+    # sum each cluster's points as contiguous runs of the points sorted by cluster
+    filled = np.flatnonzero(counts)
+    starts = (np.cumsum(counts) - counts)[filled]
+    sums = np.add.reduceat(points[np.argsort(assign, kind='stable')], starts, axis=0)
+    centroids[filled] = sums / counts[filled, None]
+
+    empty = counts == 0
+    centroids[empty] = points[rng.choice(len(points), empty.sum(), replace=False)]
+
+  return centroids
+
+
+class IVFIndex:
+  '''
+  Inverted file index for top-n SVD recommendations.
+
+  centroids:   (n_lists, f + 2) k-means centroids of the augmented item vectors
+  list_ptr:    (n_lists + 1,) list l holds positions list_ptr[l]:list_ptr[l + 1]
+  list_items:  movie id at each position, grouped by list
+  list_vectors: augmented item vector at each position, so a probed list is one contiguous block
+  '''
+
+  def __init__(self, centroids: np.ndarray, list_ptr: np.ndarray, list_items: np.ndarray, list_vectors: np.ndarray):
+    self.centroids = centroids
+    self.list_ptr = list_ptr
+    self.list_items = list_items
+    self.list_vectors = list_vectors
+    self.centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+
+  @property
+  def n_lists(self) -> int:
+    return len(self.centroids)
+
+  @classmethod
+  def build(cls, qi: np.ndarray, bi: np.ndarray, n_lists: int = None, n_iter: int = 10, seed: int = 0) -> 'IVFIndex':
+    '''
+    Builds the index from item factors and biases (indexed by movie id).
+    n_lists defaults to about 4 * sqrt(n_items), so a probe scans roughly
+    sqrt(n_items) / 4 items per list.
+    '''
+    vectors = augment_items(qi, bi)
+    if n_lists is None:
+      n_lists = max(1, int(4 * np.sqrt(len(vectors))))
+    n_lists = min(n_lists, len(vectors))
+
+    centroids = kmeans(vectors, n_lists, n_iter=n_iter, seed=seed)
+    assign = _nearest_centroid(vectors, centroids)
+
+    list_items = np.argsort(assign, kind='stable').astype(np.int32)
+    list_ptr = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=n_lists), out=list_ptr[1:])
+    return cls(centroids, list_ptr, list_items, vectors[list_items])
+
+  def search(self, pu: np.ndarray, n: int, nprobe: int = 8, excluded: np.ndarray = None) -> tuple:
+    '''
+    Top n movies for one user factor vector, probing the nprobe (>= 1) closest lists.
+    excluded is an optional boolean mask over movie ids (e.g. already rated).
+    Returns (movie ids, qi . pu + bi) best first; may be shorter than n if the
+    probed lists hold fewer usable movies.
+    '''
+    if nprobe < 1:
+      raise ValueError(f"nprobe must be at least 1, got {nprobe}")
+    query = augment_users(pu)[0]
+    nprobe = min(nprobe, self.n_lists)
+
+    # closest centroids in L2, which is what the items were clustered by
+    distances = self.centroid_norms - 2 * self.centroids @ query
+    probed = np.argpartition(distances, nprobe - 1)[:nprobe]
+
+    positions = np.concatenate([np.arange(self.list_ptr[l], self.list_ptr[l + 1]) for l in probed])
+    items = self.list_items[positions]
+    scores = self.list_vectors[positions] @ query
+
+    if excluded is not None:
+      keep = ~excluded[items]
+      items, scores = items[keep], scores[keep]
+
+    n = min(n, len(items))
+    if n == 0:
+      return items[:0], scores[:0]
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return items[top], scores[top]
+
+  def save(self, path):
+    ''' Writes one .npy per array plus index.json, so load can memory-map them '''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / 'centroids.npy', self.centroids)
+    np.save(path / 'list_ptr.npy', self.list_ptr)
+    np.save(path / 'list_items.npy', self.list_items)
+    np.save(path / 'list_vectors.npy', self.list_vectors)
+    (path / 'index.json').write_text(json.dumps({'type': 'ivf', 'n_lists': self.n_lists, 'n_items': len(self.list_items)}))
+
+  @classmethod
+  def load(cls, path, mmap: bool = True) -> 'IVFIndex':
+    ''' Loads an index written by save, memory-mapping the item arrays by default '''
+    path = Path(path)
+    mmap_mode = 'r' if mmap else None
+    return cls(
+      np.load(path / 'centroids.npy'),
+      np.load(path / 'list_ptr.npy'),
+      np.load(path / 'list_items.npy', mmap_mode=mmap_mode),
+      np.load(path / 'list_vectors.npy', mmap_mode=mmap_mode),
+    )
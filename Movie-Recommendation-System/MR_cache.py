@@ -0,0 +1,189 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# 11/2025 recommendation result cache
+#
+# The front end asks for the same user's list on every page interaction. Results
+# are cached under (model version, user id, n, filters) in an in-process LRU with
+# a TTL, and optionally in a SQLite file that every worker process shares, so a
+# list computed by one worker is a hit in the others.
+#
+# Invalidation:
+#   - a new model version: keys carry the version, so they stop matching; the first
+#     lookup with a new version also purges the entries of the version it replaces.
+#     In SQLite only that version's rows (and rows past the TTL) are deleted, so workers
+#     still on another version during a rollout keep their entries
+#   - a user's ratings change: invalidate_user drops their entries. With SQLite the
+#     change time is recorded too, and memory hits older than it are dropped, so
+#     other workers never serve a list from before the change.
+
+
+class RecommendationCache:
+  '''
+  max_entries: in-process LRU size, ttl: seconds an entry is served,
+  db_path: optional SQLite file shared across processes (None for memory only)
+  '''
+
+  def __init__(self, max_entries: int = 10_000, ttl: float = 300.0, db_path=None):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.db_path = Path(db_path) if db_path else None
+    self._entries = OrderedDict()  # key -> (created, movies)
+    self._user_keys = {}           # user id -> keys, for invalidate_user
+    self._version = None
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._counts = dict.fromkeys(['hits', 'memory_hits', 'disk_hits', 'misses', 'evictions',
+                                  'expirations', 'invalidations'], 0)
+    if self.db_path is not None:
+      self.db_path.parent.mkdir(parents=True, exist_ok=True)
+      with self._db() as db:
+        db.execute('CREATE TABLE IF NOT EXISTS recommendations (version TEXT, user_id INTEGER, n INTEGER, '
+                   'filters TEXT, movies TEXT, created REAL, PRIMARY KEY (version, user_id, n, filters))')
+        db.execute('CREATE TABLE IF NOT EXISTS user_changes (user_id INTEGER PRIMARY KEY, changed REAL)')
+
+  def _db(self) -> sqlite3.Connection:
+    ''' One connection per thread, sqlite3 connections can't be shared between threads '''
+    db = getattr(self._local, 'db', None)
+    if db is None:
+      db = sqlite3.connect(self.db_path, timeout=5.0)
+      db.execute('PRAGMA journal_mode=WAL')
+      self._local.db = db
+    return db
+
+  @staticmethod
+  def _filters_key(filters: dict) -> str:
+    return json.dumps(filters or {}, sort_keys=True, default=str)
+
+  def _check_version(self, version: str):
+    '''
+    Purges the entries of the version this process replaces the first time a new version
+    is seen: every other version in memory, but in the shared SQLite file only the
+    replaced version's rows and rows past the TTL. Other workers may still serve
+    another version, and deleting every version but ours would wipe their entries.
+    '''
+    if version == self._version:
+      return
+    with self._lock:
+      if version == self._version:
+        return
+      replaced, self._version = self._version, version
+      stale = [key for key in self._entries if key[0] != version]
+      for key in stale:
+        self._drop(key)
+      self._counts['invalidations'] += len(stale)
+    if self.db_path is not None:
+      with self._db() as db:
+        db.execute('DELETE FROM recommendations WHERE version = ? OR created < ?', (replaced, time.time() - self.ttl))
+
+  def _drop(self, key):
+    self._entries.pop(key, None)
+    keys = self._user_keys.get(key[1])
+    if keys is not None:
+      keys.discard(key)
+      if not keys:
+        del self._user_keys[key[1]]
+
+  def _store(self, key, created: float, movies: tuple):
+    with self._lock:
+      self._entries[key] = (created, movies)
+      self._entries.move_to_end(key)
+      self._user_keys.setdefault(key[1], set()).add(key)
+      while len(self._entries) > self.max_entries:
+        self._drop(next(iter(self._entries)))
+        self._counts['evictions'] += 1
+
+  def _changed_since(self, user_id: int, created: float) -> bool:
+    row = self._db().execute('SELECT changed FROM user_changes WHERE user_id = ?', (user_id,)).fetchone()
+    return row is not None and row[0] >= created
+
+  def get(self, version: str, user_id: int, n: int, filters: dict = None):
+    ''' Cached movie ids for the key, or None '''
+    self._check_version(version)
+    key = (version, int(user_id), int(n), self._filters_key(filters))
+    now = time.time()
+
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and now - entry[0] > self.ttl:
+        self._drop(key)
+        self._counts['expirations'] += 1
+        entry = None
+      if entry is not None:
+        self._entries.move_to_end(key)
+
+    if entry is not None and self.db_path is not None and self._changed_since(key[1], entry[0]):
+      with self._lock:
+        self._drop(key)
+        self._counts['invalidations'] += 1
+      entry = None
+
+    if entry is not None:
+      with self._lock:
+        self._counts['hits'] += 1
+        self._counts['memory_hits'] += 1
+      return np.array(entry[1], dtype=np.int64)
+
+    if self.db_path is not None:
+      row = self._db().execute(
+        'SELECT movies, created FROM recommendations WHERE version = ? AND user_id = ? AND n = ? AND filters = ?', key
+      ).fetchone()
+      if row is not None and now - row[1] <= self.ttl and not self._changed_since(key[1], row[1]):
+        movies = tuple(json.loads(row[0]))
+        self._store(key, row[1], movies)
+        with self._lock:
+          self._counts['hits'] += 1
+          self._counts['disk_hits'] += 1
+        return np.array(movies, dtype=np.int64)
+
+    with self._lock:
+      self._counts['misses'] += 1
+    return None
+
+  def put(self, version: str, user_id: int, n: int, movies, filters: dict = None):
+    ''' Caches movie ids for the key, in memory and in the shared tier if any '''
+    self._check_version(version)
+    key = (version, int(user_id), int(n), self._filters_key(filters))
+    movies = tuple(int(movie) for movie in movies)
+    created = time.time()
+    self._store(key, created, movies)
+    if self.db_path is not None:
+      with self._db() as db:
+        db.execute('INSERT OR REPLACE INTO recommendations VALUES (?, ?, ?, ?, ?, ?)', (*key, json.dumps(movies), created))
+
+  def invalidate_user(self, user_id: int):
+    ''' Drops every cached list of the user, here and (with SQLite) in every other worker '''
+    user_id = int(user_id)
+    with self._lock:
+      keys = list(self._user_keys.get(user_id, ()))
+      for key in keys:
+        self._drop(key)
+      self._counts['invalidations'] += len(keys)
+    if self.db_path is not None:
+      with self._db() as db:
+        db.execute('DELETE FROM recommendations WHERE user_id = ?', (user_id,))
+        db.execute('INSERT OR REPLACE INTO user_changes VALUES (?, ?)', (user_id, time.time()))
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._user_keys.clear()
+    if self.db_path is not None:
+      with self._db() as db:
+        db.execute('DELETE FROM recommendations')
+
+  def stats(self) -> dict:
+    ''' Counters since start, to size max_entries / ttl '''
+    with self._lock:
+      stats = dict(self._counts)
+      stats['entries'] = len(self._entries)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats.update(max_entries=self.max_entries, ttl=self.ttl, db_path=str(self.db_path) if self.db_path else None)
+    return stats
@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from MR_store import RatingsStore
+
+# 11/2025 candidate tables for two stage retrieval
+#
+# Scoring every unseen movie per request costs O(n_items * f) and ranks movies
+# with one or two ratings next to well known ones. At training time we rank the
+# movies once, by number of ratings and by Bayesian average
+#   (C * global mean + sum of ratings) / (C + number of ratings)
+# overall and per genre. The union of the most popular movies and the best of
+# each genre is a bounded candidate pool that SVD re-ranks per request, and the
+# same tables answer users the model knows nothing about (cold start).
+
+_ARRAYS = ['counts', 'bayes', 'ranked', 'popular', 'genre_ptr', 'genre_items', 'pool']
+
+
+class CandidateTables:
+  '''
+  counts, bayes:          per movie id, number of ratings and Bayesian average rating
+  ranked, popular:        movie ids with at least min_ratings ratings, by bayes / by counts, best first
+  genre_ptr, genre_items: genre g's best movies by bayes are genre_items[genre_ptr[g]:genre_ptr[g + 1]]
+  pool:                   sorted movie ids SVD re-ranks, popular head + every genre's list
+  '''
+
+  def __init__(self, counts, bayes, ranked, popular, genre_ptr, genre_items, pool, genre_names: list, prior_weight: float):
+    self.counts = counts
+    self.bayes = bayes
+    self.ranked = ranked
+    self.popular = popular
+    self.genre_ptr = genre_ptr
+    self.genre_items = genre_items
+    self.pool = pool
+    self.genre_names = list(genre_names)
+    self.prior_weight = prior_weight
+
+  @classmethod
+  def build(cls, store: RatingsStore, min_ratings: int = 5, prior_weight: float = None,
+            n_popular: int = 2000, per_genre: int = 100) -> 'CandidateTables':
+    ''' Parameters: 1. 'store' RatingsStore with every rating (and genres, for the per genre tables)
+                    2. 'min_ratings' movies with fewer ratings are left out of every table
+                    3. 'prior_weight' C of the Bayesian average, default the mean ratings per rated movie
+                    4. 'n_popular' / 'per_genre' table sizes that go into the pool
+    '''
+    n_items = store.n_items
+    counts = np.diff(store.item_ptr).astype(np.int32)
+    sums = np.bincount(store.user_items, weights=store.user_ratings, minlength=n_items)
+    rated = counts > 0
+    global_mean = sums.sum() / max(counts.sum(), 1)
+    if prior_weight is None:
+      prior_weight = float(counts[rated].mean()) if rated.any() else 1.0
+    bayes = ((prior_weight * global_mean + sums) / (prior_weight + counts)).astype(np.float32)
+
+    eligible = np.flatnonzero(counts >= min_ratings)
+    # ties broken by movie id so the tables are the same from run to run
+    ranked = eligible[np.lexsort((eligible, -bayes[eligible]))].astype(np.int32)
+    popular = eligible[np.lexsort((eligible, -counts[eligible]))].astype(np.int32)
+
+    # per genre: walk the ranked movies once, keep the first per_genre of each genre
+    n_genres = len(store.genre_names)
+    genre_counts = store.genre_ptr[ranked + 1] - store.genre_ptr[ranked]
+    movie_of = np.repeat(ranked, genre_counts)
+    offsets = np.arange(genre_counts.sum()) - np.repeat(np.cumsum(genre_counts) - genre_counts, genre_counts)
+    genre_of = store.genre_ids[np.repeat(store.genre_ptr[ranked], genre_counts) + offsets].astype(np.int64)
+    by_genre = np.argsort(genre_of, kind='stable')
+    genre_of, movie_of = genre_of[by_genre], movie_of[by_genre]
+    starts = np.searchsorted(genre_of, np.arange(n_genres))
+    rank_in_genre = np.arange(len(genre_of)) - starts[genre_of]
+    keep = rank_in_genre < per_genre
+    genre_items = movie_of[keep].astype(np.int32)
+    genre_ptr = np.zeros(n_genres + 1, dtype=np.int64)
+    np.cumsum(np.bincount(genre_of[keep], minlength=n_genres), out=genre_ptr[1:])
+
+    pool = np.union1d(popular[:n_popular], genre_items).astype(np.int32)
+    return cls(counts, bayes, ranked, popular, genre_ptr, genre_items, pool, store.genre_names, prior_weight)
+
+  def genre_list(self, genre: str) -> np.ndarray:
+    ''' Best movies of one genre by Bayesian average '''
+    if genre not in self.genre_names:
+      raise ValueError(f"unknown genre {genre!r}")
+    g = self.genre_names.index(genre)
+    return self.genre_items[self.genre_ptr[g]:self.genre_ptr[g + 1]]
+
+  def cold_start(self, n: int, genres: list = None, excluded: np.ndarray = None) -> np.ndarray:
+    '''
+    Top n movie ids for a user the model can't score: the best Bayesian averages,
+    restricted to the given genres if any. excluded is an optional boolean mask
+    over movie ids (e.g. movies the user already rated).
+    '''
+    if genres:
+      movies = np.unique(np.concatenate([self.genre_list(genre) for genre in genres]))
+      movies = movies[np.lexsort((movies, -self.bayes[movies]))]
+    else:
+      movies = self.ranked
+    if excluded is not None:
+      movies = movies[~excluded[movies]]
+    return movies[:n]
+
+  def save(self, path):
+    ''' One .npy per array plus tables.json '''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name in _ARRAYS:
+      np.save(path / f'{name}.npy', getattr(self, name))
+    (path / 'tables.json').write_text(json.dumps({
+      'genre_names': self.genre_names, 'prior_weight': self.prior_weight, 'pool_size': len(self.pool),
+    }))
+
+  @classmethod
+  def load(cls, path, mmap: bool = True) -> 'CandidateTables':
+    ''' Loads tables written by save, memory-mapped read only by default '''
+    path = Path(path)
+    meta = json.loads((path / 'tables.json').read_text())
+    arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r' if mmap else None) for name in _ARRAYS}
+    return cls(genre_names=meta['genre_names'], prior_weight=meta['prior_weight'], **arrays)
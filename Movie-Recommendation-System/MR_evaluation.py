@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from MR_scoring import predict_pairs, score_users, top_n_from_scores
+
+# 11/2025 evaluation of the SVD recommender on the held out test_df
+#
+# Replaces model_svd.test(train_set.build_anti_testset()), which built a Python
+# tuple for every unrated (user, movie) pair and then took an RMSE over pairs
+# that have no true rating. Here RMSE is computed on the test ratings in one
+# vectorized pass (factor rows gathered a block of pairs at a time), and top-k
+# ranking metrics are computed a block of users at a time so memory stays at
+# block_size x movies no matter how many users there are.
+
+
+def rmse(factors: dict, ratings_df: pd.DataFrame) -> float:
+  '''
+  Root mean squared error of the model on the rows of ratings_df (userId, movieId, rating),
+  the same number accuracy.rmse(model_svd.test(...)) gives for those rows
+  '''
+  estimates = predict_pairs(factors, ratings_df['userId'].to_numpy(), ratings_df['movieId'].to_numpy())
+  errors = estimates - ratings_df['rating'].to_numpy()
+  return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def _by_user(user_ids: np.ndarray, values: np.ndarray) -> tuple:
+  ''' Sorts (user, value) pairs by user, returns (sorted users, values in the same order) '''
+  order = np.argsort(user_ids, kind='stable')
+  return user_ids[order], values[order]
+
+
+def _block_pairs(sorted_users: np.ndarray, sorted_values: np.ndarray, block: np.ndarray) -> tuple:
+  '''
+  (row in block, value) for every pair belonging to a user in block (sorted, unique),
+  found with two binary searches per user instead of scanning all pairs
+  '''
+  starts = np.searchsorted(sorted_users, block, side='left')
+  lengths = np.searchsorted(sorted_users, block, side='right') - starts
+  rows = np.repeat(np.arange(len(block)), lengths)
+  # position of each pair: its user's start plus its offset inside that user's run
+  offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+  return rows, sorted_values[np.repeat(starts, lengths) + offsets]
+
+
+def ranking_metrics(factors: dict, train_df: pd.DataFrame, test_df: pd.DataFrame, k: int = 10,
+                    threshold: float = 3.5, block_size: int = 256, sample_users: int = None, seed: int = 0) -> dict:
+  ''' Parameters: 1. 'factors' from extract_svd_factors
+                  2. 'train_df' ratings the model was fit on, never recommended back
+                  3. 'test_df' held out ratings, a movie rated >= threshold counts as relevant
+                  4. 'k' recommendations per user
+                  5. 'block_size' users scored per matrix product
+                  6. 'sample_users' evaluate a random sample of that many users instead of all of them
+      Returns:    1. dict with precision@k, recall@k, ndcg@k (means over evaluated users) and users
+
+      Outline:    1. users with at least one relevant test movie are evaluated
+                  2. per block, score every movie, mask train movies, take the top k
+                  3. look the top k up in a block x movies relevance mask
+  '''
+  n_items = len(factors['bi'])
+
+  relevant = test_df[test_df['rating'] >= threshold]
+  test_users, test_movies = _by_user(relevant['userId'].to_numpy(), relevant['movieId'].to_numpy())
+  train_users, train_movies = _by_user(train_df['userId'].to_numpy(), train_df['movieId'].to_numpy())
+
+  users = np.unique(test_users)
+  if sample_users is not None and sample_users < len(users):
+    users = np.sort(np.random.default_rng(seed).choice(users, sample_users, replace=False))
+
+  discounts = 1 / np.log2(np.arange(2, k + 2))
+  precision = recall = ndcg = 0.0
+
+  for start in range(0, len(users), block_size):
+    block = users[start:start + block_size]
+    rows = np.arange(len(block))
+
+    excluded = np.zeros((len(block), n_items), dtype=bool)
+    excluded[_block_pairs(train_users, train_movies, block)] = True
+    relevant_mask = np.zeros((len(block), n_items), dtype=bool)
+    relevant_mask[_block_pairs(test_users, test_movies, block)] = True
+    n_relevant = relevant_mask.sum(axis=1)
+
+    top = top_n_from_scores(score_users(factors, block), excluded, k)
+    hits = relevant_mask[rows[:, None], np.maximum(top, 0)] & (top >= 0)
+
+    n_hits = hits.sum(axis=1)
+    precision += (n_hits / k).sum()
+    recall += (n_hits / n_relevant).sum()
+    ideal = np.cumsum(discounts)[np.minimum(n_relevant, k) - 1]
+    ndcg += ((hits @ discounts[:hits.shape[1]]) / ideal).sum()
+
+  n_users = max(len(users), 1)
+  return {
+    f'precision@{k}': float(precision / n_users),
+    f'recall@{k}': float(recall / n_users),
+    f'ndcg@{k}': float(ndcg / n_users),
+    'users': len(users),
+  }
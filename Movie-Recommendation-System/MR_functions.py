@@ -1,152 +1,572 @@
 import os
-import requests
+import json
+import threading
 from pathlib import Path
-from surprise import Dataset, Reader
-from surprise.prediction_algorithms.matrix_factorization import SVD
-from surprise import accuracy
-import zipfile
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
-from sklearn.model_selection import train_test_split
 import time
+from MR_ann import IVFIndex
+from MR_store import RatingsStore, encode_genres
+from MR_candidates import CandidateTables
+from MR_cache import RecommendationCache
+from MR_scoring import extract_svd_factors, score_users, top_n_from_scores
+from MR_evaluation import rmse
+
+# 11/2025 importing this module no longer reads data or trains anything.
+# Training is one explicit step, train_model (run by Movie_Recommendation_System.py),
+# which publishes the factors, biases and id mappings as .npy artifacts.
+# Serving functions load the published model lazily through get_model(); the
+# arrays are memory-mapped read only, so worker processes share the same pages.
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / 'data' / 'ml-latest-small'
+ARTIFACT_DIR = Path(os.getenv('MR_ARTIFACT_DIR', str(BASE_DIR / 'artifacts' / 'model')))
+# ratings of folded in users, appended here and merged into the next training run
+RATINGS_LOG = Path(os.getenv('MR_RATINGS_LOG', str(BASE_DIR / 'artifacts' / 'ratings_log.csv')))
+# recommendation cache: entries per process, seconds served, and an optional SQLite file shared by workers
+CACHE_SIZE = int(os.getenv('MR_CACHE_SIZE', '10000'))
+CACHE_TTL = float(os.getenv('MR_CACHE_TTL', '300'))
+CACHE_DB = os.getenv('MR_CACHE_DB') or None
+
+# arrays saved per model version, everything else goes in meta.json
+_ARTIFACT_ARRAYS = ['pu', 'qi', 'bu', 'bi', 'known_users', 'known_items', 'movie_ids', 'user_ids']
+
+_model = None
+_model_lock = threading.Lock()
+# (inode, mtime) of ARTIFACT_DIR/CURRENT when _model was loaded, a publish replaces the file
+_model_stamp = None
+# encoded user id -> {'pu', 'bu', 'movies'} for users folded in since the model was loaded
+_folded_users = {}
+_recommendation_cache = RecommendationCache(CACHE_SIZE, CACHE_TTL, CACHE_DB)
+
+
+def load_data(data_dir: Path = DATA_DIR, ratings_log: Path = None) -> tuple:
+  '''
+  Reads the raw MovieLens csv files, returns (movies_df, ratings_df).
+  With ratings_log, the logged ratings of folded in users are appended to ratings_df.
+  '''
+  data_dir = Path(data_dir)
+  movies_df = pd.read_csv(data_dir / 'movies.csv')
+  ratings_df = pd.read_csv(data_dir / 'ratings.csv')
+  if ratings_log is not None and Path(ratings_log).exists():
+    ratings_df = pd.concat([ratings_df, pd.read_csv(ratings_log)], ignore_index=True)
+  return movies_df, ratings_df
 
-#get dataframe
-movies_df = pd.read_csv('data/ml-latest-small/movies.csv')
-tags_df = pd.read_csv('data/ml-latest-small/tags.csv')
-rating_df = pd.read_csv('data/ml-latest-small/ratings.csv')
-links_df = pd.read_csv('data/ml-latest-small/ratings.csv')
 
+def genre_matrix(movies_df: pd.DataFrame, movie_ids: np.ndarray) -> tuple:
+  '''
+  One-hot genres per movie as a sparse (len(movie_ids), n_genres) uint8 CSR matrix,
+  row i is movie_ids[i]. Returns (matrix, genre_names).
+  '''
+  from scipy import sparse
 
-#get data
-#merge files
-df = pd.merge(rating_df,movies_df[['movieId','genres']], on = 'movieId', how = 'left')
+  genre_ptr, genre_ids, genre_names = encode_genres(movies_df, movie_ids)
+  data = np.ones(len(genre_ids), dtype=np.uint8)
+  matrix = sparse.csr_matrix((data, genre_ids, genre_ptr), shape=(len(movie_ids), len(genre_names)))
+  return matrix, genre_names
 
-#create encoder for user and movies
-le = LabelEncoder()
-df['movieId'] = le.fit_transform(df['movieId'])
-df['userId'] = le.fit_transform(df['userId'])
 
-#add user and movie encoders
-user_encoder = LabelEncoder()
-movie_encoder = LabelEncoder()
-#create multiLabelBinarizer
-mlb = MultiLabelBinarizer()
+def prep_movies(movies_df: pd.DataFrame, ratings_df: pd.DataFrame, genres: bool = True) -> pd.DataFrame:
+  ''' Parameters: 1. 'movies_df' is a raw data frame
+                  2. 'ratings_df' is a raw dta frame
+                  3. 'genres' adds the one-hot genre columns, False for just the encoded ratings
+      Returns:    1. returns a processed and encoded dataframe ready for SVD algo
 
-#fit label encoders
-df['userId'] = user_encoder.fit_transform(df['userId'])
-df['movieId'] = movie_encoder.fit_transform(df['movieId'])
+      Outline:    1. encode ids, one sorted factorize per column: codes are positions in the
+                     sorted unique raw ids (int32), the order train_model relies on
+                  2. compact dtypes, float32 ratings
+                  3. split the genres once per movie into a sparse movie x genre matrix
+                  4. genre columns by looking up each rating's movie row (sparse uint8 columns),
+                     instead of splitting and one-hot encoding the genres of every rating
+                  5. return processed df
+  '''
+  #1 encode ids
+  user_codes, _ = pd.factorize(ratings_df['userId'], sort=True)
+  movie_codes, movie_ids = pd.factorize(ratings_df['movieId'], sort=True)
+
+  #2 compact columns, in the order of the raw ratings
+  df = pd.DataFrame({
+    'userId': user_codes.astype(np.int32),
+    'movieId': movie_codes.astype(np.int32),
+    'rating': ratings_df['rating'].to_numpy(dtype=np.float32),
+  }, index=ratings_df.index)
+  for column in ratings_df.columns.drop(['userId', 'movieId', 'rating']):
+    df[column] = ratings_df[column]
+  if not genres:
+    return df
+
+  #3 genres once per movie
+  matrix, genre_names = genre_matrix(movies_df, np.asarray(movie_ids))
+
+  #4 index lookup: row movie_codes[i] of the movie x genre matrix
+  genre_df = pd.DataFrame.sparse.from_spmatrix(matrix[movie_codes], index=df.index, columns=genre_names)
+  return pd.concat([df, genre_df], axis=1)
+
+
+def train_model(movies_df: pd.DataFrame, ratings_df: pd.DataFrame, artifact_dir: Path = ARTIFACT_DIR,
+                test_size: float = .2, random_state: int = None, **svd_params) -> dict:
+  ''' Parameters: 1. 'movies_df' and 'ratings_df' are raw data frames (see load_data)
+                  2. 'artifact_dir' is where the model is published, None to skip saving
+                  3. 'test_size' / 'random_state' are passed to train_test_split
+                  4. 'svd_params' are passed to surprise's SVD (n_factors, n_epochs, lr_all, reg_all...)
+      Returns:    1. dict with df, train_df, test_df, factors, movie_ids, user_ids, rmse, version
+                     (df holds the encoded ratings without genre columns, see genre_matrix)
+
+      Outline:    1. prep (ids only) and split the ratings
+                  2. fit SVD, pull the factors out by encoded id
+                  3. RMSE on the held out ratings
+                  4. build the ANN index, the ratings store and the candidate tables,
+                     publish everything as a new model version
+  '''
+  from surprise import Dataset, Reader
+  from surprise.prediction_algorithms.matrix_factorization import SVD
+  from sklearn.model_selection import train_test_split
+
+  #no genre columns: nothing trained or served reads them per rating, the store and the
+  #candidate tables take genres once per movie from movies_df
+  df = prep_movies(movies_df, ratings_df, genres=False)
+  #codes from prep_movies are positions in the sorted unique raw ids
+  movie_ids = np.unique(ratings_df['movieId'].to_numpy())
+  user_ids = np.unique(ratings_df['userId'].to_numpy())
+
+  train_df, test_df = train_test_split(df, test_size=test_size, random_state=random_state)
+
+  reader = Reader(rating_scale = (0.5,5))
+  data = Dataset.load_from_df(train_df[['userId','movieId','rating']],reader )
+  model_svd = SVD(**svd_params)
+  model_svd.fit(data.build_full_trainset())
+
+  factors = extract_svd_factors(model_svd, len(user_ids), len(movie_ids))
+  result = {
+    'df': df,
+    'train_df': train_df,
+    'test_df': test_df,
+    'factors': factors,
+    'movie_ids': movie_ids,
+    'user_ids': user_ids,
+    'rmse': rmse(factors, test_df),
+    'version': None,
+  }
+
+  if artifact_dir is not None:
+    index = IVFIndex.build(factors['qi'], factors['bi'])
+    #all ratings (train and test), so serving never recommends something already rated
+    store = RatingsStore.from_ratings(df, movies_df, movie_ids, n_users=len(user_ids), n_items=len(movie_ids))
+    candidates = CandidateTables.build(store)
+    result['version'] = save_model_artifacts(artifact_dir, factors, movie_ids, user_ids, index, store,
+                                             metrics={'rmse': result['rmse']}, candidates=candidates)
+
+  return result
+
+
+def save_model_artifacts(artifact_dir: Path, factors: dict, movie_ids: np.ndarray, user_ids: np.ndarray,
+                         index: IVFIndex = None, store: RatingsStore = None, metrics: dict = None,
+                         candidates: CandidateTables = None) -> str:
+  '''
+  Publishes a model as artifact_dir/<version>/ (one .npy per array, float32 factors,
+  meta.json for the scalars, ann_index/ for the index, store/ for the ratings,
+  candidates/ for the popularity tables) and then points
+  artifact_dir/CURRENT at it. CURRENT is swapped atomically, so a reader sees the
+  old model or the new one, never a half written one. Returns the version.
+  '''
+  artifact_dir = Path(artifact_dir)
+  version = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+  model_dir = artifact_dir / version
+  model_dir.mkdir(parents=True, exist_ok=True)
+
+  arrays = {
+    'pu': factors['pu'].astype(np.float32),
+    'qi': factors['qi'].astype(np.float32),
+    'bu': factors['bu'].astype(np.float32),
+    'bi': factors['bi'].astype(np.float32),
+    'known_users': factors['known_users'],
+    'known_items': factors['known_items'],
+    'movie_ids': movie_ids,
+    'user_ids': user_ids,
+  }
+  for name in _ARTIFACT_ARRAYS:
+    np.save(model_dir / f'{name}.npy', arrays[name])
+
+  meta = {
+    'version': version,
+    'mu': float(factors['mu']),
+    'rating_scale': list(factors['rating_scale']),
+    'biased': bool(factors['biased']),
+    'metrics': metrics or {},
+  }
+  (model_dir / 'meta.json').write_text(json.dumps(meta, indent=2))
+  if index is not None:
+    index.save(model_dir / 'ann_index')
+  if store is not None:
+    store.save(model_dir / 'store')
+  if candidates is not None:
+    candidates.save(model_dir / 'candidates')
+
+  current_tmp = artifact_dir / f'CURRENT.{os.getpid()}.tmp'
+  current_tmp.write_text(version)
+  os.replace(current_tmp, artifact_dir / 'CURRENT')
+  return version
+
+
+def load_model_artifacts(artifact_dir: Path = ARTIFACT_DIR, version: str = None, mmap: bool = True) -> dict:
+  '''
+  Loads a published model (the CURRENT one unless version is given).
+  With mmap the arrays are read only memory maps, so loading takes milliseconds
+  and processes loading the same version share one copy in the page cache.
+  Returns dict with version, factors (as extract_svd_factors), movie_ids, user_ids, ann_index, store, candidates
+  '''
+  artifact_dir = Path(artifact_dir)
+  if version is None:
+    version = (artifact_dir / 'CURRENT').read_text().strip()
+  model_dir = artifact_dir / version
+
+  meta = json.loads((model_dir / 'meta.json').read_text())
+  arrays = {name: np.load(model_dir / f'{name}.npy', mmap_mode='r' if mmap else None) for name in _ARTIFACT_ARRAYS}
+
+  factors = {name: arrays[name] for name in ['pu', 'qi', 'bu', 'bi', 'known_users', 'known_items']}
+  factors.update(mu=meta['mu'], rating_scale=tuple(meta['rating_scale']), biased=meta['biased'])
+
+  ann_index = None
+  if (model_dir / 'ann_index').exists():
+    ann_index = IVFIndex.load(model_dir / 'ann_index', mmap=mmap)
+  store = None
+  if (model_dir / 'store').exists():
+    store = RatingsStore.load(model_dir / 'store', mmap=mmap)
+  candidates = None
+  if (model_dir / 'candidates').exists():
+    candidates = CandidateTables.load(model_dir / 'candidates', mmap=mmap)
+
+  return {
+    'version': meta['version'],
+    'factors': factors,
+    'movie_ids': arrays['movie_ids'],
+    'user_ids': arrays['user_ids'],
+    'ann_index': ann_index,
+    'store': store,
+    'candidates': candidates,
+    'metrics': meta['metrics'],
+  }
+
+
+def _current_stamp():
+  ''' Identifies the CURRENT pointer file with one stat call, None if nothing is published '''
+  try:
+    st = os.stat(Path(ARTIFACT_DIR) / 'CURRENT')
+  except FileNotFoundError:
+    return None
+  return st.st_ino, st.st_mtime_ns
 
-# create list of genres via the "|", and take out the old genres field
-genres_list = df.pop('genres').str.split('|')
 
-#create MLB data
-MLB_data = mlb.fit_transform(genres_list)
-#create MLB data frame
-MLB_df = pd.DataFrame(MLB_data,columns=mlb.classes_, index = df.index)
-# join MLB to main data frame by the
-df = df.join(MLB_df)
-# clean data frame, pop
-df = df.drop('(no genres listed)', axis=1)
+def get_model() -> dict:
+  '''
+  The published model from ARTIFACT_DIR, loaded on first use and shared after that.
+  Every call stats ARTIFACT_DIR/CURRENT; once a newer version is published there the
+  next call loads it, as reload_model does, and cached lists of the old version stop matching.
+  '''
+  global _model, _model_stamp
+  stamp = _current_stamp()
+  if _model is None or stamp != _model_stamp:
+    with _model_lock:
+      if _model is None or stamp != _model_stamp:
+        if _model is not None and (stamp is None or
+                                   (Path(ARTIFACT_DIR) / 'CURRENT').read_text().strip() == _model['version']):
+          # rewritten with the same version (or removed), keep the loaded model and its folded in users
+          _model_stamp = stamp
+        else:
+          model = load_model_artifacts(ARTIFACT_DIR)
+          if _model is not None:
+            _folded_users.clear()
+          _model, _model_stamp = model, stamp
+  return _model
+
+
+def reload_model() -> dict:
+  '''
+  Drops the loaded model so the next get_model() picks up a newly published version.
+  Folded in users are dropped too, the retrained model has them from the ratings log.
+  '''
+  global _model, _model_stamp
+  with _model_lock:
+    _model = None
+    _model_stamp = None
+    _folded_users.clear()
+  return get_model()
+
+
+def fold_in_user(user_movie_scores: list[tuple[int,float]], n_iters: int = 5, reg: float = 0.1) -> tuple:
+  ''' Parameters: 1. user_movie_scores list of (encoded movieId, rating) tuples
+                  2. n_iters alternating least squares rounds
+                  3. reg ridge penalty per rating (ALS-WR style, scaled by the number of ratings)
+      Returns:    1. (pu, bu) for the user, solved against the frozen item factors
+
+      Outline:    1. start from pu = 0, bu = 0
+                  2. bu = mean residual of r - mu - bi - qi.pu (shrunk by reg)
+                  3. pu = ridge solve of qi against r - mu - bi - bu, a k x k system
+  '''
+  factors = get_model()['factors']
+  movies = np.array([pair[0] for pair in user_movie_scores], dtype=np.int64)
+  ratings = np.array([pair[1] for pair in user_movie_scores], dtype=np.float64)
 
-#Train Test Split
-train_df, test_df = train_test_split(df,test_size=.2,train_size=.8)
+  qi = np.asarray(factors['qi'][movies], dtype=np.float64)
+  bi = np.asarray(factors['bi'][movies], dtype=np.float64)
+  mu = factors['mu'] if factors['biased'] else 0.0
+  penalty = reg * len(ratings)
 
-#Get reader,data and trainset
-reader = Reader(rating_scale = (0.5,5))
-data = Dataset.load_from_df(train_df[['userId','movieId','rating']],reader )
-train_set = data.build_full_trainset()
+  pu = np.zeros(qi.shape[1])
+  bu = 0.0
+  gram = qi.T @ qi + penalty * np.eye(qi.shape[1])
+  for _ in range(n_iters):
+    if factors['biased']:
+      bu = (ratings - mu - bi - qi @ pu).sum() / (len(ratings) + penalty)
+    pu = np.linalg.solve(gram, qi.T @ (ratings - mu - bi - bu))
 
-#Create model svc
-model_svd = SVD()
-model_svd.fit(train_set)
+  return pu, bu
 
-prediction_svd = model_svd.test(train_set.build_anti_testset())
-accuracy.rmse(prediction_svd)
 
+def _score_folded(factors: dict, user: dict) -> np.ndarray:
+  ''' Every movie's predicted rating for a folded in user, as score_users does for trained ones '''
+  scores = user['bu'] + factors['bi'] + factors['qi'] @ user['pu']
+  scores = scores + (factors['mu'] if factors['biased'] else 0.0)
+  low, high = factors['rating_scale']
+  return np.clip(scores, low, high)
 
 
+def _check_user_movie_scores(user_movie_scores: list[tuple[int,float]], has_movie, source: str):
+  '''
+  Raises unless user_movie_scores is a list of (movie id, rating) pairs whose movie ids
+  has_movie knows and whose ratings are on the model's scale, 0.5 - 5.0 in steps of .5.
+  source names where the movie ids are looked up, for the error message.
+  '''
+  if not isinstance(user_movie_scores, list):
+    raise TypeError("Input 'user_movie_scores' must be a list of tuples with an int,float")
 
-def prep_movies(movies_df: pd.DataFrame, ratings_df: pd.DataFrame) -> pd.DataFrame:
-  ''' Parameters: 1. 'movies_df' is a raw data frame
-                  2. 'ratings_df' is a raw dta frame
-      Returns:    1. returns a processed and encoded dataframe ready for SVD algo
+  for movie_pair in user_movie_scores:
+    if not isinstance(movie_pair, (tuple, list)) or len(movie_pair) != 2:
+      raise TypeError(f"the entry {movie_pair!r} in 'user_movie_scores' must be a (movie id, rating) tuple")
+    movie_id, rating = movie_pair
+    if isinstance(movie_id, bool) or not isinstance(movie_id, (int, np.integer)):
+      raise TypeError(f"the movie id {movie_id!r} must be an int")
+    if isinstance(rating, bool) or not isinstance(rating, (int, float, np.integer, np.floating)):
+      raise TypeError(f"the movie rating {rating!r} for movie id {movie_id} must be a number")
+    if not has_movie(movie_id):
+      raise Exception(f"the movie id {movie_id} is not found in {source}")
+    if not 0.5 <= rating <= 5 or rating * 2 != round(rating * 2):
+      raise Exception(f"the movie rating {rating} for movie id {movie_id} must be between 0.5 and 5 in steps of .5")
+
+
+def fold_in_new_user(new_user_id: int, user_movie_scores: list[tuple[int,float]], n: int = 5,
+                     ratings_log: Path = RATINGS_LOG) -> np.ndarray:
+  ''' Parameters: 1. new_user_id encoded id for the user, past the ids the model was trained on
+                  2. user_movie_scores list of (encoded movieId, rating) tuples
+                  3. n is the amount of recommendations returned
+                  4. ratings_log csv the ratings are appended to for the next retrain
+      Returns:    1. the top n raw movieIds for the user, without retraining
+
+      The user's factors are solved by fold_in_user and kept in process, so later
+      get_best_n_recommendations / recommend_many calls for new_user_id use them.
+      The next training run (load_data(..., ratings_log)) makes them a regular user.
+  '''
+  model = get_model()
+  n_trained = len(model['user_ids'])
+  if isinstance(new_user_id, bool) or not isinstance(new_user_id, (int, np.integer)):
+    raise TypeError("Input 'new_user_id' must be an int")
+  if new_user_id < n_trained or new_user_id in _folded_users:
+    raise Exception(f" the new_user_id {new_user_id} is not unique")
+  n_items = len(model['factors']['bi'])
+  _check_user_movie_scores(user_movie_scores, lambda movie_id: 0 <= movie_id < n_items, 'the published model')
+  if not user_movie_scores:
+    raise Exception("Input 'user_movie_scores' needs at least one rating")
+
+  pu, bu = fold_in_user(user_movie_scores)
+  movies = np.array([pair[0] for pair in user_movie_scores], dtype=np.int64)
+  _folded_users[new_user_id] = {'pu': pu, 'bu': bu, 'movies': movies}
+  _recommendation_cache.invalidate_user(new_user_id)
+
+  #log with raw ids; new users continue after the largest raw userId in the same order
+  raw_user_id = int(model['user_ids'].max()) + 1 + (new_user_id - n_trained)
+  log_rows = pd.DataFrame({
+    'userId': raw_user_id,
+    'movieId': model['movie_ids'][movies],
+    'rating': [pair[1] for pair in user_movie_scores],
+    'timestamp': int(time.time()),
+  })
+  ratings_log = Path(ratings_log)
+  ratings_log.parent.mkdir(parents=True, exist_ok=True)
+  log_rows.to_csv(ratings_log, mode='a', header=not ratings_log.exists(), index=False)
+
+  excluded = np.zeros((1, len(model['factors']['bi'])), dtype=bool)
+  excluded[0, movies] = True
+  top = top_n_from_scores(_score_folded(model['factors'], _folded_users[new_user_id])[None, :], excluded, n)[0]
+  return model['movie_ids'][top[top >= 0]]
+
+#11/5/25, depends
 
-      Outline:    1. merge the dataframes (movies and ratings)
-                  2. encode ids
-                  3. create encoder objects and multi-label-binarizer
-                  4. fit label encoders, process "|" column
-                  5. Process MLB
-                  6. return processed df
+def explore_dir(path):
+  """ This would explore the directory and return the outline of it """
+  for dir_path, dir_names, file_names in os.walk(path):
+    print(f"Directory count {len(dir_names)}, movies count {len(file_names)} in '{file_names}'")
 
 
+def _excluded_movies(df, user_ids: np.ndarray, n_items: int) -> np.ndarray:
+  '''
+  Boolean (len(user_ids), n_items) mask of movies not to recommend:
+  ones the user already rated and ones that are not in df at all.
+  df can be a RatingsStore (CSR slices), None for the published model's store,
+  or a processed DataFrame (scanned).
   '''
-  df = pd.merge(rating_df,movies_df[['movieId','genres']], on = 'movieId', how = 'left')
+  if df is None:
+    df = get_model()['store']
+  if isinstance(df, RatingsStore):
+    return df.excluded_mask(user_ids)
 
-  #create encoder for movieId and userId
-  le = LabelEncoder()
-  df['movieId'] = le.fit_transform(df['movieId'])
-  df['userId'] = le.fit_transform(df['userId'])
+  df_users = df['userId'].to_numpy()
+  df_movies = df['movieId'].to_numpy()
 
-  #merge files
+  excluded = np.ones((len(user_ids), n_items), dtype=bool)
+  excluded[:, df_movies] = False
 
-  #2 add user and movie encoders
-  user_encoder = LabelEncoder()
-  movie_encoder = LabelEncoder()
+  # position of each rating's user in user_ids, for the ratings that belong to them
+  order = np.argsort(user_ids, kind='stable')
+  pos = np.searchsorted(user_ids[order], df_users)
+  pos = np.minimum(pos, len(user_ids) - 1)
+  hit = user_ids[order][pos] == df_users
+  excluded[order[pos[hit]], df_movies[hit]] = True
+  return excluded
 
-  #3 create multiLabelBinarizer
-  mlb = MultiLabelBinarizer()
 
-  #4 fit label encoders
-  df['userId'] = user_encoder.fit_transform(df['userId'])
-  df['movieId'] = movie_encoder.fit_transform(df['movieId'])
-  # create list of genres via the "|", and take out the old genres field
-  genres_list = df.pop('genres').str.split('|')
+def _cold_users(factors: dict, user_ids: np.ndarray) -> np.ndarray:
+  ''' Mask of users with no trained factors and not folded in, the model can't personalize for them '''
+  in_range = user_ids < len(factors['known_users'])
+  known = np.zeros(len(user_ids), dtype=bool)
+  known[in_range] = factors['known_users'][user_ids[in_range]]
+  folded = np.fromiter((user_id in _folded_users for user_id in user_ids.tolist()), dtype=bool, count=len(user_ids))
+  return ~known & ~folded
 
-  #5, create MLB data
-  MLB_data = mlb.fit_transform(genres_list)
-  #create MLB data frame
-  MLB_df = pd.DataFrame(MLB_data,columns=mlb.classes_, index = df.index)
-  # join MLB to main data frame by the
-  df = df.join(MLB_df)
-  # clean data frame, pop
-  df = df.drop('(no genres listed)', axis=1)
 
-  return df
+def cold_start_recommendations(n: int = 5, genres: list = None) -> np.ndarray:
+  ''' Top n raw movieIds from the published popularity tables, optionally only from the given genres '''
+  model = get_model()
+  filters = {'genres': sorted(genres or [])}
+  cached = _recommendation_cache.get(model['version'], -1, n, filters)
+  if cached is not None:
+    return cached
+  recommendations = model['movie_ids'][model['candidates'].cold_start(n, genres)]
+  _recommendation_cache.put(model['version'], -1, n, recommendations, filters)
+  return recommendations
 
-#11/5/25, depends
 
-def explore_dir(path):
-  """ This would explore the directory and return the outline of it """
-  for dir_path, dir_names, file_names in os.walk(path):
-    print(f"Directory count {len(dir_names)}, movies count {len(file_names)} in '{file_names}'")
+def recommendation_cache_stats() -> dict:
+  ''' Hits, misses, hit_ratio, evictions, expirations, invalidations of the recommendation cache '''
+  return _recommendation_cache.stats()
 
 
 # 11/5/25
-def get_best_n_recommendations(df: pd.DataFrame, user_id: str, n: int = 5):
-  ''' Parameters: 1. df needs to be a processed.
+def get_best_n_recommendations(df, user_id: str, n: int = 5, nprobe: int = None, candidates: bool = True,
+                               use_cache: bool = True):
+  ''' Parameters: 1. df needs to be a processed, or a RatingsStore, or None for the published model's store
+                     (the store answers "what has this user rated" without scanning every rating)
                   2. user_id will represent a type string and will be an id found in the
                     user_df
                   3. n is a "int" type and will return the amount recommendations returned
-
+                  4. nprobe, None scores every movie exactly. An int uses the ANN index instead and
+                     only scores the movies in the nprobe closest index lists (faster, approximate)
+                  5. candidates, only re-rank the published candidate pool (popular movies and the
+                     best of each genre) instead of every movie, see recommend_many
+                  6. use_cache, serve / store the list in the recommendation cache, keyed by model
+                     version, user_id, n and the options above. Only lists against the published
+                     store (df None) are cached, a df or store passed in can differ from it.
+                     create_new_user and fold_in_new_user invalidate the user's entries, a new
+                     model version (noticed by get_model) invalidates everything
+
+      Scores the candidate movies for the user in one product against the SVD factors,
+      masks the ones they have seen and takes the top n with argpartition.
+      Users the model has no factors for get the popularity tables' top n (cold start).
   '''
-  # Get the amount of movies this user has
-  user_movies = df[df['userId'] == user_id]['movieId'].unique()
-  # return all the movies minus the ones' this user has seen
-  all_movies = df['movieId'].unique()
-
-  movies_to_predict = list(set(all_movies) - set(user_movies))
-  # use the model to return the amount of movies to see
-  user_movie_pairs = [(user_id,movie_id, 0) for movie_id in movies_to_predict]
-
-  predictions_cf = model_svd.test(user_movie_pairs)
-
-  top_n_recommendations = sorted(predictions_cf, key = lambda x: x.est, reverse = True)[:n]
-
-  top_n_movie_ids = [int(pred.iid) for pred in top_n_recommendations]
-
-  top_n_movies = movie_encoder.inverse_transform(top_n_movie_ids)
-
-  return top_n_movies
+  model = get_model()
+  filters = {'nprobe': nprobe, 'candidates': candidates}
+  use_cache = use_cache and df is None
+  if use_cache:
+    cached = _recommendation_cache.get(model['version'], user_id, n, filters)
+    if cached is not None:
+      return cached
+
+  recommendations = _best_n_recommendations(df, user_id, n, nprobe, candidates)
+  if use_cache:
+    _recommendation_cache.put(model['version'], user_id, n, recommendations, filters)
+  return recommendations
+
+
+def _best_n_recommendations(df, user_id: int, n: int, nprobe: int, candidates: bool) -> np.ndarray:
+  ''' get_best_n_recommendations without the cache '''
+  if nprobe is not None:
+    model = get_model()
+    factors = model['factors']
+    n_items = len(factors['bi'])
+    excluded = _excluded_movies(df, np.array([user_id], dtype=np.int64), n_items)[0]
+    if model['candidates'] is not None and _cold_users(factors, np.array([user_id], dtype=np.int64))[0]:
+      return model['movie_ids'][model['candidates'].cold_start(n, excluded=excluded)]
+    if user_id in _folded_users:
+      # folded in since the model was published: their solved factors, and the movies
+      # they rated are not in the published store yet
+      pu = _folded_users[user_id]['pu']
+      excluded[_folded_users[user_id]['movies']] = True
+    elif user_id < len(factors['pu']):
+      pu = factors['pu'][user_id]
+    else:
+      pu = np.zeros(factors['pu'].shape[1])
+    top_n_movie_ids, _ = model['ann_index'].search(pu, n, nprobe, excluded)
+    return model['movie_ids'][top_n_movie_ids]
+
+  top_n_movies = recommend_many(df, [user_id], n, candidates=candidates)[0]
+  return top_n_movies[top_n_movies >= 0]
+
+
+def recommend_many(df, user_ids: list, n: int = 5, block_size: int = 1024, candidates: bool = False) -> np.ndarray:
+  ''' Parameters: 1. df needs to be a processed, or a RatingsStore, or None for the published model's store
+                  2. user_ids is a list of encoded user ids
+                  3. n is the amount of recommendations per user
+                  4. block_size is how many users are scored per matrix product,
+                     it bounds memory at block_size x movies scores
+                  5. candidates, score only the published candidate pool instead of every movie:
+                     a fixed number of columns per user whatever the catalog size, and no
+                     movies with a handful of ratings
+
+      Returns a (len(user_ids), n) array of raw movieIds, best first, padded with -1 when
+      a user has fewer than n unseen movies. Used for the nightly precompute of every user.
+      Cold start users (no trained or folded in factors) are served from the popularity tables.
+  '''
+  model = get_model()
+  factors = model['factors']
+  tables = model['candidates']
+  user_ids = np.asarray(user_ids, dtype=np.int64)
+  n_items = len(factors['bi'])
+  results = np.full((len(user_ids), n), -1, dtype=np.int64)
+  items = tables.pool if candidates and tables is not None else None
+
+  for start in range(0, len(user_ids), block_size):
+    block = user_ids[start:start + block_size]
+    scores = score_users(factors, block, items)
+    excluded = _excluded_movies(df, block, n_items)
+    for row, user_id in enumerate(block):
+      if user_id in _folded_users:
+        folded_scores = _score_folded(factors, _folded_users[user_id])
+        scores[row] = folded_scores if items is None else folded_scores[items]
+        excluded[row, _folded_users[user_id]['movies']] = True
+
+    top = top_n_from_scores(scores, excluded if items is None else excluded[:, items], n)
+    valid = top >= 0
+    if items is not None:
+      top[valid] = items[top[valid]]
+    top[valid] = model['movie_ids'][top[valid]]
+    results[start:start + len(block), :top.shape[1]] = top
+
+    if tables is not None:
+      for row in np.flatnonzero(_cold_users(factors, block)):
+        movies = model['movie_ids'][tables.cold_start(n, excluded=excluded[row])]
+        results[start + row] = -1
+        results[start + row, :len(movies)] = movies
+
+  return results
 
 
 def get_titles(movie_df: pd.DataFrame,ids: list) -> list:
@@ -163,7 +583,7 @@ def get_titles(movie_df: pd.DataFrame,ids: list) -> list:
 
     assert 'movieId' in movie_df.columns
     assert 'title' in movie_df.columns
-    return movies_df[movies_df['movieId'].isin(ids)]
+    return movie_df[movie_df['movieId'].isin(ids)]
 
 
 
@@ -173,7 +593,7 @@ def get_titles(movie_df: pd.DataFrame,ids: list) -> list:
   return ""
 
 #added create_new_user function for gradio 11/17/25
-def create_new_user(df: pd.DataFrame, new_user_id: int, user_movie_scores: list[tuple[int,float]] ) -> pd.DataFrame:
+def create_new_user(df: pd.DataFrame, new_user_id: int, user_movie_scores: list[tuple[int,float]], store: RatingsStore = None) -> pd.DataFrame:
   '''
     purpose:
             This function will take in a new_user_id, a dataframe and user_movie_scores
@@ -187,7 +607,8 @@ def create_new_user(df: pd.DataFrame, new_user_id: int, user_movie_scores: list[
     args:
         df - this is a dataframe where we get the genre information about the movies entered.
         new_user_id - this will be a new user_id that is unique to the df frame colum user_Id.
-        user_movie_scores - this should be a list of tuples, the first value is the movie_Id the second is a rating of 0.0 - 5.0 the increment of .5
+        user_movie_scores - this should be a list of tuples, the first value is the movie_Id the second is a rating of 0.5 - 5.0 the increment of .5
+        store - optional RatingsStore of df, answers the user / movie checks without touching df
     return:
         returns rows in the same format as rows in the df pandas data frame.
 
@@ -209,24 +630,31 @@ def create_new_user(df: pd.DataFrame, new_user_id: int, user_movie_scores: list[
   if not 'userId' in df.columns:
     raise Exception("the 'userId' column is not in DataFrame 'df'")
 
-  if new_user_id in set(df['userId']):
-    raise Exception(f" the new_user_id {new_user_id} is not unique")
-
-  for movie_pair in user_movie_scores:
-    if not movie_pair[0] in list(df['movieId']):
-      raise Exception(f"the movie id {movie_pair[0]} is not found in the data frame 'df'")
-    if movie_pair[1] > 5 or movie_pair[1] < 0:
-      raise Exception(f"the movie rating {movie_pair[1]} for movie id {movie_pair[0]} must be between 0 and 5")
+  #membership lookups: O(1) from the store, otherwise one pass over df to build them
+  if store is not None:
+    has_user, has_movie = store.has_user, store.has_item
+  else:
+    known_users = set(df['userId'].unique())
+    known_movies = set(df['movieId'].unique())
+    has_user, has_movie = known_users.__contains__, known_movies.__contains__
 
-  #capture current df into df_result 11/17/25
-  df_result = df.copy(deep=True)
-
-  #Loop through the user_movie_scores
+  if has_user(new_user_id):
+    raise Exception(f" the new_user_id {new_user_id} is not unique")
 
-  for movie_pair in user_movie_scores:
-    row = df[df['movieId'] == movie_pair[0]].iloc[0:1]
-    row[['userId','rating','timestamp']] = new_user_id, movie_pair[1], time.time()
-    df_result = pd.concat([df_result,row], ignore_index=True)
-    
+  _check_user_movie_scores(user_movie_scores, has_movie, "the data frame 'df'")
+
+  #one template row per movie (for the genre columns), built in one pass instead of
+  #copying df and concatenating once per rated movie
+  movie_ids = [movie_pair[0] for movie_pair in user_movie_scores]
+  templates = df[df['movieId'].isin(movie_ids)].drop_duplicates('movieId').set_index('movieId')
+  new_rows = templates.loc[movie_ids].reset_index()[df.columns]
+  new_rows['userId'] = new_user_id
+  new_rows['rating'] = [movie_pair[1] for movie_pair in user_movie_scores]
+  new_rows['timestamp'] = int(time.time())
+  #keep df's compact / sparse dtypes through the concat
+  new_rows = new_rows.astype(df.dtypes.to_dict())
+
+  df_result = pd.concat([df, new_rows], ignore_index=True)
+  _recommendation_cache.invalidate_user(new_user_id)
 
   return df_result
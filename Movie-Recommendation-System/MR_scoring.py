@@ -0,0 +1,124 @@
+import numpy as np
+
+# 11/2025 NumPy scoring from trained SVD factors
+#
+# Kept apart from MR_functions so evaluation, the ANN index and batch jobs can
+# score with a factors dict without loading data or training at import.
+
+
+def extract_svd_factors(model, n_users: int, n_items: int) -> dict:
+  ''' Parameters: 1. 'model' is a fitted surprise SVD
+                  2. 'n_users' and 'n_items' are the sizes of the encoded userId / movieId ranges
+      Returns:    1. a dict of numpy arrays indexed by encoded userId / movieId:
+                     mu, bu, bi, pu, qi, known_users, known_items, rating_scale, biased
+
+      Outline:    1. surprise keeps factors by its own inner ids, re-index them by our encoded ids
+                  2. users / movies missing from the trainset get zero factors and biases,
+                     which gives the same estimate surprise falls back to for them
+  '''
+  trainset = model.trainset
+  n_factors = model.pu.shape[1]
+
+  pu = np.zeros((n_users, n_factors))
+  qi = np.zeros((n_items, n_factors))
+  bu = np.zeros(n_users)
+  bi = np.zeros(n_items)
+  known_users = np.zeros(n_users, dtype=bool)
+  known_items = np.zeros(n_items, dtype=bool)
+
+  raw_users = np.fromiter(trainset._raw2inner_id_users.keys(), dtype=np.int64)
+  inner_users = np.fromiter(trainset._raw2inner_id_users.values(), dtype=np.int64)
+  raw_items = np.fromiter(trainset._raw2inner_id_items.keys(), dtype=np.int64)
+  inner_items = np.fromiter(trainset._raw2inner_id_items.values(), dtype=np.int64)
+
+  pu[raw_users] = model.pu[inner_users]
+  qi[raw_items] = model.qi[inner_items]
+  known_users[raw_users] = True
+  known_items[raw_items] = True
+  if model.biased:
+    bu[raw_users] = model.bu[inner_users]
+    bi[raw_items] = model.bi[inner_items]
+
+  return {
+    'mu': trainset.global_mean,
+    'bu': bu,
+    'bi': bi,
+    'pu': pu,
+    'qi': qi,
+    'known_users': known_users,
+    'known_items': known_items,
+    'rating_scale': trainset.rating_scale,
+    'biased': model.biased,
+  }
+
+
+def score_users(factors: dict, user_ids, items: np.ndarray = None) -> np.ndarray:
+  '''
+  Predicted rating of every movie for each user in user_ids, as one matrix product.
+  Returns a (len(user_ids), n_items) array matching model_svd.predict(u, i).est
+  Users outside the factor range (not in the trainset) get the movie bias only.
+  With items (movie ids), only those columns are scored: (len(user_ids), len(items)).
+  '''
+  user_ids = np.atleast_1d(np.asarray(user_ids, dtype=np.int64))
+  in_range = user_ids < len(factors['bu'])
+  rows = np.where(in_range, user_ids, 0)
+  columns = slice(None) if items is None else np.asarray(items, dtype=np.int64)
+
+  pu = factors['pu'][rows] * in_range[:, None]
+  bu = factors['bu'][rows] * in_range
+  dot = pu @ factors['qi'][columns].T
+
+  if factors['biased']:
+    scores = factors['mu'] + bu[:, None] + factors['bi'][columns][None, :] + dot
+  else:
+    # unbiased SVD can only predict known pairs, the rest get the global mean
+    known_users = factors['known_users'][rows] & in_range
+    known = known_users[:, None] & factors['known_items'][columns][None, :]
+    scores = np.where(known, dot, factors['mu'])
+
+  low, high = factors['rating_scale']
+  return np.clip(scores, low, high, out=scores)
+
+
+def predict_pairs(factors: dict, user_ids, movie_ids, block_size: int = 8192) -> np.ndarray:
+  '''
+  Predicted rating for each (user_ids[k], movie_ids[k]) pair, the vectorized
+  model_svd.predict(u, i).est for a whole test set at once. The dot products run
+  block_size pairs at a time, so the gathered factor rows stay at 2 x block_size x
+  n_factors floats (about 13 MB at 100 factors) however large the test set is.
+  '''
+  user_ids = np.asarray(user_ids, dtype=np.int64)
+  movie_ids = np.asarray(movie_ids, dtype=np.int64)
+  in_range = user_ids < len(factors['bu'])
+  rows = np.where(in_range, user_ids, 0)
+
+  dot = np.empty(len(rows))
+  for start in range(0, len(rows), block_size):
+    block = slice(start, start + block_size)
+    dot[block] = np.einsum('ij,ij->i', factors['pu'][rows[block]], factors['qi'][movie_ids[block]])
+  dot *= in_range
+
+  if factors['biased']:
+    estimates = factors['mu'] + factors['bu'][rows] * in_range + factors['bi'][movie_ids] + dot
+  else:
+    known = factors['known_users'][rows] & in_range & factors['known_items'][movie_ids]
+    estimates = np.where(known, dot, factors['mu'])
+
+  low, high = factors['rating_scale']
+  return np.clip(estimates, low, high)
+
+
+def top_n_from_scores(scores: np.ndarray, excluded: np.ndarray, n: int) -> np.ndarray:
+  '''
+  Column indexes of the n best scores per row, best first, skipping excluded cells.
+  argpartition finds the top n without sorting the whole row; rows with fewer
+  than n candidates are padded with -1.
+  '''
+  scores = np.where(excluded, -np.inf, scores)
+  n = min(n, scores.shape[1])
+  top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+  top_scores = np.take_along_axis(scores, top, axis=1)
+  order = np.argsort(-top_scores, axis=1, kind='stable')
+  top = np.take_along_axis(top, order, axis=1)
+  top_scores = np.take_along_axis(top_scores, order, axis=1)
+  return np.where(np.isneginf(top_scores), -1, top)
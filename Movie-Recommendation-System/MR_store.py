@@ -0,0 +1,179 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 11/2025 compact integer indexed ratings store
+#
+# The recommender used to answer "what has this user rated" and "is this movie
+# known" with boolean scans over the whole ratings frame. RatingsStore keeps the
+# ratings twice, sorted by user (CSR) and by movie (CSC), as int32 ids and float32
+# ratings, so each of those questions is a slice or a binary search. Genres are
+# kept once per movie (CSR of genre indexes) rather than as one-hot columns copied
+# onto every rating row. Everything is plain .npy files, so it can be memory-mapped.
+
+_ARRAYS = ['user_ptr', 'user_items', 'user_ratings', 'item_ptr', 'item_users', 'genre_ptr', 'genre_ids']
+
+
+def _compress(keys: np.ndarray, n_keys: int) -> np.ndarray:
+  ''' Row pointer array for values sorted by key: key k owns ptr[k]:ptr[k + 1] '''
+  ptr = np.zeros(n_keys + 1, dtype=np.int64)
+  np.cumsum(np.bincount(keys, minlength=n_keys), out=ptr[1:])
+  return ptr
+
+
+def encode_genres(movies_df: pd.DataFrame, movie_ids: np.ndarray, n_items: int = None) -> tuple:
+  '''
+  Splits each movie's "A|B|C" genres once, returns (genre_ptr, genre_ids, genre_names):
+  a CSR of sorted genre indexes per encoded movie id, "(no genres listed)" left out
+  '''
+  n_items = len(movie_ids) if n_items is None else n_items
+  genres = movies_df.set_index('movieId')['genres'].reindex(movie_ids[:n_items]).fillna('(no genres listed)')
+  # positional index, so after explode the index is the encoded movie id
+  exploded = genres.reset_index(drop=True).str.split('|').explode()
+  exploded = exploded[exploded != '(no genres listed)']
+  codes, names = pd.factorize(exploded, sort=True)
+  rows = exploded.index.to_numpy()
+  order = np.lexsort((codes, rows))
+  return _compress(rows, n_items), codes[order].astype(np.int16), list(names)
+
+
+class RatingsStore:
+  '''
+  user_ptr, user_items, user_ratings: CSR by user, items sorted within each user
+  item_ptr, item_users:               CSC by movie, users sorted within each movie
+  genre_ptr, genre_ids:               CSR of genre indexes per movie, names in genre_names
+  '''
+
+  def __init__(self, user_ptr, user_items, user_ratings, item_ptr, item_users, genre_ptr, genre_ids, genre_names: list):
+    self.user_ptr = user_ptr
+    self.user_items = user_items
+    self.user_ratings = user_ratings
+    self.item_ptr = item_ptr
+    self.item_users = item_users
+    self.genre_ptr = genre_ptr
+    self.genre_ids = genre_ids
+    self.genre_names = list(genre_names)
+
+  @property
+  def n_users(self) -> int:
+    return len(self.user_ptr) - 1
+
+  @property
+  def n_items(self) -> int:
+    return len(self.item_ptr) - 1
+
+  @property
+  def n_ratings(self) -> int:
+    return len(self.user_items)
+
+  @classmethod
+  def from_ratings(cls, df: pd.DataFrame, movies_df: pd.DataFrame = None, movie_ids: np.ndarray = None,
+                   n_users: int = None, n_items: int = None) -> 'RatingsStore':
+    ''' Parameters: 1. 'df' encoded ratings (userId, movieId, rating), e.g. prep_movies output
+                    2. 'movies_df' raw movies.csv frame and 'movie_ids' (raw movieId per encoded id)
+                       to attach genres, both optional
+                    3. 'n_users' / 'n_items' sizes of the id ranges, default max id + 1
+    '''
+    users = df['userId'].to_numpy().astype(np.int32)
+    items = df['movieId'].to_numpy().astype(np.int32)
+    ratings = df['rating'].to_numpy().astype(np.float32)
+    n_users = int(users.max()) + 1 if n_users is None else n_users
+    n_items = int(items.max()) + 1 if n_items is None else n_items
+
+    by_user = np.lexsort((items, users))
+    by_item = np.lexsort((users, items))
+
+    genre_ptr = np.zeros(n_items + 1, dtype=np.int64)
+    genre_ids = np.zeros(0, dtype=np.int16)
+    genre_names = []
+    if movies_df is not None and movie_ids is not None:
+      genre_ptr, genre_ids, genre_names = encode_genres(movies_df, movie_ids, n_items)
+
+    return cls(
+      _compress(users, n_users), items[by_user], ratings[by_user],
+      _compress(items, n_items), users[by_item],
+      genre_ptr, genre_ids, genre_names,
+    )
+
+  def items_seen(self, user_id: int) -> np.ndarray:
+    ''' Sorted movie ids the user rated, a view into the store '''
+    if not 0 <= user_id < self.n_users:
+      return self.user_items[:0]
+    return self.user_items[self.user_ptr[user_id]:self.user_ptr[user_id + 1]]
+
+  def ratings_of(self, user_id: int) -> np.ndarray:
+    ''' The user's ratings, aligned with items_seen(user_id) '''
+    if not 0 <= user_id < self.n_users:
+      return self.user_ratings[:0]
+    return self.user_ratings[self.user_ptr[user_id]:self.user_ptr[user_id + 1]]
+
+  def users_who_rated(self, movie_id: int) -> np.ndarray:
+    ''' Sorted user ids that rated the movie '''
+    if not 0 <= movie_id < self.n_items:
+      return self.item_users[:0]
+    return self.item_users[self.item_ptr[movie_id]:self.item_ptr[movie_id + 1]]
+
+  def has_user(self, user_id: int) -> bool:
+    return 0 <= user_id < self.n_users and self.user_ptr[user_id + 1] > self.user_ptr[user_id]
+
+  def has_item(self, movie_id: int) -> bool:
+    return 0 <= movie_id < self.n_items and self.item_ptr[movie_id + 1] > self.item_ptr[movie_id]
+
+  def has_rating(self, user_id: int, movie_id: int) -> bool:
+    seen = self.items_seen(user_id)
+    pos = np.searchsorted(seen, movie_id)
+    return pos < len(seen) and seen[pos] == movie_id
+
+  def rated_items(self) -> np.ndarray:
+    ''' Boolean mask of movies with at least one rating '''
+    return np.diff(self.item_ptr) > 0
+
+  def excluded_mask(self, user_ids: np.ndarray) -> np.ndarray:
+    '''
+    Boolean (len(user_ids), n_items) mask of movies not to recommend: the ones each
+    user rated plus the ones nobody rated. Built from CSR slices, no scans.
+    '''
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    excluded = np.broadcast_to(~self.rated_items(), (len(user_ids), self.n_items)).copy()
+    in_range = (user_ids >= 0) & (user_ids < self.n_users)
+    starts = np.where(in_range, self.user_ptr[np.where(in_range, user_ids, 0)], 0)
+    lengths = np.where(in_range, self.user_ptr[np.where(in_range, user_ids + 1, 0)] - starts, 0)
+    rows = np.repeat(np.arange(len(user_ids)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    excluded[rows, self.user_items[np.repeat(starts, lengths) + offsets]] = True
+    return excluded
+
+  def movie_genres(self, movie_id: int) -> list:
+    ''' Genre names of one movie '''
+    ids = self.genre_ids[self.genre_ptr[movie_id]:self.genre_ptr[movie_id + 1]]
+    return [self.genre_names[i] for i in ids]
+
+  def genre_features(self, movie_ids: np.ndarray) -> np.ndarray:
+    ''' (len(movie_ids), n_genres) uint8 one-hot rows, looked up per movie instead of stored per rating '''
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    counts = self.genre_ptr[movie_ids + 1] - self.genre_ptr[movie_ids]
+    rows = np.repeat(np.arange(len(movie_ids)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    features = np.zeros((len(movie_ids), len(self.genre_names)), dtype=np.uint8)
+    features[rows, self.genre_ids[np.repeat(self.genre_ptr[movie_ids], counts) + offsets]] = 1
+    return features
+
+  def save(self, path):
+    ''' One .npy per array plus store.json '''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name in _ARRAYS:
+      np.save(path / f'{name}.npy', getattr(self, name))
+    (path / 'store.json').write_text(json.dumps({
+      'n_users': self.n_users, 'n_items': self.n_items, 'n_ratings': self.n_ratings, 'genre_names': self.genre_names,
+    }))
+
+  @classmethod
+  def load(cls, path, mmap: bool = True) -> 'RatingsStore':
+    ''' Loads a store written by save, memory-mapped read only by default '''
+    path = Path(path)
+    meta = json.loads((path / 'store.json').read_text())
+    arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r' if mmap else None) for name in _ARRAYS}
+    return cls(genre_names=meta['genre_names'], **arrays)
@@ -0,0 +1,188 @@
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from MR_scoring import extract_svd_factors
+from MR_evaluation import rmse
+
+# 11/2025 parallel hyperparameter search for the SVD recommender
+#
+# Every (config, fold) pair is one task on a process pool sized to the machine.
+# The encoded ratings and the fold assignment are put in shared memory once;
+# workers attach to it by name in their initializer, so tasks only carry a
+# params dict instead of a pickled copy of the ratings.
+#
+# grid_search / random_search score every config with k-fold CV.
+# successive_halving trains every config on a small n_epochs budget, keeps the
+# best 1/eta and multiplies the budget by eta, and stops a config early when a
+# bigger budget no longer improves its validation RMSE.
+
+_SHARED_COLUMNS = {'userId': np.int32, 'movieId': np.int32, 'rating': np.float32, 'fold': np.int8}
+
+# set in each worker by _init_worker
+_worker_arrays = None
+_worker_blocks = None
+
+
+class SharedRatings:
+  '''
+  Ratings columns plus a random fold number per rating, in shared memory.
+  Use as a context manager; the blocks are unlinked on exit.
+  '''
+
+  def __init__(self, ratings_df: pd.DataFrame, n_folds: int, seed: int = 0):
+    self.n_users = int(ratings_df['userId'].max()) + 1
+    self.n_items = int(ratings_df['movieId'].max()) + 1
+    self.n_folds = n_folds
+    folds = np.random.default_rng(seed).integers(0, n_folds, len(ratings_df))
+    columns = {name: ratings_df[name].to_numpy() for name in ['userId', 'movieId', 'rating']}
+    columns['fold'] = folds
+
+    self.blocks = {}
+    self.spec = {'n_users': self.n_users, 'n_items': self.n_items, 'columns': {}}
+    for name, dtype in _SHARED_COLUMNS.items():
+      values = np.ascontiguousarray(columns[name], dtype=dtype)
+      block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+      np.ndarray(values.shape, dtype=dtype, buffer=block.buf)[:] = values
+      self.blocks[name] = block
+      self.spec['columns'][name] = (block.name, values.shape, np.dtype(dtype).str)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    for block in self.blocks.values():
+      block.close()
+      block.unlink()
+
+
+def _init_worker(spec: dict):
+  ''' Attaches the shared ratings once per worker process '''
+  global _worker_arrays, _worker_blocks
+  _worker_blocks, _worker_arrays = {}, {'n_users': spec['n_users'], 'n_items': spec['n_items']}
+  for name, (block_name, shape, dtype) in spec['columns'].items():
+    block = shared_memory.SharedMemory(name=block_name)
+    _worker_blocks[name] = block
+    _worker_arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _fit_fold(params: dict, fold: int, seed: int) -> dict:
+  ''' Trains SVD(**params) on every fold but `fold` and returns its RMSE on `fold` '''
+  from surprise import Dataset, Reader
+  from surprise.prediction_algorithms.matrix_factorization import SVD
+
+  start = time.perf_counter()
+  arrays = _worker_arrays
+  ratings = pd.DataFrame({name: arrays[name] for name in ['userId', 'movieId', 'rating']})
+  in_fold = arrays['fold'] == fold
+
+  reader = Reader(rating_scale = (0.5,5))
+  data = Dataset.load_from_df(ratings[~in_fold], reader)
+  model_svd = SVD(random_state=seed, **params)
+  model_svd.fit(data.build_full_trainset())
+
+  factors = extract_svd_factors(model_svd, arrays['n_users'], arrays['n_items'])
+  return {'fold': fold, 'rmse': rmse(factors, ratings[in_fold]), 'seconds': time.perf_counter() - start}
+
+
+def _evaluate(pool: ProcessPoolExecutor, configs: list, n_folds: int, seed: int) -> list:
+  ''' k-fold RMSE for every config, all (config, fold) tasks in flight at once '''
+  futures = [[pool.submit(_fit_fold, params, fold, seed) for fold in range(n_folds)] for params in configs]
+  rows = []
+  for params, config_futures in zip(configs, futures):
+    folds = [future.result() for future in config_futures]
+    scores = np.array([f['rmse'] for f in folds])
+    rows.append({
+      **params,
+      'rmse_mean': float(scores.mean()),
+      'rmse_std': float(scores.std()),
+      'fit_seconds': float(sum(f['seconds'] for f in folds)),
+    })
+  return rows
+
+
+def _search(ratings_df: pd.DataFrame, run, n_folds: int, workers: int, seed: int) -> pd.DataFrame:
+  ''' Shares the ratings, starts the pool and hands both to run(pool, n_folds) '''
+  start = time.perf_counter()
+  with SharedRatings(ratings_df, n_folds, seed) as shared:
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(shared.spec,)) as pool:
+      rows = run(pool, n_folds)
+
+  results = pd.DataFrame(rows).sort_values('rmse_mean', ignore_index=True)
+  results.attrs['wall_seconds'] = time.perf_counter() - start
+  return results
+
+
+def grid_search(ratings_df: pd.DataFrame, param_grid: dict, n_folds: int = 3, workers: int = None, seed: int = 0) -> pd.DataFrame:
+  ''' Parameters: 1. 'ratings_df' encoded ratings (userId, movieId, rating), e.g. prep_movies output
+                  2. 'param_grid' SVD params to lists of values, e.g. {'n_factors': [50, 100], 'reg_all': [.02, .05]}
+                  3. 'n_folds' folds of cross validation, 'workers' processes (default every core)
+      Returns:    1. a DataFrame, one row per config: params, rmse_mean, rmse_std, fit_seconds
+                     (summed over folds), best first
+  '''
+  names = list(param_grid)
+  configs = [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+  return _search(ratings_df, lambda pool, k: _evaluate(pool, configs, k, seed), n_folds, workers, seed)
+
+
+def random_search(ratings_df: pd.DataFrame, param_distributions: dict, n_iter: int = 20, n_folds: int = 3,
+                  workers: int = None, seed: int = 0) -> pd.DataFrame:
+  '''
+  Like grid_search, on n_iter configs sampled from param_distributions: each value is
+  a list to choose from or a (low, high) tuple sampled log-uniformly (ints stay ints)
+  '''
+  rng = np.random.default_rng(seed)
+  configs = []
+  for _ in range(n_iter):
+    params = {}
+    for name, values in param_distributions.items():
+      if isinstance(values, tuple):
+        low, high = values
+        value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        params[name] = int(round(value)) if isinstance(low, int) and isinstance(high, int) else value
+      else:
+        params[name] = values[rng.integers(len(values))]
+    configs.append(params)
+  return _search(ratings_df, lambda pool, k: _evaluate(pool, configs, k, seed), n_folds, workers, seed)
+
+
+def successive_halving(ratings_df: pd.DataFrame, configs: list, min_epochs: int = 5, max_epochs: int = 45,
+                       eta: int = 3, min_delta: float = 1e-4, n_folds: int = 3, workers: int = None,
+                       seed: int = 0) -> pd.DataFrame:
+  ''' Parameters: 1. 'configs' list of SVD param dicts (without n_epochs, that is the budget)
+                  2. 'min_epochs' / 'max_epochs' first and last n_epochs budget, multiplied by eta per rung
+                  3. 'min_delta' early stopping: a config whose RMSE improves less than this from
+                     one budget to the next is stopped instead of promoted
+      Returns:    1. a DataFrame with one row per (config, rung) trained: params, n_epochs, rung,
+                     rmse_mean, rmse_std, fit_seconds, stopped_early; best first
+  '''
+  def run(pool, n_folds):
+    rows = []
+    survivors = [(params, None) for params in configs]
+    n_epochs, rung = min_epochs, 0
+    while survivors:
+      budgeted = [{**params, 'n_epochs': n_epochs} for params, _ in survivors]
+      results = _evaluate(pool, budgeted, n_folds, seed)
+
+      promoted = []
+      for (params, previous), row in zip(survivors, results):
+        row['rung'] = rung
+        row['stopped_early'] = previous is not None and row['rmse_mean'] > previous - min_delta
+        rows.append(row)
+        if not row['stopped_early']:
+          promoted.append((params, row['rmse_mean']))
+
+      if n_epochs >= max_epochs:
+        break
+      promoted.sort(key=lambda item: item[1])
+      survivors = promoted[:max(1, len(promoted) // eta)] if promoted else []
+      n_epochs, rung = min(n_epochs * eta, max_epochs), rung + 1
+    return rows
+
+  return _search(ratings_df, run, n_folds, workers, seed)
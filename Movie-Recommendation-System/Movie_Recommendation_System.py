@@ -1,14 +1,15 @@
 import os
-import requests
+import argparse
+import itertools
 from pathlib import Path
-from surprise import Dataset, Reader
-from surprise.prediction_algorithms.matrix_factorization import SVD
-from surprise import accuracy
-import zipfile
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
-from sklearn.model_selection import train_test_split
 import time
+from MR_functions import DATA_DIR, ARTIFACT_DIR, RATINGS_LOG, load_data, prep_movies, train_model
+from MR_evaluation import ranking_metrics
+from MR_tuning import grid_search, random_search, successive_halving
+
+#SVD settings tried by --tune; successive halving uses n_epochs as its budget instead
+TUNE_GRID = {'n_factors': [50, 100, 150], 'lr_all': [.005, .01], 'reg_all': [.02, .05, .1]}
+TUNE_EPOCHS = [10, 20, 40]
 
 
 def explore_dir(path):
@@ -18,84 +19,88 @@ def explore_dir(path):
 
 
 ### 10/31/25 grab files and merge them into a useful structure, one file using pandas
-
-movies_df = pd.read_csv('data/ml-latest-small/movies.csv')
-tags_df = pd.read_csv('data/ml-latest-small/tags.csv')
-rating_df = pd.read_csv('data/ml-latest-small/ratings.csv')
-links_df = pd.read_csv('data/ml-latest-small/ratings.csv')
-
-#merge files
-df = pd.merge(rating_df,movies_df[['movieId','genres']], on = 'movieId', how = 'left')
-
-#create encoder for user and movies
-le = LabelEncoder()
-df['movieId'] = le.fit_transform(df['movieId'])
-df['userId'] = le.fit_transform(df['userId'])
-
-#add user and movie encoders
-user_encoder = LabelEncoder()
-movie_encoder = LabelEncoder()
-#create multiLabelBinarizer
-mlb = MultiLabelBinarizer()
-
-#fit label encoders
-df['userId'] = user_encoder.fit_transform(df['userId'])
-df['movieId'] = movie_encoder.fit_transform(df['movieId'])
-
-# create list of genres via the "|", and take out the old genres field
-genres_list = df.pop('genres').str.split('|')
-
-#create MLB data
-MLB_data = mlb.fit_transform(genres_list)
-#create MLB data frame
-MLB_df = pd.DataFrame(MLB_data,columns=mlb.classes_, index = df.index)
-# join MLB to main data frame by the
-df = df.join(MLB_df)
-# clean data frame, pop
-df = df.drop('(no genres listed)', axis=1)
-
-#Train Test Split
-train_df, test_df = train_test_split(df,test_size=.2,train_size=.8)
-
-#Get reader,data and trainset
-reader = Reader(rating_scale = (0.5,5))
-data = Dataset.load_from_df(train_df[['userId','movieId','rating']],reader )
-train_set = data.build_full_trainset()
-
-#Create model svc
-model_svd = SVD()
-model_svd.fit(train_set)
-
-prediction_svd = model_svd.test(train_set.build_anti_testset())
-accuracy.rmse(prediction_svd)
-
-
-#create function to get top movie recommendations
-
-# 11/5/25
-def get_best_n_recommendations(df: pd.DataFrame, user_id: str, n: int = 5):
-  ''' Parameters: 1. df needs to be a processed.
-                  2. user_id will represent a type string and will be an id found in the
-                    user_df
-                  3. n is a "int" type and will return the amount recommendations returned
-
-  '''
-  # Get the amount of movies this user has
-  user_movies = df[df['userId'] == user_id]['movieId'].unique()
-  # return all the movies minus the ones' this user has seen
-  all_movies = df['movieId'].unique()
-
-  movies_to_predict = list(set(all_movies) - set(user_movies))
-  # use the model to return the amount of movies to see
-  user_movie_pairs = [(user_id,movie_id, 0) for movie_id in movies_to_predict]
-
-  predictions_cf = model_svd.test(user_movie_pairs)
-
-  top_n_recommendations = sorted(predictions_cf, key = lambda x: x.est, reverse = True)[:n]
-
-  top_n_movie_ids = [int(pred.iid) for pred in top_n_recommendations]
-
-  top_n_movies = movie_encoder.inverse_transform(top_n_movie_ids)
-
-  return top_n_movies
-
+### 11/2025 this is now the one explicit training step: it trains SVD, evaluates it on the
+### held out ratings and publishes the model artifacts that MR_functions serves from.
+### Ratings of users folded in since the last run (MR_functions.fold_in_new_user) are read
+### from the ratings log and trained in; --every keeps doing that as a background job.
+### --tune first searches SVD settings with k-fold CV on the training split (see MR_tuning)
+### and trains with the best one.
+
+def tune(args, movies_df, ratings_df) -> dict:
+  from sklearn.model_selection import train_test_split
+
+  #same split train_model makes, so the held out ratings stay out of the search
+  df = prep_movies(movies_df, ratings_df, genres=False)
+  train_df, _ = train_test_split(df, test_size=args.test_size, random_state=args.seed)
+  train_df = train_df[['userId','movieId','rating']]
+
+  if args.tune == 'grid':
+    results = grid_search(train_df, {**TUNE_GRID, 'n_epochs': TUNE_EPOCHS}, n_folds=args.folds, workers=args.workers)
+  elif args.tune == 'random':
+    results = random_search(train_df, {'n_factors': (20, 200), 'lr_all': (.002, .02), 'reg_all': (.01, .2), 'n_epochs': (10, 40)},
+                            n_iter=args.tune_iter, n_folds=args.folds, workers=args.workers)
+  else:
+    names = list(TUNE_GRID)
+    configs = [dict(zip(names, values)) for values in itertools.product(*TUNE_GRID.values())]
+    results = successive_halving(train_df, configs, min_epochs=TUNE_EPOCHS[0], max_epochs=TUNE_EPOCHS[-1],
+                                 n_folds=args.folds, workers=args.workers)
+
+  print(results.to_string())
+  print(f"searched {len(results)} settings in {results.attrs['wall_seconds']:.1f}s")
+  #a one row frame keeps each column's dtype, iloc[0] would turn an all numeric row into floats
+  best = results.iloc[[0]].to_dict('records')[0]
+  params = {name: best[name] for name in ['n_factors', 'lr_all', 'reg_all', 'n_epochs'] if name in best}
+  for name in ['n_factors', 'n_epochs']:
+    if name in params:
+      params[name] = int(params[name])
+  return params
+
+
+def train_once(args):
+  start = time.time()
+  movies_df, ratings_df = load_data(args.data_dir, ratings_log=args.ratings_log)
+
+  svd_params = {}
+  if args.tune:
+    svd_params = tune(args, movies_df, ratings_df)
+    print(f"best settings: {svd_params}")
+
+  #Train, evaluate and publish
+  result = train_model(movies_df, ratings_df, artifact_dir=args.artifacts,
+                       test_size=args.test_size, random_state=args.seed, **svd_params)
+
+  #Evaluate on the held out test_df: RMSE over its ratings, and top 10 ranking metrics
+  #computed in blocks of users (see MR_evaluation), instead of the full anti-testset
+  print(f"RMSE: {result['rmse']:.4f}")
+  for metric, value in ranking_metrics(result['factors'], result['train_df'], result['test_df'], k=10).items():
+    print(f"{metric}: {value:.4f}" if isinstance(value, float) else f"{metric}: {value}")
+
+  print(f"published model {result['version']} to {args.artifacts} in {time.time() - start:.1f}s")
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Train the SVD recommender and publish its artifacts')
+  parser.add_argument('--data-dir', type=Path, default=DATA_DIR, help='folder with movies.csv and ratings.csv')
+  parser.add_argument('--artifacts', type=Path, default=ARTIFACT_DIR, help='where model versions are published')
+  parser.add_argument('--test-size', type=float, default=.2)
+  parser.add_argument('--seed', type=int, default=None)
+  parser.add_argument('--ratings-log', type=Path, default=RATINGS_LOG, help='folded in ratings to merge in')
+  parser.add_argument('--every', type=float, default=None, help='retrain every this many seconds instead of once')
+  parser.add_argument('--tune', choices=['grid', 'random', 'halving'], default=None,
+                      help='search SVD settings before training (k-fold CV on every core)')
+  parser.add_argument('--folds', type=int, default=3, help='cross validation folds for --tune')
+  parser.add_argument('--workers', type=int, default=None, help='processes for --tune (default every core)')
+  parser.add_argument('--tune-iter', type=int, default=20, help='settings sampled by --tune random')
+  args = parser.parse_args()
+  if args.tune and args.seed is None:
+    #tuning and training must agree on the held out split
+    args.seed = 0
+
+  train_once(args)
+  while args.every:
+    time.sleep(args.every)
+    train_once(args)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: IVF approximate top-n (MR_ann.IVFIndex) vs exact SVD scoring
+
+Builds synthetic SVD factors shaped like a trained model on a large catalog
+(clustered item factors, long tail item biases), then for a set of users
+compares the exact top n (score every movie + argpartition) with the index at
+several nprobe settings, reporting recall@n and p50/p99 latency.
+
+usage:
+  python bench_ann.py
+  python bench_ann.py --items 1000000 --factors 100 --users 200 --n 10 --nprobe 1,4,16,64
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from MR_ann import IVFIndex
+
+
+def synthetic_factors(n_items: int, n_users: int, n_factors: int, seed: int = 0) -> tuple:
+  ''' Item factors drawn around a few hundred "genre" centres, user factors around them too '''
+  rng = np.random.default_rng(seed)
+  centres = rng.normal(0, 0.3, (256, n_factors))
+  qi = centres[rng.integers(0, len(centres), n_items)] + rng.normal(0, 0.1, (n_items, n_factors))
+  # popular items have larger biases, most of the catalog sits in the tail
+  bi = rng.normal(-0.2, 0.3, n_items) + 0.5 * (rng.pareto(3.0, n_items) > 1.0)
+  pu = centres[rng.integers(0, len(centres), n_users)] + rng.normal(0, 0.1, (n_users, n_factors))
+  return qi.astype(np.float32), bi.astype(np.float32), pu.astype(np.float32)
+
+
+def exact_top_n(qi: np.ndarray, bi: np.ndarray, pu: np.ndarray, n: int) -> np.ndarray:
+  scores = qi @ pu + bi
+  top = np.argpartition(-scores, n - 1)[:n]
+  return top[np.argsort(-scores[top])]
+
+
+def percentiles(seconds: list) -> str:
+  ms = np.array(seconds) * 1000
+  return f"{np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}"
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--items', type=int, default=200_000)
+  parser.add_argument('--factors', type=int, default=100)
+  parser.add_argument('--users', type=int, default=200)
+  parser.add_argument('--n', type=int, default=10)
+  parser.add_argument('--nprobe', default='1,2,4,8,16,32,64')
+  parser.add_argument('--lists', type=int, default=None, help='index lists (default 4 * sqrt(items))')
+  args = parser.parse_args()
+
+  qi, bi, pu = synthetic_factors(args.items, args.users, args.factors)
+
+  start = time.perf_counter()
+  index = IVFIndex.build(qi, bi, n_lists=args.lists)
+  print(f"{args.items:,} items, {args.factors} factors, {index.n_lists} lists, built in {time.perf_counter() - start:.2f}s\n")
+
+  truth, exact_times = [], []
+  for user in pu:
+    start = time.perf_counter()
+    truth.append(set(exact_top_n(qi, bi, user, args.n).tolist()))
+    exact_times.append(time.perf_counter() - start)
+
+  print(f"{'method':>12} {'recall@' + str(args.n):>10} {'p50 ms':>8} {'p99 ms':>8}")
+  print(f"{'exact':>12} {1.0:>10.3f} {percentiles(exact_times)}")
+
+  for nprobe in [int(x) for x in args.nprobe.split(',')]:
+    recalls, times = [], []
+    for user, expected in zip(pu, truth):
+      start = time.perf_counter()
+      found, _ = index.search(user, args.n, nprobe)
+      times.append(time.perf_counter() - start)
+      recalls.append(len(expected & set(found.tolist())) / args.n)
+    print(f"{'nprobe=' + str(nprobe):>12} {np.mean(recalls):>10.3f} {percentiles(times)}")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,415 @@
+"""
+Benchmark: the whole recommender pipeline, training and serving, on synthetic
+MovieLens shaped data at several sizes (100k, 1M and 10M ratings by default).
+
+Each dataset is generated once per (size, seed) into --data-root as movies.csv /
+ratings.csv, with long tails on both sides like the real MovieLens sets: movie
+popularity follows a power law, user activity is log-normal, and ratings come from
+user / movie biases plus a low rank taste term, rounded to MovieLens' whole and half
+stars. Then every stage is run as train_model and the serving functions run it, and
+its wall time, peak memory above the stage's start (RSS sampled every few ms, or
+the traced heap with --tracemalloc) and RSS after it are recorded:
+
+  csv_load          load_data, both csv files
+  merge             ratings joined to movies (title, genres)
+  prep_movies       id encoding, without genre columns as train_model runs it
+  split             train_test_split
+  trainset          surprise Dataset / Trainset build
+  svd_fit           SVD.fit
+  evaluate_rmse     RMSE on the held out ratings
+  evaluate_ranking  precision / recall / ndcg@10 (MR_evaluation.ranking_metrics)
+  serving_tables    ANN index, ratings store and candidate tables
+  publish           save_model_artifacts
+  model_load        reload_model (memory-mapped)
+  create_new_user   p50 / p99 over --new-users calls, 10 ratings each
+
+and get_best_n_recommendations latency (p50 / p99 over --queries users) uncached
+with exact scoring, the candidate pool and the ANN index, and from the cache.
+
+Results go to a JSON file (--output) with the versions, platform and git commit,
+so two builds can be compared with --compare old.json.
+
+usage:
+  python bench_pipeline.py
+  python bench_pipeline.py --sizes 100k,1m --epochs 10 --output before.json
+  python bench_pipeline.py --sizes 100k,1m --epochs 10 --compare before.json
+  python bench_pipeline.py --sizes 25m --eval-users 5000 --data-dir data/ml-latest-small
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import threading
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import MR_functions
+from MR_functions import BASE_DIR, load_data, prep_movies, save_model_artifacts, reload_model, \
+  get_best_n_recommendations, create_new_user
+from MR_ann import IVFIndex
+from MR_store import RatingsStore
+from MR_candidates import CandidateTables
+from MR_scoring import extract_svd_factors
+from MR_evaluation import rmse, ranking_metrics
+from bench_prep import GENRES
+
+BENCH_DIR = BASE_DIR / 'artifacts' / 'bench'
+# share of each genre among movies, roughly as in ml-25m
+GENRE_WEIGHTS = [8, 4, 2, 2, 12, 4, 3, 18, 3, 1, 5, 1, 2, 3, 7, 3, 8, 2, 1]
+# MovieLens users rate in whole stars about 70% of the time
+WHOLE_STAR_SHARE = 0.7
+# part of the cached dataset folder names, bump it when synthetic_movielens changes
+GENERATOR_VERSION = 1
+# seconds between RSS samples while a stage runs
+RSS_INTERVAL = 0.005
+
+
+def parse_size(text: str) -> int:
+  ''' '100k' -> 100000, '10m' -> 10000000, '2500' -> 2500 '''
+  text = text.strip().lower().replace('_', '')
+  scale = {'k': 10**3, 'm': 10**6}.get(text[-1:], 1)
+  return int(float(text.rstrip('km')) * scale)
+
+
+def synthetic_movielens(n_ratings: int, seed: int = 0, chunk: int = 2_000_000) -> tuple:
+  '''
+  Returns (movies_df, ratings_df) shaped like the MovieLens sets: ~150 ratings per user,
+  a catalog that grows slower than the ratings (1.7k movies at 100k ratings, 4.3k at 1M,
+  10.7k at 10M, like ml-100k / ml-1m / ml-10m), power law movie popularity, log-normal
+  user activity, no repeated (user, movie) pair, and ratings in 0.5 steps around 3.5
+  with structure an SVD can learn
+  '''
+  rng = np.random.default_rng(seed)
+  n_movies = max(100, int(1700 * (n_ratings / 1e5) ** 0.4))
+  n_users = max(10, n_ratings // 150)
+
+  movie_ids = np.sort(rng.choice(n_movies * 3, n_movies, replace=False)) + 1
+  n_genres = rng.choice([1, 2, 3, 4], n_movies, p=[.35, .35, .2, .1])
+  weights = np.array(GENRE_WEIGHTS, dtype=float) / sum(GENRE_WEIGHTS)
+  picks = [rng.choice(len(GENRES), k, replace=False, p=weights) for k in n_genres]
+  genres = ['|'.join(GENRES[g] for g in sorted(p)) for p in picks]
+  years = rng.integers(1920, 2020, n_movies)
+  movies_df = pd.DataFrame({
+    'movieId': movie_ids,
+    'title': [f'Movie {m} ({y})' for m, y in zip(movie_ids, years)],
+    'genres': genres,
+  })
+
+  # long tails: popularity by rank ~ rank ** -1.2, capped so the best known movies are rated
+  # by about half the users (median ratings per movie then lands near ml-100k / 1m / 10m's);
+  # activity log-normal, a few users rate thousands of movies
+  popularity = 1.0 / np.arange(1, n_movies + 1) ** 1.2
+  for _ in range(20):
+    popularity = np.minimum(popularity / popularity.sum(), 0.5 * n_users / n_ratings)
+  popularity = popularity[rng.permutation(n_movies)]
+  popularity /= popularity.sum()
+  activity = rng.lognormal(0.0, 1.1, n_users)
+  activity /= activity.sum()
+
+  # (user, movie) pairs as user * n_movies + movie; repeats are dropped and more pairs
+  # drawn until there are enough, then a random n_ratings of them are kept
+  keys = np.zeros(0, dtype=np.int64)
+  while len(keys) < n_ratings:
+    n_draw = int((n_ratings - len(keys)) * 1.2) + 100
+    drawn = rng.choice(n_users, n_draw, p=activity) * n_movies + rng.choice(n_movies, n_draw, p=popularity)
+    keys = np.sort(np.concatenate([keys, drawn]))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+  keys = np.sort(rng.choice(keys, n_ratings, replace=False))
+  users, movies = (keys // n_movies).astype(np.int32), (keys % n_movies).astype(np.int32)
+  del keys
+
+  # rating = mean + user bias + movie bias + low rank taste + noise
+  user_bias = rng.normal(0, 0.4, n_users).astype(np.float32)
+  movie_bias = rng.normal(0, 0.5, n_movies).astype(np.float32)
+  user_taste = rng.normal(0, 0.35, (n_users, 8)).astype(np.float32)
+  movie_taste = rng.normal(0, 0.35, (n_movies, 8)).astype(np.float32)
+  ratings = np.empty(len(users), dtype=np.float32)
+  for start in range(0, len(users), chunk):
+    u, m = users[start:start + chunk], movies[start:start + chunk]
+    taste = np.einsum('ij,ij->i', user_taste[u], movie_taste[m])
+    ratings[start:start + chunk] = 3.5 + user_bias[u] + movie_bias[m] + taste + rng.normal(0, 0.8, len(u))
+  whole = rng.random(len(ratings)) < WHOLE_STAR_SHARE
+  ratings = np.where(whole, np.clip(np.round(ratings), 1, 5), np.clip(np.round(ratings * 2) / 2, 0.5, 5))
+
+  # sorted by user then movie like the MovieLens files (keys were sorted, raw movie ids keep their order)
+  ratings_df = pd.DataFrame({
+    'userId': users + 1,
+    'movieId': movie_ids[movies],
+    'rating': ratings,
+    'timestamp': rng.integers(9.5e8, 1.6e9, len(users)),
+  })
+  return movies_df, ratings_df
+
+
+def dataset_dir(data_root: Path, n_ratings: int, seed: int) -> Path:
+  ''' Writes the synthetic csv files on first use, returns their folder '''
+  path = Path(data_root) / f'synthetic-{n_ratings}-seed{seed}-v{GENERATOR_VERSION}'
+  if not (path / 'ratings.csv').exists():
+    print(f"generating {n_ratings:,} ratings into {path}", flush=True)
+    movies_df, ratings_df = synthetic_movielens(n_ratings, seed)
+    path.mkdir(parents=True, exist_ok=True)
+    movies_df.to_csv(path / 'movies.csv', index=False)
+    # written under a temporary name, an interrupted run doesn't leave a truncated dataset
+    ratings_df.to_csv(path / 'ratings.csv.tmp', index=False)
+    os.replace(path / 'ratings.csv.tmp', path / 'ratings.csv')
+  return path
+
+
+def _rss() -> int:
+  ''' Resident set size of this process in bytes, None where /proc is not available '''
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, AttributeError):
+    return None
+
+
+class Stages:
+  '''
+  Runs pipeline stages and keeps {name: {seconds, peak_mb, rss_mb}} per stage.
+  peak_mb is the highest memory seen while the stage ran minus memory at its start:
+  RSS sampled from a background thread, or with use_tracemalloc the traced heap
+  (exact for numpy / pandas buffers, but it slows the stage down).
+  '''
+
+  def __init__(self, use_tracemalloc: bool = False):
+    self.use_tracemalloc = use_tracemalloc
+    self.results = {}
+
+  def run(self, name: str, fn, *args, **kwargs):
+    if self.use_tracemalloc:
+      tracemalloc.start()
+    peak = [_rss() or 0]
+    start_memory = peak[0]
+    done = threading.Event()
+
+    def sample():
+      while not done.wait(RSS_INTERVAL):
+        peak[0] = max(peak[0], _rss() or 0)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    if not self.use_tracemalloc:
+      sampler.start()
+    start = time.perf_counter()
+    try:
+      result = fn(*args, **kwargs)
+    finally:
+      seconds = time.perf_counter() - start
+      done.set()
+      if self.use_tracemalloc:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+      else:
+        sampler.join()
+        peak_bytes = max(peak[0], _rss() or 0) - start_memory
+
+    self.results[name] = {
+      'seconds': round(seconds, 4),
+      'peak_mb': round(peak_bytes / 2**20, 1),
+      'rss_mb': round((_rss() or 0) / 2**20, 1),
+    }
+    print(f"  {name:>22} {seconds:>9.3f}s {peak_bytes / 2**20:>9.1f} MB", flush=True)
+    return result
+
+
+def latency(fn, calls: list) -> dict:
+  ''' p50 / p99 / mean milliseconds of fn(*args) over calls '''
+  times = []
+  for args in calls:
+    start = time.perf_counter()
+    fn(*args)
+    times.append(time.perf_counter() - start)
+  ms = np.array(times) * 1000
+  return {
+    'calls': len(times),
+    'p50_ms': round(float(np.percentile(ms, 50)), 3),
+    'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    'mean_ms': round(float(ms.mean()), 3),
+  }
+
+
+def train(stages: Stages, train_df: pd.DataFrame, n_users: int, n_items: int, args) -> dict:
+  ''' trainset + svd_fit stages, as train_model fits '''
+  from surprise import Dataset, Reader
+  from surprise.prediction_algorithms.matrix_factorization import SVD
+
+  reader = Reader(rating_scale = (0.5,5))
+  trainset = stages.run('trainset', lambda: Dataset.load_from_df(train_df[['userId','movieId','rating']], reader)
+                        .build_full_trainset())
+  model_svd = SVD(n_factors=args.factors, n_epochs=args.epochs, random_state=args.seed)
+  stages.run('svd_fit', model_svd.fit, trainset)
+  return extract_svd_factors(model_svd, n_users, n_items)
+
+
+def serving_tables(factors: dict, df: pd.DataFrame, movies_df: pd.DataFrame, movie_ids: np.ndarray, n_users: int) -> tuple:
+  index = IVFIndex.build(factors['qi'], factors['bi'])
+  store = RatingsStore.from_ratings(df, movies_df, movie_ids, n_users=n_users, n_items=len(movie_ids))
+  return index, store, CandidateTables.build(store)
+
+
+def bench_dataset(name: str, data_dir: Path, args) -> dict:
+  ''' Every stage on one dataset, returns its results entry '''
+  from sklearn.model_selection import train_test_split
+
+  print(f"\n{name}", flush=True)
+  stages = Stages(args.tracemalloc)
+  rng = np.random.default_rng(args.seed)
+
+  movies_df, ratings_df = stages.run('csv_load', load_data, data_dir)
+  stages.run('merge', pd.merge, ratings_df, movies_df[['movieId', 'title', 'genres']], on='movieId', how='left')
+  df = stages.run('prep_movies', prep_movies, movies_df, ratings_df, genres=False)
+  movie_ids = np.unique(ratings_df['movieId'].to_numpy())
+  user_ids = np.unique(ratings_df['userId'].to_numpy())
+  n_ratings = len(ratings_df)
+  del ratings_df
+
+  train_df, test_df = stages.run('split', train_test_split, df, test_size=.2, random_state=args.seed)
+  factors = train(stages, train_df, len(user_ids), len(movie_ids), args)
+  metrics = {'rmse': stages.run('evaluate_rmse', rmse, factors, test_df)}
+  metrics.update(stages.run('evaluate_ranking', ranking_metrics, factors, train_df, test_df, k=10,
+                            sample_users=args.eval_users, seed=args.seed))
+  del train_df, test_df
+
+  index, store, candidates = stages.run('serving_tables', serving_tables, factors, df, movies_df, movie_ids, len(user_ids))
+  model_dir = Path(args.models) / name
+  shutil.rmtree(model_dir, ignore_errors=True)
+  stages.run('publish', save_model_artifacts, model_dir, factors, movie_ids, user_ids, index, store,
+             metrics={'rmse': metrics['rmse']}, candidates=candidates)
+  # serve from this run's model, the way a worker process would
+  MR_functions.ARTIFACT_DIR = model_dir
+  stages.run('model_load', reload_model)
+
+  users = [(int(user),) for user in rng.choice(len(user_ids), min(args.queries, len(user_ids)), replace=False)]
+  recommend = {
+    'exact': latency(lambda user: get_best_n_recommendations(None, user, 10, candidates=False, use_cache=False), users),
+    'candidates': latency(lambda user: get_best_n_recommendations(None, user, 10, use_cache=False), users),
+    'ann': latency(lambda user: get_best_n_recommendations(None, user, 10, nprobe=args.nprobe, use_cache=False), users),
+  }
+  for user in users:
+    get_best_n_recommendations(None, user[0], 10)
+  recommend['cached'] = latency(lambda user: get_best_n_recommendations(None, user, 10), users)
+  for mode, result in recommend.items():
+    print(f"  {'recommend ' + mode:>22} p50 {result['p50_ms']:>8.3f} ms  p99 {result['p99_ms']:>8.3f} ms", flush=True)
+
+  # new users after the trained ids, each rating 10 movies somebody has rated
+  rated = np.flatnonzero(store.rated_items())
+  new_users = [
+    (len(user_ids) + i, [(int(m), float(r)) for m, r in zip(rng.choice(rated, 10, replace=False), rng.integers(1, 11, 10) / 2)])
+    for i in range(args.new_users)
+  ]
+  new_user = stages.run('create_new_user', latency, lambda user_id, scores: create_new_user(df, user_id, scores, store=store),
+                        new_users)
+  stages.results['create_new_user'].update(new_user)
+
+  return {
+    'name': name,
+    'data_dir': str(data_dir),
+    'n_ratings': n_ratings,
+    'n_users': len(user_ids),
+    'n_movies': len(movie_ids),
+    'stages': stages.results,
+    'recommend': recommend,
+    'metrics': {key: float(value) if isinstance(value, (float, np.floating)) else value for key, value in metrics.items()},
+  }
+
+
+def environment() -> dict:
+  ''' What produced the numbers, to tell builds and machines apart '''
+  import scipy
+  import surprise
+
+  try:
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip()
+    dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--', '.'], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip())
+  except OSError:
+    commit, dirty = None, None
+  return {
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    'git_commit': commit,
+    'git_dirty': dirty,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'cpus': os.cpu_count(),
+    'numpy': np.__version__,
+    'pandas': pd.__version__,
+    'scipy': scipy.__version__,
+    'surprise': surprise.__version__,
+  }
+
+
+def compare(results: dict, baseline: dict):
+  ''' Prints each stage's seconds and peak memory, and p50 recommendation latency, next to the baseline run's '''
+  previous = {dataset['name']: dataset for dataset in baseline['datasets']}
+  print(f"\ncompared to {baseline['environment'].get('git_commit')} ({baseline['environment'].get('timestamp')})")
+  print(f"{'dataset':>28} {'stage':>18} {'seconds':>9} {'before':>9} {'ratio':>6} {'peak MB':>9} {'before':>9}")
+  for dataset in results['datasets']:
+    old = previous.get(dataset['name'])
+    if old is None:
+      continue
+    for stage, new in dataset['stages'].items():
+      before = old['stages'].get(stage)
+      if before is None:
+        continue
+      ratio = new['seconds'] / before['seconds'] if before['seconds'] else float('nan')
+      print(f"{dataset['name']:>28} {stage:>18} {new['seconds']:>9.3f} {before['seconds']:>9.3f} {ratio:>6.2f} "
+            f"{new['peak_mb']:>9.1f} {before['peak_mb']:>9.1f}")
+    for mode, new in dataset['recommend'].items():
+      before = old['recommend'].get(mode)
+      if before is None:
+        continue
+      ratio = new['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('nan')
+      print(f"{dataset['name']:>28} {'recommend ' + mode:>18} {new['p50_ms']:>7.3f}ms {before['p50_ms']:>7.3f}ms {ratio:>6.2f}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--sizes', default='100k,1m,10m', help='comma separated synthetic rating counts (k / m suffixes)')
+  parser.add_argument('--data-dir', type=Path, action='append', default=[],
+                      help='also benchmark a real MovieLens folder (movies.csv, ratings.csv), repeatable')
+  parser.add_argument('--seed', type=int, default=0, help='data, split, SVD and query users all follow it')
+  parser.add_argument('--factors', type=int, default=100, help='SVD n_factors')
+  parser.add_argument('--epochs', type=int, default=20, help='SVD n_epochs')
+  parser.add_argument('--eval-users', type=int, default=None, help='ranking metrics on a sample of users (default all)')
+  parser.add_argument('--queries', type=int, default=200, help='users timed per get_best_n_recommendations mode')
+  parser.add_argument('--nprobe', type=int, default=8, help='ANN index lists probed by the ann mode')
+  parser.add_argument('--new-users', type=int, default=5, help='create_new_user calls timed')
+  parser.add_argument('--tracemalloc', action='store_true', help='peak memory from tracemalloc instead of RSS')
+  parser.add_argument('--data-root', type=Path, default=BENCH_DIR / 'data', help='where synthetic datasets are kept')
+  parser.add_argument('--models', type=Path, default=BENCH_DIR / 'models', help='where benchmark models are published')
+  parser.add_argument('--output', type=Path, default=None, help='results JSON (default artifacts/bench/pipeline-<time>.json)')
+  parser.add_argument('--compare', type=Path, default=None, help='results JSON of an earlier run to compare with')
+  args = parser.parse_args()
+
+  # a memory only recommendation cache, the benchmark must not write into a shared MR_CACHE_DB
+  MR_functions._recommendation_cache = MR_functions.RecommendationCache(MR_functions.CACHE_SIZE, MR_functions.CACHE_TTL)
+
+  datasets = [(path.name, path) for path in args.data_dir]
+  for n in [parse_size(size) for size in args.sizes.split(',') if size.strip()]:
+    datasets.append((f'synthetic-{n}', dataset_dir(args.data_root, n, args.seed)))
+
+  results = {
+    'environment': environment(),
+    'settings': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+    'datasets': [],
+  }
+  output = args.output or BENCH_DIR / f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json"
+  output.parent.mkdir(parents=True, exist_ok=True)
+  for name, path in datasets:
+    results['datasets'].append(bench_dataset(name, path, args))
+    # written after every dataset, so a run stopped on the biggest size keeps the rest
+    output.write_text(json.dumps(results, indent=2))
+  print(f"\nresults written to {output}")
+
+  if args.compare is not None:
+    compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == '__main__':
+  main()
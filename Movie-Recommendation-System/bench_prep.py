@@ -0,0 +1,112 @@
+"""
+Benchmark: prep_movies (one factorize per id column, genres split once per movie,
+sparse genre columns by index lookup) vs the previous implementation (LabelEncoder
+per id column, split + MultiLabelBinarizer over every rating row, dense int64 join).
+
+Runs on ml-latest-small and on a synthetic MovieLens shaped set (25M ratings by
+default), reporting wall time and peak traced memory (tracemalloc, second run) and
+the size of the resulting frame. The old implementation needs several GB past a few
+million ratings, so it is skipped above --legacy-max ratings.
+
+usage:
+  python bench_prep.py
+  python bench_prep.py --synthetic 25000000,1000000 --legacy-max 5000000
+"""
+
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from MR_functions import DATA_DIR, load_data, prep_movies
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Fantasy',
+          'Film-Noir', 'Horror', 'IMAX', 'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western']
+
+
+def prep_movies_legacy(movies_df: pd.DataFrame, ratings_df: pd.DataFrame) -> pd.DataFrame:
+  ''' prep_movies before the rewrite, kept here as the baseline '''
+  from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
+
+  df = pd.merge(ratings_df,movies_df[['movieId','genres']], on = 'movieId', how = 'left')
+  le = LabelEncoder()
+  df['movieId'] = le.fit_transform(df['movieId'])
+  df['userId'] = le.fit_transform(df['userId'])
+  user_encoder = LabelEncoder()
+  movie_encoder = LabelEncoder()
+  mlb = MultiLabelBinarizer()
+  df['userId'] = user_encoder.fit_transform(df['userId'])
+  df['movieId'] = movie_encoder.fit_transform(df['movieId'])
+  genres_list = df.pop('genres').str.split('|')
+  MLB_data = mlb.fit_transform(genres_list)
+  MLB_df = pd.DataFrame(MLB_data,columns=mlb.classes_, index = df.index)
+  df = df.join(MLB_df)
+  if '(no genres listed)' in df.columns:
+    df = df.drop('(no genres listed)', axis=1)
+  return df
+
+
+def synthetic_movielens(n_ratings: int, seed: int = 0) -> tuple:
+  ''' ml-25m proportions: ~6.2k ratings per 1k movies, ~155 ratings per user, long tail popularity '''
+  rng = np.random.default_rng(seed)
+  n_movies = max(100, n_ratings // 400)
+  n_users = max(10, n_ratings // 155)
+
+  movie_ids = np.sort(rng.choice(n_movies * 3, n_movies, replace=False)) + 1
+  n_genres = rng.integers(1, 4, n_movies)
+  picks = [rng.choice(len(GENRES), k, replace=False) for k in n_genres]
+  genres = ['|'.join(GENRES[g] for g in sorted(p)) for p in picks]
+  movies_df = pd.DataFrame({'movieId': movie_ids, 'title': [f'Movie {m}' for m in movie_ids], 'genres': genres})
+
+  popularity = 1.0 / np.arange(1, n_movies + 1) ** 0.9
+  popularity /= popularity.sum()
+  ratings_df = pd.DataFrame({
+    'userId': rng.integers(1, n_users + 1, n_ratings),
+    'movieId': movie_ids[rng.permutation(n_movies)][rng.choice(n_movies, n_ratings, p=popularity)],
+    'rating': rng.integers(1, 11, n_ratings) / 2,
+    'timestamp': rng.integers(8e8, 1.6e9, n_ratings),
+  })
+  return movies_df, ratings_df
+
+
+def measure(prep, movies_df: pd.DataFrame, ratings_df: pd.DataFrame) -> dict:
+  ''' Wall time of one run, then peak traced memory of a second run '''
+  start = time.perf_counter()
+  df = prep(movies_df, ratings_df)
+  seconds = time.perf_counter() - start
+  frame_mb = df.memory_usage(deep=True).sum() / 2**20
+  del df
+
+  tracemalloc.start()
+  prep(movies_df, ratings_df)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return {'seconds': seconds, 'peak_mb': peak / 2**20, 'frame_mb': frame_mb}
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--synthetic', default='25000000', help='comma separated synthetic rating counts')
+  parser.add_argument('--legacy-max', type=int, default=2_000_000, help='skip the old prep above this many ratings')
+  args = parser.parse_args()
+
+  datasets = [('ml-latest-small', lambda: load_data(DATA_DIR))]
+  for n in [int(x) for x in args.synthetic.split(',') if x]:
+    datasets.append((f'synthetic {n:,}', lambda n=n: synthetic_movielens(n)))
+
+  print(f"{'dataset':>22} {'prep':>8} {'seconds':>9} {'peak MB':>9} {'frame MB':>9}")
+  for name, load in datasets:
+    movies_df, ratings_df = load()
+    for label, prep in [('legacy', prep_movies_legacy), ('current', prep_movies)]:
+      if prep is prep_movies_legacy and len(ratings_df) > args.legacy_max:
+        print(f"{name:>22} {label:>8} {'skipped (--legacy-max)':>29}")
+        continue
+      result = measure(prep, movies_df, ratings_df)
+      print(f"{name:>22} {label:>8} {result['seconds']:>9.2f} {result['peak_mb']:>9.1f} {result['frame_mb']:>9.1f}")
+    del movies_df, ratings_df
+
+
+if __name__ == '__main__':
+  main()
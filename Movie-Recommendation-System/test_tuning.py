@@ -0,0 +1,47 @@
+"""
+Smoke test of Movie_Recommendation_System.tune: every --tune mode runs on a tiny
+ratings frame and hands back settings SVD accepts (ints where SVD needs ints).
+
+usage:
+  python -m pytest -q test_tuning.py
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import pytest
+from surprise import Dataset, Reader
+from surprise.prediction_algorithms.matrix_factorization import SVD
+
+import Movie_Recommendation_System as mrs
+
+
+def tiny_movielens(n_users: int = 40, n_movies: int = 30, seed: int = 0) -> tuple:
+  rng = np.random.default_rng(seed)
+  movies_df = pd.DataFrame({
+    'movieId': np.arange(1, n_movies + 1),
+    'title': [f'Movie {m}' for m in range(1, n_movies + 1)],
+    'genres': rng.choice(['Action', 'Comedy|Drama', 'Drama', 'Horror|Thriller'], n_movies),
+  })
+  pairs = [(user, movie) for user in range(1, n_users + 1)
+           for movie in rng.choice(np.arange(1, n_movies + 1), 10, replace=False)]
+  ratings_df = pd.DataFrame(pairs, columns=['userId', 'movieId'])
+  ratings_df['rating'] = rng.integers(1, 11, len(ratings_df)) / 2
+  ratings_df['timestamp'] = 0
+  return movies_df, ratings_df
+
+
+@pytest.mark.parametrize('mode', ['grid', 'random', 'halving'])
+def test_tune_modes(mode, monkeypatch):
+  monkeypatch.setattr(mrs, 'TUNE_GRID', {'n_factors': [5, 10], 'lr_all': [.005], 'reg_all': [.02]})
+  monkeypatch.setattr(mrs, 'TUNE_EPOCHS', [2, 6])
+  args = argparse.Namespace(tune=mode, test_size=.2, seed=0, folds=2, workers=1, tune_iter=2)
+  movies_df, ratings_df = tiny_movielens()
+
+  params = mrs.tune(args, movies_df, ratings_df)
+
+  assert set(params) == {'n_factors', 'lr_all', 'reg_all', 'n_epochs'}
+  assert type(params['n_factors']) is int and type(params['n_epochs']) is int
+  trainset = Dataset.load_from_df(ratings_df[['userId', 'movieId', 'rating']], Reader(rating_scale=(0.5, 5))).build_full_trainset()
+  SVD(**params).fit(trainset)
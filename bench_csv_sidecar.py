@@ -0,0 +1,102 @@
+"""
+Benchmark: cold csv parse vs warm Feather sidecar load for the CSV MCP server
+
+Generates synthetic csv files at each size, then times
+- a cold pd.read_csv of the whole file
+- writing the sidecar
+- a warm sidecar load of every column and of two columns (the aggregate_csv case)
+
+usage:
+  python bench_csv_sidecar.py                      # 10MB, 100MB and 1GB
+  python bench_csv_sidecar.py --sizes 10MB,100MB --workdir /tmp/csv-bench
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+  """ '100MB' -> 104857600 """
+  text = text.strip().upper()
+  for unit, factor in UNITS.items():
+    if text.endswith(unit):
+      return int(float(text[:-len(unit)]) * factor)
+  return int(text)
+
+
+def make_csv(path: Path, target_bytes: int, seed: int = 0):
+  """ Appends blocks of sales-like rows until the file reaches target_bytes """
+  rng = np.random.default_rng(seed)
+  cities = np.array(['Austin', 'Boston', 'Chicago', 'Denver', 'Eugene', 'Fresno', 'Houston', 'Miami'])
+  block_rows = 200_000
+  header = True
+  with open(path, 'w', newline='') as f:
+    while f.tell() < target_bytes:
+      block = pd.DataFrame({
+        'order_id': rng.integers(0, 10 ** 9, block_rows),
+        'city': cities[rng.integers(0, len(cities), block_rows)],
+        'product': rng.integers(0, 5000, block_rows),
+        'quantity': rng.integers(1, 20, block_rows),
+        'sales': rng.gamma(2.0, 50.0, block_rows).round(2),
+        'discount': rng.random(block_rows).round(3),
+      })
+      remaining = target_bytes - f.tell()
+      if remaining < block_rows * 40:
+        # roughly 40 bytes a row, trim the last block to land near the target
+        block = block.iloc[:max(1, remaining // 40)]
+      block.to_csv(f, index=False, header=header)
+      header = False
+
+
+def timed(fn):
+  start = time.perf_counter()
+  result = fn()
+  return result, time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--sizes', default='10MB,100MB,1GB')
+  parser.add_argument('--workdir', default=None, help='where csv files and sidecars are written (default: a temp dir)')
+  args = parser.parse_args()
+
+  workdir = Path(args.workdir or tempfile.mkdtemp(prefix='csv-bench-'))
+  workdir.mkdir(parents=True, exist_ok=True)
+  # the server reads its settings at import time
+  os.environ['CSV_SIDECAR_DIR'] = str(workdir / 'sidecars')
+  os.environ['CSV_SIDECAR'] = '1'
+  sys.path.insert(0, str(Path(__file__).resolve().parent))
+  import mcp_csv_server as server
+
+  if not server.SIDECAR_ENABLED:
+    sys.exit('pyarrow is required for the sidecar benchmark')
+
+  print(f"{'size':>8} {'rows':>12} {'csv parse':>10} {'write':>8} {'load all':>9} {'load 2 col':>10} {'speedup':>8}")
+  for size_text in args.sizes.split(','):
+    csv_path = workdir / f"bench_{size_text.strip()}.csv"
+    if not csv_path.exists():
+      make_csv(csv_path, parse_size(size_text))
+
+    df, parse_s = timed(lambda: pd.read_csv(csv_path))
+    _, write_s = timed(lambda: server._write_sidecar(csv_path, df))
+    rows = len(df)
+    del df
+
+    _, load_all_s = timed(lambda: server._read_sidecar(csv_path))
+    _, load_two_s = timed(lambda: server._read_sidecar(csv_path, ['city', 'sales']))
+
+    print(f"{size_text.strip():>8} {rows:>12,} {parse_s:>9.3f}s {write_s:>7.3f}s {load_all_s:>8.3f}s "
+          f"{load_two_s:>9.3f}s {parse_s / load_two_s:>7.1f}x")
+
+
+if __name__ == '__main__':
+  main()
@@ -6,23 +6,1032 @@ Example usage
 - what is in sample.csv
 - how many columns are in sample.csv
 - how many rows are in the file sample.csv
+- average, median and 90th percentile of sales by city where year >= 2020
+- which 10 customers in orders.csv spent the most, joined to customers.csv
+- how well is the csv cache doing
+- which csv tool is slow and where does the time go
+
+Parsed files are kept in a process-wide LRU cache (see _FrameCache) so repeat
+questions about the same file skip the parse. The cache size is set with the
+CSV_CACHE_MAX_BYTES environment variable (default 1 GB, 0 disables it).
+aggregate_csv streams files larger than CSV_STREAM_THRESHOLD_BYTES in chunks
+instead of loading them whole.
+
+When pyarrow is installed, the first parse of a file also writes a typed
+Arrow IPC (Feather) sidecar into CSV_SIDECAR_DIR. Later loads memory-map the
+sidecar and read only the columns they need, and the sidecar is rebuilt once
+the source csv's mtime, size or content digest changes. Set CSV_SIDECAR=0 to
+turn this off.
+
+query_csv runs SQL over csv files through DuckDB (optional dependency), which
+pushes projections and filters into a parallel scan of the file or sidecar.
+Its results are capped at CSV_QUERY_MAX_ROWS rows (default 10000).
+
+The csv tools are async: parsing and aggregation run on a worker pool
+(CSV_WORKER_MODE thread or process, CSV_WORKERS workers) so one long parse
+doesn't block other clients. Each call is limited to CSV_CALL_TIMEOUT seconds,
+and identical concurrent calls share one run (see _offloaded).
+
+Every tool call is timed per stage (queue, read, parse, compute, serialize) and
+server_stats reports rolling p50/p95/p99 latencies and peak memory per tool.
+CSV_STATS_LOG appends every call to a JSON lines file, and CSV_PROFILE
+(cprofile, tracemalloc) keeps a profile of calls slower than CSV_SLOW_CALL_MS.
 """
 
+import io
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import asyncio
+import cProfile
+import tracemalloc
+import hashlib
+import tempfile
+import inspect
+import functools
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 from fastmcp import FastMCP
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+try:
+  import pyarrow.feather as feather
+except ImportError:  # sidecars are optional, plain csv parsing still works
+  feather = None
+
+try:
+  import duckdb
+except ImportError:  # only query_csv needs it
+  duckdb = None
+
+try:
+  import resource
+except ImportError:  # not on Windows; only the peak memory fallback where /proc is missing needs it
+  resource = None
+
 mcp = FastMCP("csv-reader-server")
 
+CACHE_MAX_BYTES = int(os.getenv("CSV_CACHE_MAX_BYTES", str(1024 ** 3)))
+# Files at least this big are aggregated in chunks of CHUNK_ROWS rows
+STREAM_THRESHOLD_BYTES = int(os.getenv("CSV_STREAM_THRESHOLD_BYTES", str(512 * 1024 ** 2)))
+CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "1000000"))
+# read_csv previews count rows in blocks of this size, or estimate them from one sample
+PREVIEW_BLOCK_BYTES = 16 * 1024 ** 2
+PREVIEW_SAMPLE_BYTES = 1024 ** 2
+# bytes _count_rows looks at
+_QUOTE, _NEWLINE, _CR = ord('"'), ord('\n'), ord('\r')
+_FIELD_START = {ord(','), ord('\n'), ord('\r')}
+_OPENS_AFTER = np.frombuffer(b',\n\r"', dtype=np.uint8)
+_BLANK = b' \t\r\n'
+_IS_BLANK = np.isin(np.arange(256), list(_BLANK))
+SIDECAR_ENABLED = os.getenv("CSV_SIDECAR", "1") != "0" and feather is not None
+SIDECAR_DIR = Path(os.getenv("CSV_SIDECAR_DIR", str(Path.home() / ".cache" / "mcp-csv-server")))
+# bytes hashed from each end of the csv to spot rewrites that keep mtime and size
+SIDECAR_DIGEST_BYTES = 64 * 1024
+# query_csv scan parallelism, defaults to every core
+QUERY_THREADS = int(os.getenv("CSV_QUERY_THREADS", str(os.cpu_count() or 1)))
+# most rows query_csv returns, whatever max_rows asks for
+QUERY_MAX_ROWS = int(os.getenv("CSV_QUERY_MAX_ROWS", "10000"))
+# worker pool for the blocking tools; process workers each keep their own frame cache
+WORKER_MODE = os.getenv("CSV_WORKER_MODE", "thread")
+WORKERS = int(os.getenv("CSV_WORKERS", str(os.cpu_count() or 1)))
+# seconds a caller waits for a tool. A timed out thread run can't be stopped: it keeps
+# its worker busy until it finishes, so repeated timeouts on slow files can tie up
+# every worker (process runs that have not started yet are cancelled)
+CALL_TIMEOUT = float(os.getenv("CSV_CALL_TIMEOUT", "120"))
+# call tracing: calls kept per tool for the percentiles, a JSON lines file every call is
+# appended to (empty for none), the latency from which a call is slow, and the profilers
+# run on every call and kept for slow ones: cprofile, tracemalloc or both (off by default)
+STATS_WINDOW = int(os.getenv("CSV_STATS_WINDOW", "1000"))
+STATS_LOG = os.getenv("CSV_STATS_LOG", "")
+SLOW_CALL_MS = float(os.getenv("CSV_SLOW_CALL_MS", "1000"))
+PROFILE = {name.strip() for name in os.getenv("CSV_PROFILE", "").lower().split(",") if name.strip()}
+# milliseconds between the current RSS samples taken while tool calls run (see _RssSampler)
+RSS_SAMPLE_MS = float(os.getenv("CSV_RSS_SAMPLE_MS", "5"))
+
+
+class _FrameCache:
+  """
+  Memory bounded LRU cache of parsed DataFrames.
+
+  Entries are keyed by the resolved path plus the file's mtime, size and inode,
+  so an edited or replaced file is a miss and its stale frame ages out.
+  Sizes come from DataFrame.memory_usage(deep=True).
+  """
+
+  def __init__(self, max_bytes: int):
+    self.max_bytes = max_bytes
+    self.current_bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key, count: bool = True):
+    # count=False is a peek: internal lookups must not move the hit ratio
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        if count:
+          self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      if count:
+        self.hits += 1
+      return entry[0]
+
+  def count_hit(self):
+    with self._lock:
+      self.hits += 1
+
+  def put(self, key, df: pd.DataFrame):
+    size = int(df.memory_usage(deep=True).sum())
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if key in self._entries:
+        self.current_bytes -= self._entries.pop(key)[1]
+      # drop older versions of the same file, they can never be hit again
+      for old_key in [k for k in self._entries if k[0] == key[0] and k[1:4] != key[1:4]]:
+        self.current_bytes -= self._entries.pop(old_key)[1]
+        self.evictions += 1
+      self._entries[key] = (df, size)
+      self.current_bytes += size
+      while self.current_bytes > self.max_bytes:
+        _, (_, old_size) = self._entries.popitem(last=False)
+        self.current_bytes -= old_size
+        self.evictions += 1
+
+  def stats(self) -> dict:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self._entries),
+        "bytes": self.current_bytes,
+        "max_bytes": self.max_bytes,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions,
+        "hit_ratio": self.hits / lookups if lookups else 0.0,
+      }
+
+
+_frame_cache = _FrameCache(CACHE_MAX_BYTES)
+
+
+# stage timings of the tool call running on this thread, see _stage
+_trace = threading.local()
+# cProfile runs for one call at a time
+_profile_lock = threading.Lock()
+_STAGE_DONE = object()
+
+
+@contextmanager
+def _stage(name: str):
+  """
+  Adds the time spent in the block to stage `name` of the tool call running on this
+  thread, if any. A nested stage keeps its own time, the enclosing one gets the rest.
+  """
+  stack = getattr(_trace, 'stack', None)
+  if stack is None:
+    yield
+    return
+  start = time.perf_counter()
+  stack.append(0.0)
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - start
+    _trace.stages[name] = _trace.stages.get(name, 0.0) + elapsed - stack.pop()
+    if stack:
+      stack[-1] += elapsed
+
+
+def _staged(iterable, name: str):
+  """ Yields from iterable, counting the time spent producing each item as stage `name` """
+  iterator = iter(iterable)
+  while True:
+    with _stage(name):
+      item = next(iterator, _STAGE_DONE)
+    if item is _STAGE_DONE:
+      return
+    yield item
+
+
+def _peak_rss() -> int:
+  """ Peak resident set size of this process so far, in bytes """
+  if resource is None:
+    return 0
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _current_rss():
+  """ Resident set size of this process now, in bytes, None where /proc is not available """
+  try:
+    with open("/proc/self/statm", "rb") as f:
+      return int(f.read().split()[1]) * _PAGE_SIZE
+  except (OSError, ValueError, IndexError):
+    return None
+
+
+class _RssSampler:
+  """
+  Peak resident memory of calls while they run. One background thread reads the
+  current RSS every `interval` seconds while any call is running and raises the
+  peak of each of them; start and stop sample too, so calls shorter than the
+  interval still count. ru_maxrss is a high-water mark for the whole process and
+  reads 0 for every call that doesn't set a new record, so it is only the
+  fallback where /proc is missing.
+  """
+
+  def __init__(self, interval: float = 0.005):
+    self.interval = interval
+    self._calls = {}
+    self._pid = None
+    self._init_lock = threading.Lock()
+
+  def _ensure_thread(self):
+    # per process: a forked worker doesn't inherit the thread
+    with self._init_lock:
+      if self._pid != os.getpid():
+        self._pid = os.getpid()
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, name="rss-sampler", daemon=True).start()
+
+  def start(self) -> list:
+    """ Starts measuring one call, pass the returned token to stop """
+    rss = _current_rss()
+    if rss is None:
+      return [_peak_rss(), None]
+    self._ensure_thread()
+    call = [rss, rss]
+    with self._lock:
+      self._calls[id(call)] = call
+      self._wake.set()
+    return call
+
+  def stop(self, call: list) -> int:
+    """ Bytes the call's peak RSS rose above the RSS at its start """
+    if call[1] is None:
+      return max(_peak_rss() - call[0], 0)
+    rss = _current_rss() or 0
+    with self._lock:
+      self._calls.pop(id(call), None)
+    return max(call[1], rss) - call[0]
+
+  def _run(self):
+    while True:
+      self._wake.wait()
+      rss = _current_rss() or 0
+      with self._lock:
+        if not self._calls:
+          self._wake.clear()
+          continue
+        for call in self._calls.values():
+          call[1] = max(call[1], rss)
+      time.sleep(self.interval)
+
+
+_rss_sampler = _RssSampler(RSS_SAMPLE_MS / 1000)
+
+
+def _memory_mark():
+  """ Traced heap when tracemalloc profiling is on (peak reset), else an _rss_sampler token """
+  if 'tracemalloc' in PROFILE:
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+  return _rss_sampler.start()
+
+
+def _traced_call(fn, kwargs: dict) -> tuple:
+  """
+  Runs fn(**kwargs) with stage timing and the profilers in PROFILE, returns
+  (result, trace) with trace = {started, seconds, stages, peak_bytes} plus, for a call slower
+  than SLOW_CALL_MS, its cProfile listing and largest live allocations.
+  Peak memory is the rise of the traced heap (tracemalloc) or the highest current RSS
+  sampled while the call ran above the RSS at its start (_RssSampler); calls running
+  at the same time in one process share both, so it is approximate there.
+  """
+  _trace.stack, _trace.stages = [], {}
+  profiler = None
+  if 'cprofile' in PROFILE and _profile_lock.acquire(blocking=False):
+    profiler = cProfile.Profile()
+    profiler.enable()
+  memory_start = _memory_mark()
+  started = time.time()
+  start = time.perf_counter()
+  try:
+    result = fn(**kwargs)
+  finally:
+    seconds = time.perf_counter() - start
+    if profiler is not None:
+      profiler.disable()
+      _profile_lock.release()
+    stages = _trace.stages
+    del _trace.stack, _trace.stages
+
+  if 'tracemalloc' in PROFILE:
+    peak_bytes = tracemalloc.get_traced_memory()[1] - memory_start
+  else:
+    peak_bytes = _rss_sampler.stop(memory_start)
+  trace = {"started": started, "seconds": seconds, "stages": stages, "peak_bytes": max(peak_bytes, 0)}
+
+  if seconds * 1000 >= SLOW_CALL_MS:
+    if profiler is not None:
+      listing = io.StringIO()
+      pstats.Stats(profiler, stream=listing).sort_stats('cumulative').print_stats(25)
+      trace["profile"] = listing.getvalue()
+    if 'tracemalloc' in PROFILE:
+      trace["allocations"] = [str(stat) for stat in tracemalloc.take_snapshot().statistics('lineno')[:10]]
+  return result, trace
+
+
+def _percentile(values: list, q: float) -> float:
+  if not values:
+    return 0.0
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class _CallStats:
+  """
+  Rolling latencies of the offloaded tools, per tool and per stage, over the last
+  `window` calls of each tool, plus peak memory and the slowest recent calls.
+
+  Workers time the stages and return them with the result (so process workers
+  report too); the event loop adds the queue stage, the wait for a free worker
+  (and, in process mode, pickling the arguments), and appends each call to
+  log_path as one JSON line.
+  """
+
+  def __init__(self, window: int, log_path: str = "", slow_ms: float = 1000):
+    self.window = window
+    self.log_path = log_path
+    self.slow_ms = slow_ms
+    self.slow_calls = deque(maxlen=20)
+    self._tools = {}
+    self._lock = threading.Lock()
+
+  def _tool(self, name: str) -> dict:
+    entry = self._tools.get(name)
+    if entry is None:
+      entry = self._tools[name] = {"calls": 0, "errors": 0, "timeouts": 0, "peak_bytes": 0,
+                                   "latency": deque(maxlen=self.window), "stages": {}}
+    return entry
+
+  def record(self, tool: str, seconds: float, trace: dict, error: str = None, submitted: float = None):
+    """
+    One finished run: its wall time seen from the event loop, the worker's trace and
+    the wall clock time it was submitted at (for the queue stage)
+    """
+    stages = dict(trace.get("stages", {}))
+    if submitted is not None and "started" in trace:
+      stages["queue"] = max(trace["started"] - submitted, 0.0)
+    with self._lock:
+      entry = self._tool(tool)
+      entry["calls"] += 1
+      entry["errors"] += error is not None
+      entry["peak_bytes"] = max(entry["peak_bytes"], trace.get("peak_bytes", 0))
+      entry["latency"].append(seconds * 1000)
+      for name, stage_seconds in stages.items():
+        entry["stages"].setdefault(name, deque(maxlen=self.window)).append(stage_seconds * 1000)
+
+    record = {
+      "ts": round(time.time(), 3),
+      "tool": tool,
+      "ms": round(seconds * 1000, 3),
+      "stages": {name: round(stage_seconds * 1000, 3) for name, stage_seconds in stages.items()},
+      "peak_bytes": trace.get("peak_bytes", 0),
+      "error": error,
+    }
+    for key in ("profile", "allocations"):
+      if key in trace:
+        record[key] = trace[key]
+    if seconds * 1000 >= self.slow_ms:
+      self.slow_calls.append(record)
+    self._write(record)
+
+  def timeout(self, tool: str):
+    with self._lock:
+      self._tool(tool)["timeouts"] += 1
+
+  def _write(self, record: dict):
+    if not self.log_path:
+      return
+    try:
+      with open(self.log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+      # an unwritable log must not fail the tool call
+      self.log_path = ""
+
+  def stats(self) -> dict:
+    """ {tool: {calls, errors, timeouts, peak_bytes, p50, p95, p99, max, stages: {stage: ...}}} in ms """
+    def summary(values: deque) -> dict:
+      values = list(values)
+      return {"count": len(values), "p50": _percentile(values, 50), "p95": _percentile(values, 95),
+              "p99": _percentile(values, 99), "max": max(values, default=0.0)}
+
+    with self._lock:
+      return {
+        name: {
+          "calls": entry["calls"],
+          "errors": entry["errors"],
+          "timeouts": entry["timeouts"],
+          "peak_bytes": entry["peak_bytes"],
+          **summary(entry["latency"]),
+          "stages": {stage: summary(values) for stage, values in entry["stages"].items()},
+        }
+        for name, entry in sorted(self._tools.items())
+      }
+
+
+_call_stats = _CallStats(STATS_WINDOW, STATS_LOG, SLOW_CALL_MS)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# the undecorated tool functions, looked up by name so process workers can run them
+_sync_tools = {}
+# (tool, arguments) -> [shared task, number of callers waiting on it]
+_inflight = {}
+# process workers: pid -> that worker's frame cache stats as of its last finished call
+_worker_cache_stats = {}
+
+
+def _get_executor():
+  """ Creates the worker pool on first use, so process workers don't build their own """
+  global _executor
+  with _executor_lock:
+    if _executor is None:
+      if WORKER_MODE == "process":
+        _executor = ProcessPoolExecutor(max_workers=WORKERS)
+      else:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="csv-worker")
+    return _executor
+
+
+def _call_sync(name: str, kwargs: dict) -> tuple:
+  """
+  Runs a tool's blocking body, in a worker thread or process. Returns (result, trace);
+  a process worker adds its pid and frame cache stats to the trace for cache_stats
+  """
+  result, trace = _traced_call(_sync_tools[name], kwargs)
+  if WORKER_MODE == "process":
+    trace["worker_cache"] = (os.getpid(), _frame_cache.stats())
+  return result, trace
+
+
+def _record_run(name: str, submitted: float, start: float, task: asyncio.Future):
+  """ Done callback of a run: hands its trace to _call_stats (cancelled runs are not counted) """
+  if task.cancelled():
+    return
+  seconds = time.perf_counter() - start
+  if task.exception() is not None:
+    _call_stats.record(name, seconds, {}, error=str(task.exception()))
+    return
+  result, trace = task.result()
+  if "worker_cache" in trace:
+    pid, stats = trace.pop("worker_cache")
+    _worker_cache_stats[pid] = stats
+  error = result.splitlines()[0] if isinstance(result, str) and result.startswith("Error") else None
+  _call_stats.record(name, seconds, trace, error, submitted)
+
+
+async def _run_shared(name: str, kwargs: dict) -> str:
+  """
+  Runs the tool on the worker pool, sharing one run between identical
+  concurrent calls. Each caller waits at most CALL_TIMEOUT seconds; the run
+  is cancelled once nobody is waiting on it (a call that has already started
+  in a thread finishes in the background and its result is dropped).
+  """
+  key = (name, json.dumps(kwargs, sort_keys=True, default=str))
+  entry = _inflight.get(key)
+  if entry is None:
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(loop.run_in_executor(_get_executor(), _call_sync, name, kwargs))
+    task.add_done_callback(functools.partial(_record_run, name, time.time(), time.perf_counter()))
+    entry = _inflight[key] = [task, 0]
+    task.add_done_callback(lambda _: _inflight.pop(key, None) if _inflight.get(key) is entry else None)
+
+  task = entry[0]
+  entry[1] += 1
+  try:
+    result, _ = await asyncio.wait_for(asyncio.shield(task), CALL_TIMEOUT)
+    return result
+  except asyncio.TimeoutError:
+    _call_stats.timeout(name)
+    return f"Error: {name} timed out after {CALL_TIMEOUT:g} seconds"
+  finally:
+    entry[1] -= 1
+    if entry[1] == 0 and not task.done():
+      task.cancel()
+      if _inflight.get(key) is entry:
+        del _inflight[key]
+
+
+def _offloaded(fn):
+  """
+  Turns a blocking tool into an async one that runs on the worker pool.
+  The signature and docstring are kept for the MCP schema, and the blocking
+  version stays reachable as tool.__wrapped__.
+  """
+  _sync_tools[fn.__name__] = fn
+
+  @functools.wraps(fn)
+  async def wrapper(*args, **kwargs):
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return await _run_shared(fn.__name__, dict(bound.arguments))
+
+  return wrapper
+
+
+def _file_key(file_path_obj: Path) -> tuple:
+  """ Cache key for a file: resolved path plus mtime, size and inode """
+  resolved = file_path_obj.resolve()
+  st = resolved.stat()
+  return (str(resolved), st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _sidecar_paths(file_path_obj: Path) -> tuple:
+  """ Returns the (data, metadata) sidecar paths for a csv file """
+  name = hashlib.sha1(str(file_path_obj.resolve()).encode()).hexdigest()
+  return SIDECAR_DIR / f"{name}.arrow", SIDECAR_DIR / f"{name}.json"
+
+
+def _source_fingerprint(file_path_obj: Path) -> dict:
+  """ mtime, size and a digest of both ends of the csv, stored next to the sidecar """
+  st = file_path_obj.stat()
+  digest = hashlib.blake2b(digest_size=16)
+  with open(file_path_obj, 'rb') as f:
+    digest.update(f.read(SIDECAR_DIGEST_BYTES))
+    if st.st_size > 2 * SIDECAR_DIGEST_BYTES:
+      f.seek(-SIDECAR_DIGEST_BYTES, os.SEEK_END)
+      digest.update(f.read())
+  return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "digest": digest.hexdigest()}
+
+
+def _open_sidecar(file_path_obj: Path, columns: list = None):
+  """
+  Opens the csv's sidecar as a memory-mapped Arrow table limited to `columns`.
+  Returns None when there is no sidecar or it is stale.
+  """
+  if not SIDECAR_ENABLED:
+    return None
+
+  data_path, meta_path = _sidecar_paths(file_path_obj)
+  try:
+    meta = json.loads(meta_path.read_text())
+  except (OSError, ValueError):
+    return None
+
+  if meta.get("source") != _source_fingerprint(file_path_obj):
+    return None
+
+  if columns is not None:
+    # unknown columns are left out so the caller's validation reports them
+    columns = [col for col in columns if col in meta["columns"]]
+
+  try:
+    return feather.read_table(data_path, columns=columns, memory_map=True)
+  except Exception:
+    return None
+
+
+def _read_sidecar(file_path_obj: Path, columns: list = None):
+  """ Loads the csv from its sidecar as a DataFrame, None when there is no fresh sidecar """
+  table = _open_sidecar(file_path_obj, columns)
+  if table is None:
+    return None
+  return table.to_pandas()
+
+
+def _write_sidecar(file_path_obj: Path, df: pd.DataFrame, fingerprint: dict):
+  """
+  Writes the parsed frame as an uncompressed (mappable) Feather sidecar, best effort.
+  `fingerprint` is the source's fingerprint from before the parse; when the csv
+  has changed since, the frame may be stale and no sidecar is written.
+  """
+  if not SIDECAR_ENABLED:
+    return
+
+  data_path, meta_path = _sidecar_paths(file_path_obj)
+  tmp_path = None
+  try:
+    if _source_fingerprint(file_path_obj) != fingerprint:
+      return
+    SIDECAR_DIR.mkdir(parents=True, exist_ok=True)
+    # a unique temp file per write: thread workers share a pid, and two tools can
+    # write the same file's sidecar at once
+    fd, tmp_path = tempfile.mkstemp(dir=SIDECAR_DIR, suffix=".tmp")
+    os.close(fd)
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, data_path)
+    fd, tmp_path = tempfile.mkstemp(dir=SIDECAR_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+      f.write(json.dumps({"source": fingerprint, "columns": list(df.columns)}))
+    os.replace(tmp_path, meta_path)
+    tmp_path = None
+  except Exception:
+    # mixed type object columns and read only cache dirs just mean no sidecar
+    if tmp_path is not None:
+      try:
+        os.remove(tmp_path)
+      except OSError:
+        pass
+    return
+
+
+def _load_csv(file_path_obj: Path, columns: list = None) -> pd.DataFrame:
+  """
+  Returns the parsed DataFrame for a csv file, from the cache when the file
+  has not changed since it was last parsed.
+  With `columns`, only those columns are guaranteed to be loaded: a fresh
+  sidecar serves them without touching the rest of the file.
+  The frame is shared between calls, callers must not modify it in place.
+  """
+  key = _file_key(file_path_obj)
+
+  if columns is not None:
+    # a cached full frame already has every column
+    df = _frame_cache.get(key, count=False)
+    if df is not None:
+      _frame_cache.count_hit()
+      return df
+    key = key + (tuple(columns),)
+
+  df = _frame_cache.get(key)
+  if df is not None:
+    return df
+
+  with _stage('read'):
+    df = _read_sidecar(file_path_obj, columns)
+  if df is None:
+    # fingerprint before parsing, a csv written to during the parse gets no sidecar
+    fingerprint = _source_fingerprint(file_path_obj) if SIDECAR_ENABLED else None
+    with _stage('parse'):
+      df = pd.read_csv(file_path_obj)
+    with _stage('write'):
+      _write_sidecar(file_path_obj, df, fingerprint)
+    if columns is not None:
+      # cache the full parse, it answers this and every later column subset
+      key = key[:-1]
+
+  _frame_cache.put(key, df)
+  return df
+
+
+def _line_terminator(sample: bytes) -> int:
+  """ The byte that ends records: \\n, or \\r for classic Mac files that have no \\n """
+  return ord('\r') if b'\n' not in sample and b'\r' in sample else _NEWLINE
+
+
+def _count_rows(file_path_obj: Path) -> int:
+  """
+  Counts data rows the way pandas does (records minus the header, blank and
+  whitespace only lines skipped) with a raw scan of the file in large binary
+  blocks, without parsing any fields.
+  Like pandas, a record ends at \\n, \\r\\n or a lone \\r (classic Mac files).
+  Newlines inside double quoted fields are not counted. A quote only opens a
+  quoted section at the start of a field (or right after the closing quote of
+  a "" escape), so a stray quote such as 5"10 does not hide the rows after it.
+  For well formed files every quote toggles the state, so it is the quote count
+  parity (a cumsum); blocks with a stray quote walk their quotes in Python.
+  """
+  records = 0
+  in_quotes = False
+  has_content = False  # the current record has something besides whitespace
+  prev_byte = ord('\n')
+  closed_at = -2       # file offset of the last closing quote
+  offset = 0
+  with open(file_path_obj, 'rb') as f:
+    while True:
+      block = f.read(PREVIEW_BLOCK_BYTES)
+      if not block:
+        break
+      # a trailing \r is only a record end if no \n follows, so keep the pair in one block
+      while block.endswith(b'\r'):
+        more = f.read(1)
+        if not more:
+          break
+        block += more
+      data = np.frombuffer(block, dtype=np.uint8)
+
+      # quotes that open or close a quoted section, every other one stays literal
+      starts_quoted = in_quotes
+      quotes = np.flatnonzero(data == _QUOTE)
+      toggles = quotes
+      opening = quotes[(np.arange(len(quotes)) & 1 == 0) ^ starts_quoted]
+      before = data[np.maximum(opening - 1, 0)]
+      # by parity an opening quote follows a closing one when the byte before it is a quote
+      valid = np.isin(before, _OPENS_AFTER)
+      if len(opening) and opening[0] == 0:
+        valid[0] = prev_byte in _FIELD_START or closed_at == offset - 1
+      if valid.all():
+        in_quotes = starts_quoted ^ bool(len(quotes) & 1)
+        closing = quotes[(np.arange(len(quotes)) & 1 == 1) ^ starts_quoted]
+        if len(closing):
+          closed_at = offset + int(closing[-1])
+      else:
+        toggles = []
+        for pos in quotes.tolist():
+          before = block[pos - 1] if pos else prev_byte
+          if in_quotes:
+            closed_at = offset + pos
+          elif before not in _FIELD_START and closed_at != offset + pos - 1:
+            continue
+          in_quotes = not in_quotes
+          toggles.append(pos)
+
+      # a newline ends a record when an even number of toggles (after the starting state) precede it
+      if b'\r' in block:
+        newlines = data == _NEWLINE
+        newlines[:-1] |= (data[:-1] == _CR) & (data[1:] != _NEWLINE)
+        newlines[-1] |= data[-1] == _CR
+        newlines = np.flatnonzero(newlines)
+      else:
+        newlines = np.flatnonzero(data == _NEWLINE)
+      quoted = (np.searchsorted(toggles, newlines) & 1).astype(bool) ^ starts_quoted
+      ends = newlines[~quoted]
+
+      # a record has content when a non blank byte sits between the previous end and
+      # its own: step back over trailing blanks (\r of CRLF files, spaces) from each end
+      prev_ends = np.concatenate(([-1], ends[:-1]))
+      last = ends - 1
+      blank = (last > prev_ends) & _IS_BLANK[data[np.maximum(last, 0)]]
+      for _ in range(4):
+        if not blank.any():
+          break
+        last = last - blank
+        blank &= (last > prev_ends) & _IS_BLANK[data[np.maximum(last, 0)]]
+      seen = last > prev_ends
+      # records with longer blank runs are checked one by one
+      for i in np.flatnonzero(blank).tolist():
+        seen[i] = bool(block[prev_ends[i] + 1:last[i]].strip(_BLANK))
+      if len(ends):
+        seen[0] |= has_content
+        records += int(seen.sum())
+        has_content = bool(block[ends[-1] + 1:].strip(_BLANK))
+      else:
+        has_content |= bool(block.strip(_BLANK))
+
+      prev_byte = block[-1]
+      offset += len(data)
+
+  records += has_content
+  return max(records - 1, 0)
+
+
+def _estimate_rows(file_path_obj: Path) -> int:
+  """
+  Estimates data rows from the average row length in the first
+  PREVIEW_SAMPLE_BYTES of the file. Exact for files smaller than the sample.
+  """
+  size = file_path_obj.stat().st_size
+  with open(file_path_obj, 'rb') as f:
+    sample = f.read(PREVIEW_SAMPLE_BYTES)
+
+  if len(sample) >= size:
+    return _count_rows(file_path_obj)
+
+  newline = bytes([_line_terminator(sample)])
+  header_end = sample.find(newline) + 1
+  # only whole rows in the sample count towards the average
+  body = sample[header_end:sample.rfind(newline) + 1]
+  sample_rows = body.count(newline)
+  if header_end == 0 or sample_rows == 0:
+    return 0
+  return round((size - header_end) * sample_rows / len(body))
+
+
+def _preview_csv(file_path_obj: Path, n_rows: int, exact: bool) -> tuple:
+  """
+  Returns (head, row_count, estimated) without parsing the whole file.
+  A fresh sidecar gives both from its metadata and first record batch;
+  otherwise only the first n_rows are parsed and rows are counted by _count_rows
+  (or _estimate_rows when exact is False).
+  """
+  with _stage('read'):
+    table = _open_sidecar(file_path_obj)
+    if table is not None:
+      return table.slice(0, n_rows).to_pandas(), table.num_rows, False
+
+  with _stage('parse'):
+    head = pd.read_csv(file_path_obj, nrows=n_rows)
+  with _stage('read'):
+    if exact:
+      return head, _count_rows(file_path_obj), False
+    return head, _estimate_rows(file_path_obj), True
+
+
+# Partial aggregates kept per chunk, and how partials are merged together
+_PARTIAL_AGGS = {
+  'sum': ['sum'],
+  'mean': ['sum', 'count'],
+  'min': ['min'],
+  'max': ['max'],
+}
+_MERGE_AGGS = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def _aggregate_chunked(file_path_obj: Path, group_columns: list, agg_column: str, agg_function: str) -> pd.DataFrame:
+  """
+  Out of core groupby for files too big to parse in one go.
+  Reads only the group and aggregation columns, CSV_CHUNK_ROWS rows at a time,
+  and folds each chunk into running partial aggregates (sum/count/min/max),
+  so memory grows with the number of groups rather than the file size.
+  Returns the same frame as df.groupby(group_columns)[agg_column].agg(agg_function).reset_index()
+  """
+  partial_aggs = _PARTIAL_AGGS[agg_function]
+  merge_aggs = {name: _MERGE_AGGS[name] for name in partial_aggs}
+  usecols = list(dict.fromkeys(group_columns + [agg_column]))
+
+  partial = None
+  for chunk in _staged(pd.read_csv(file_path_obj, usecols=usecols, chunksize=CHUNK_ROWS), 'parse'):
+    chunk_partial = chunk.groupby(group_columns)[agg_column].agg(partial_aggs)
+    if partial is None:
+      partial = chunk_partial
+    else:
+      partial = pd.concat([partial, chunk_partial])
+      partial = partial.groupby(level=list(range(partial.index.nlevels))).agg(merge_aggs)
+
+  if partial is None:
+    # header only file, let pandas build the empty result
+    return pd.read_csv(file_path_obj, usecols=usecols).groupby(group_columns)[agg_column].agg(agg_function).reset_index()
+
+  if agg_function == 'mean':
+    agg_series = partial['sum'] / partial['count']
+  else:
+    agg_series = partial[agg_function]
+
+  return agg_series.rename(agg_column).reset_index()
+
+
+# summarize_csv metrics, quantiles are written as q0.9 or p90
+SUMMARY_FUNCTIONS = ['sum', 'mean', 'min', 'max', 'count', 'median', 'std', 'nunique']
+_QUANTILE_PATTERN = re.compile(r'^(?:q(0?\.\d+|1(?:\.0*)?)|p(\d{1,2}(?:\.\d+)?|100))$')
+_FILTER_PATTERN = re.compile(r'^\s*(.+?)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$')
+_FILTER_OPS = {
+  '==': lambda s, v: s == v,
+  '!=': lambda s, v: s != v,
+  '>=': lambda s, v: s >= v,
+  '<=': lambda s, v: s <= v,
+  '>': lambda s, v: s > v,
+  '<': lambda s, v: s < v,
+}
+_FILTER_BOOLEANS = {'true': True, 'false': False, '1': True, '0': False}
+
+
+def _parse_metric(spec: str) -> tuple:
+  """
+  'sales:mean' -> ('sales', 'mean', None), 'sales:p90' -> ('sales', 'quantile', 0.9)
+  '*:count' counts rows. Raises ValueError for anything else.
+  """
+  column, sep, function = spec.rpartition(':')
+  column, function = column.strip(), function.strip().lower()
+  if not sep or not column:
+    raise ValueError(f"Metric '{spec}' must look like column:function")
+
+  if function in SUMMARY_FUNCTIONS:
+    return column, function, None
+
+  match = _QUANTILE_PATTERN.match(function)
+  if match:
+    q = float(match.group(1)) if match.group(1) is not None else float(match.group(2)) / 100
+    return column, 'quantile', q
+
+  raise ValueError(f"Invalid function in '{spec}'. Valid options: {', '.join(SUMMARY_FUNCTIONS)}, q0.9 or p90")
+
+
+def _parse_filter(spec: str) -> tuple:
+  """ 'year >= 2020' -> ('year', '>=', '2020'). Raises ValueError when there is no operator """
+  match = _FILTER_PATTERN.match(spec)
+  if not match:
+    raise ValueError(f"Filter '{spec}' must look like column op value, op one of {', '.join(_FILTER_OPS)}")
+  column, op, value = match.groups()
+  return column, op, value.strip('\'"')
+
+
+def _filter_value(series: pd.Series, column: str, value: str):
+  """
+  Filter text as the column's type: true/false (or 1/0) for boolean columns,
+  including ones with missing values that parse as object, floats for numbers
+  """
+  if pd.api.types.is_bool_dtype(series) or (
+      series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'boolean'):
+    if value.lower() in _FILTER_BOOLEANS:
+      return _FILTER_BOOLEANS[value.lower()]
+    raise ValueError(f"Filter value '{value}' for boolean column '{column}' must be true or false")
+  if pd.api.types.is_numeric_dtype(series):
+    return float(value)
+  return value
+
+
+def _filter_mask(df: pd.DataFrame, filters: list):
+  """ Boolean mask for rows matching every (column, op, value) filter """
+  mask = pd.Series(True, index=df.index)
+  for column, op, value in filters:
+    series = df[column]
+    mask &= _FILTER_OPS[op](series, _filter_value(series, column, value))
+  return mask
+
+
+def _summarize(df: pd.DataFrame, group_columns: list, metrics: list) -> pd.DataFrame:
+  """
+  Computes every (column, function, q) metric with one groupby.
+  Cython aggregations go through a single named agg call and quantiles reuse
+  the same grouper, so the grouping is only worked out once.
+  """
+  labels = [f"{function if q is None else f'p{q * 100:g}'}({column})" for column, function, q in metrics]
+
+  if not group_columns:
+    values = {}
+    for label, (column, function, q) in zip(labels, metrics):
+      if column == '*':
+        values[label] = len(df)
+      elif q is None:
+        values[label] = df[column].agg(function)
+      else:
+        values[label] = df[column].quantile(q)
+    return pd.DataFrame([values])
+
+  grouped = df.groupby(group_columns)
+  named = {}
+  for label, (column, function, q) in zip(labels, metrics):
+    if q is None and column != '*':
+      named[label] = (column, function)
+
+  result = grouped.agg(**named) if named else grouped.size().to_frame('_size')
+  for label, (column, function, q) in zip(labels, metrics):
+    if column == '*':
+      result[label] = grouped.size()
+    elif q is not None:
+      result[label] = grouped[column].quantile(q)
+
+  return result[labels].reset_index()
+
+
+def _table_name(file_path_obj: Path) -> str:
+  """ SQL table name for a csv file: its stem with anything but letters, digits and _ replaced """
+  name = re.sub(r'\W', '_', file_path_obj.stem)
+  return f"t_{name}" if not name or name[0].isdigit() else name
+
+
+def _register_tables(con, tables: dict):
+  """
+  Exposes each csv to DuckDB under its table name. A fresh sidecar is handed
+  over as a memory-mapped Arrow table, otherwise DuckDB scans the csv itself.
+  Both let DuckDB read only the columns and row groups the query needs.
+  Afterwards the connection can read those csv files and nothing else: no other
+  local files, no URLs, no writes, and the settings can't be changed back.
+  """
+  allowed = []
+  for name, file_path_obj in tables.items():
+    table = _open_sidecar(file_path_obj)
+    if table is not None:
+      con.register(name, table)
+    else:
+      path = str(file_path_obj.resolve())
+      allowed.append(path)
+      escaped = path.replace("'", "''")
+      con.execute(f"CREATE VIEW \"{name}\" AS SELECT * FROM read_csv_auto('{escaped}')")
+
+  # the views read their file at query time, so only those paths stay open
+  con.execute("SET allowed_paths = ?", [allowed])
+  con.execute("SET enable_external_access = false")
+  con.execute("SET lock_configuration = true")
+
+
 @mcp.tool()
-def read_csv(file_path: str) -> str:
+@_offloaded
+def read_csv(file_path: str, preview_rows: int = 5, exact: bool = True) -> str:
   """
   Reads a csv file and returns it's contents
   use when: analyzing csv files
   Example: 'read sample.csv', 'what is in this sample.csv'
   Args:
     file_path: Is the path to the csv file
+    preview_rows: how many of the first rows to show
+    exact: count every row (default), or estimate the row count from a sample for a faster answer on huge files
 
   Output:
     Return file contents in a string data type
@@ -34,14 +1043,23 @@ def read_csv(file_path: str) -> str:
     if not file_path_obj.exists():  # Fixed: exist() -> exists()
       return f"Error: File not found at {file_path_obj}"
 
-    df = pd.read_csv(file_path_obj)
+    # Use an already parsed frame when there is one, otherwise preview without a full parse
+    df = _frame_cache.get(_file_key(file_path_obj), count=False)
+    if df is not None:
+      head, row_count, estimated = df.head(preview_rows), df.shape[0], False
+    else:
+      head, row_count, estimated = _preview_csv(file_path_obj, preview_rows, exact)
+
+    rows_text = f"~{row_count} rows (estimated)" if estimated else f"{row_count} rows"
 
-    result = f"Successfully read CSV: {file_path_obj}\n"  # Fixed typo: Successfuly -> Successfully
-    result += f"{df.shape[0]} rows and {df.shape[1]} columns\n"
-    result += f"Columns include: {', '.join(df.columns)}\n"  # Added missing \n
+    with _stage('serialize'):
+      result = f"Successfully read CSV: {file_path_obj}\n"  # Fixed typo: Successfuly -> Successfully
+      result += f"{rows_text} and {head.shape[1]} columns\n"
+      result += f"Columns include: {', '.join(head.columns)}\n"  # Added missing \n
+      result += f"Column types: {', '.join(f'{col}: {dtype}' for col, dtype in head.dtypes.items())}\n"
 
-    result += "First 5 rows:\n"
-    result += df.head().to_string()
+      result += f"First {len(head)} rows:\n"
+      result += head.to_string()
 
     return result
 
@@ -50,6 +1068,7 @@ def read_csv(file_path: str) -> str:
 
 
 @mcp.tool()
+@_offloaded
 def aggregate_csv(file_path: str, group_by: str, agg_column: str, agg_function: str) -> str:
   """ 
   This function will aggregate data in a csv file to return the sum, count or specified agg function
@@ -69,17 +1088,25 @@ def aggregate_csv(file_path: str, group_by: str, agg_column: str, agg_function:
     if not file_path_obj.exists():  # Fixed: exist() -> exists()
       return f"Error: File not found at {file_path_obj}"
 
-    df = pd.read_csv(file_path_obj)
-
     group_columns = [col.strip() for col in group_by.split(',')]
 
+    # Large files are aggregated chunk by chunk instead of parsed whole
+    streaming = file_path_obj.stat().st_size >= STREAM_THRESHOLD_BYTES
+
+    if streaming:
+      with _stage('parse'):
+        columns = pd.read_csv(file_path_obj, nrows=0).columns
+    else:
+      df = _load_csv(file_path_obj, list(dict.fromkeys(group_columns + [agg_column])))
+      columns = df.columns
+
     # Validate for missing columns
-    missing_cols = [col for col in group_columns if col not in df.columns]
+    missing_cols = [col for col in group_columns if col not in columns]
 
     if missing_cols:
       return f"Error: Columns not found: {missing_cols}"
       
-    if agg_column not in df.columns:
+    if agg_column not in columns:
       return f"Error: Aggregation Column not found: {agg_column}"
 
     valid_functions = ['sum', 'mean', 'min', 'max']
@@ -87,20 +1114,24 @@ def aggregate_csv(file_path: str, group_by: str, agg_column: str, agg_function:
     if agg_function not in valid_functions:  # Fixed: valid_funcions -> valid_functions
       return f"Error: Invalid function. Valid options: {', '.join(valid_functions)}"
 
-    agg_result = df.groupby(group_columns)[agg_column].agg(agg_function).reset_index()
-    agg_col_name = agg_column
-
-    result = f"Aggregation complete:\n"
-    result += f"File: {file_path_obj}\n"
-    result += f"Grouped by: {', '.join(group_columns)}\n"
-    result += f"Aggregation: {agg_function}({agg_column})\n\n"  # Simplified message
+    with _stage('compute'):
+      if streaming:
+        agg_result = _aggregate_chunked(file_path_obj, group_columns, agg_column, agg_function)
+      else:
+        agg_result = df.groupby(group_columns)[agg_column].agg(agg_function).reset_index()
+      agg_col_name = agg_column
+      total = agg_result[agg_col_name].agg(agg_function)
 
-    result += agg_result.to_string(index=False)
+    with _stage('serialize'):
+      result = f"Aggregation complete:\n"
+      result += f"File: {file_path_obj}\n"
+      result += f"Grouped by: {', '.join(group_columns)}\n"
+      result += f"Aggregation: {agg_function}({agg_column})\n\n"  # Simplified message
 
-    total = agg_result[agg_col_name].agg(agg_function)
+      result += agg_result.to_string(index=False)
 
-    if total is not None:
-      result += f"\n\nTotal {agg_function}: {total:,.2f}"
+      if total is not None:
+        result += f"\n\nTotal {agg_function}: {total:,.2f}"
 
     return result
 
@@ -108,5 +1139,227 @@ def aggregate_csv(file_path: str, group_by: str, agg_column: str, agg_function:
     return f"Error aggregating file: {str(e)}"  # Fixed capitalization
 
 
+@mcp.tool()
+@_offloaded
+def summarize_csv(file_path: str, metrics: list[str], group_by: str = "", filters: list[str] = None) -> str:
+  """
+  Computes several aggregates over a csv file in one pass, optionally filtered and grouped
+  use when: a question needs more than one number, like a report, or only some rows should count
+  Example:
+    'average, median and 90th percentile of sales by city where year >= 2020'
+    -> metrics=['sales:mean', 'sales:median', 'sales:p90'], group_by='city', filters=['year >= 2020']
+  Arg:
+    file_path: the string where the csv file lives
+    metrics: list of column:function, functions are sum, mean, min, max, count, median, std, nunique,
+             and quantiles as q0.9 or p90. Use *:count for the number of rows
+    group_by: the value to group the data by, use comma separated for multiple, empty for the whole file
+    filters: list of conditions like 'year >= 2020', 'city == Boston' or 'active == true' (==, !=, >, >=, <, <=), all must hold
+  """
+
+  try:
+    file_path_obj = Path(file_path)
+
+    if not file_path_obj.exists():
+      return f"Error: File not found at {file_path_obj}"
+
+    if not metrics:
+      return "Error: At least one metric is required"
+
+    parsed_metrics = [_parse_metric(spec) for spec in metrics]
+    parsed_filters = [_parse_filter(spec) for spec in (filters or [])]
+    group_columns = [col.strip() for col in group_by.split(',') if col.strip()]
+
+    # Validate columns against the header before loading anything
+    with _stage('parse'):
+      columns = pd.read_csv(file_path_obj, nrows=0).columns
+    needed = list(dict.fromkeys(
+      group_columns
+      + [column for column, _, _ in parsed_metrics if column != '*']
+      + [column for column, _, _ in parsed_filters]
+    ))
+    missing_cols = [col for col in needed if col not in columns]
+
+    if missing_cols:
+      return f"Error: Columns not found: {missing_cols}"
+
+    # Only the columns the report touches are loaded
+    if file_path_obj.stat().st_size >= STREAM_THRESHOLD_BYTES and _open_sidecar(file_path_obj) is None:
+      with _stage('parse'):
+        df = pd.read_csv(file_path_obj, usecols=needed)
+    else:
+      df = _load_csv(file_path_obj, needed)
+
+    with _stage('compute'):
+      if parsed_filters:
+        df = df[_filter_mask(df, parsed_filters)]
+
+      summary = _summarize(df, group_columns, parsed_metrics)
+
+    with _stage('serialize'):
+      result = f"Summary complete:\n"
+      result += f"File: {file_path_obj}\n"
+      if group_columns:
+        result += f"Grouped by: {', '.join(group_columns)}\n"
+      if parsed_filters:
+        result += f"Filters: {' and '.join(f'{c} {op} {v}' for c, op, v in parsed_filters)}\n"
+      result += f"Rows matched: {len(df)}\n\n"
+
+      result += summary.to_string(index=False)
+
+    return result
+
+  except Exception as e:
+    return f"Error summarizing file: {str(e)}"
+
+
+@mcp.tool()
+@_offloaded
+def query_csv(sql: str, file_paths: str, max_rows: int = 100) -> str:
+  """
+  Runs a read only SQL query (SELECT/WHERE/GROUP BY/ORDER BY/LIMIT, joins) over one or more csv files
+  use when: filtering rows, joining files, or questions the other csv tools can't express
+  Example:
+    'top 10 customers by spend' ->
+      sql='SELECT c.name, SUM(o.total) AS spend FROM orders o JOIN customers c USING (customer_id)
+           GROUP BY c.name ORDER BY spend DESC LIMIT 10'
+      file_paths='orders.csv, customers.csv'
+  Arg:
+    sql: a SELECT (or WITH ... SELECT) statement. Each file is a table named after its file name
+         without the extension (orders.csv -> orders)
+    file_paths: the csv files to query, use comma separated for multiple, or name=path to pick the table name
+    max_rows: the most result rows to return, at most CSV_QUERY_MAX_ROWS (default 10000)
+  """
+
+  try:
+    if duckdb is None:
+      return "Error: query_csv needs the duckdb package (pip install duckdb)"
+
+    if max_rows < 1:
+      return "Error: max_rows must be at least 1"
+    max_rows = min(max_rows, QUERY_MAX_ROWS)
+
+    statement = sql.strip().rstrip(';').strip()
+
+    # Security: Only allow a single read only query
+    if not re.match(r'^(SELECT|WITH)\b', statement, re.IGNORECASE):
+      return "Error: Only SELECT queries are allowed"
+    if ';' in statement:
+      return "Error: Only one statement can be run at a time"
+
+    tables = {}
+    for entry in file_paths.split(','):
+      name, sep, path = entry.strip().rpartition('=')
+      file_path_obj = Path(path.strip())
+
+      if not file_path_obj.exists():
+        return f"Error: File not found at {file_path_obj}"
+
+      name = name.strip() if sep else _table_name(file_path_obj)
+      if not re.match(r'^[A-Za-z_]\w*$', name):
+        return f"Error: Invalid table name: {name}"
+      if name in tables:
+        return f"Error: Table name used twice: {name}"
+      tables[name] = file_path_obj
+
+    # DuckDB reads, parses and aggregates in one pipelined scan, it all counts as compute
+    with _stage('compute'):
+      con = duckdb.connect(database=':memory:', config={'threads': QUERY_THREADS})
+      try:
+        _register_tables(con, tables)
+        # one extra row tells us whether the result was cut off
+        df = con.sql(statement).limit(max_rows + 1).df()
+      finally:
+        con.close()
+
+    truncated = len(df) > max_rows
+    df = df.head(max_rows)
+
+    with _stage('serialize'):
+      result = f"Query complete:\n"
+      result += f"Tables: {', '.join(f'{name}={path}' for name, path in tables.items())}\n"
+      result += f"Rows returned: {len(df)}{f' (limited to {max_rows})' if truncated else ''}\n\n"
+
+      result += df.to_string(index=False)
+
+    return result
+
+  except Exception as e:
+    return f"Error querying files: {str(e)}"
+
+
+@mcp.tool()
+def cache_stats() -> str:
+  """
+  Returns hit, miss and eviction counters for the parsed csv cache
+  use when: checking whether repeat questions are being served from memory
+  Example: 'how well is the csv cache doing'
+  """
+
+  if WORKER_MODE != "process":
+    stats = _frame_cache.stats()
+    result = "CSV cache stats:\n"
+  else:
+    # each process worker has its own cache, summed from the stats they send back with every call
+    workers = list(_worker_cache_stats.values())
+    if not workers:
+      return "CSV cache stats: no csv tool has finished in a worker process yet"
+    stats = {key: sum(worker[key] for worker in workers)
+             for key in ("entries", "bytes", "max_bytes", "hits", "misses", "evictions")}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    result = f"CSV cache stats ({len(workers)} of {WORKERS} worker processes, as of each one's last call):\n"
+
+  result += f"Entries: {stats['entries']}\n"
+  result += f"Memory: {stats['bytes']:,} of {stats['max_bytes']:,} bytes\n"
+  result += f"Hits: {stats['hits']}, Misses: {stats['misses']}, Evictions: {stats['evictions']}\n"
+  result += f"Hit ratio: {stats['hit_ratio']:.1%}"
+
+  return result
+
+
+@mcp.tool()
+def server_stats(profiles: bool = False) -> str:
+  """
+  Returns latency percentiles of each csv tool and of its stages (queue, read, parse,
+  compute, serialize), peak memory, and the slowest recent calls
+  use when: finding out why csv questions are slow
+  Example: 'which csv tool is slow and where does the time go'
+  Args:
+    profiles: also show the cProfile / tracemalloc captures of slow calls (needs CSV_PROFILE)
+  """
+
+  def percentiles(values: dict) -> str:
+    return f"p50 {values['p50']:.1f}, p95 {values['p95']:.1f}, p99 {values['p99']:.1f}, max {values['max']:.1f} ms"
+
+  stats = _call_stats.stats()
+  if not stats:
+    return "Server stats: no csv tool calls yet"
+
+  result = f"Server stats (last {_call_stats.window} calls per tool):\n"
+  for name, tool in stats.items():
+    result += f"\n{name}: {tool['calls']} calls, {tool['errors']} errors, {tool['timeouts']} timeouts, "
+    result += f"peak memory {tool['peak_bytes']:,} bytes\n"
+    result += f"  total: {percentiles(tool)}\n"
+    for stage, values in tool['stages'].items():
+      result += f"  {stage}: {percentiles(values)} ({values['count']} calls)\n"
+
+  if _call_stats.slow_calls:
+    result += f"\nSlow calls (>= {_call_stats.slow_ms:g} ms), latest last:\n"
+    for call in _call_stats.slow_calls:
+      stages = ', '.join(f"{stage} {ms:.1f}" for stage, ms in call['stages'].items())
+      result += f"  {call['tool']}: {call['ms']:.1f} ms ({stages}){' ' + call['error'] if call['error'] else ''}\n"
+      if profiles:
+        for key in ("profile", "allocations"):
+          if key in call:
+            text = call[key] if isinstance(call[key], str) else '\n'.join(call[key])
+            result += f"{text}\n"
+
+  result += f"\nProcess peak RSS: {_peak_rss():,} bytes"
+  if _call_stats.log_path:
+    result += f"\nCalls logged to: {_call_stats.log_path}"
+
+  return result
+
+
 if __name__ == "__main__":
    mcp.run()
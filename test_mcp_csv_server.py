@@ -0,0 +1,62 @@
+"""
+Tests of the csv server's filtered summaries on boolean columns, in memory
+(cache / sidecar) and on the large file path that parses only the needed columns.
+
+usage:
+  python -m pytest -q test_mcp_csv_server.py
+"""
+
+import pandas as pd
+import pytest
+
+import mcp_csv_server as server
+
+summarize_csv = server._sync_tools['summarize_csv']
+
+
+@pytest.fixture
+def flags_csv(tmp_path, monkeypatch):
+  monkeypatch.setattr(server, 'SIDECAR_DIR', tmp_path / 'sidecars')
+  monkeypatch.setattr(server, '_frame_cache', server._FrameCache(server.CACHE_MAX_BYTES))
+  path = tmp_path / 'flags.csv'
+  pd.DataFrame({
+    'city': ['Boston', 'Austin', 'Boston', 'Denver', 'Austin', 'Boston'],
+    'active': [True, False, True, True, False, False],
+    'sales': [10, 20, 30, 40, 50, 60],
+  }).to_csv(path, index=False)
+  return path
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+@pytest.mark.parametrize('spec, expected', [
+  ('active == true', 80), ('active == True', 80), ('active == 1', 80),
+  ('active != true', 130), ('active == false', 130),
+])
+def test_bool_filter_matches_pandas(flags_csv, monkeypatch, streamed, spec, expected):
+  if streamed:
+    monkeypatch.setattr(server, 'STREAM_THRESHOLD_BYTES', 0)
+  df = pd.read_csv(flags_csv)
+  column, op, value = server._parse_filter(spec)
+  assert df[server._filter_mask(df, [(column, op, value)])]['sales'].sum() == expected
+
+  result = summarize_csv(str(flags_csv), ['sales:sum'], filters=[spec])
+
+  assert 'Rows matched: 3' in result
+  assert result.rstrip().endswith(str(expected))
+
+
+def test_bool_filter_with_missing_values(tmp_path, monkeypatch):
+  monkeypatch.setattr(server, 'SIDECAR_DIR', tmp_path / 'sidecars')
+  path = tmp_path / 'gaps.csv'
+  path.write_text('active,sales\nTrue,1\n,2\nFalse,4\nTrue,8\n')
+
+  result = summarize_csv(str(path), ['sales:sum'], filters=['active == true'])
+
+  assert 'Rows matched: 2' in result
+  assert result.rstrip().endswith('9')
+
+
+def test_bool_filter_rejects_other_values(flags_csv):
+  result = summarize_csv(str(flags_csv), ['sales:sum'], filters=['active == maybe'])
+
+  assert result.startswith('Error') and 'true or false' in result